@@ -1,20 +1,187 @@
 import sys
-from database_connection import DatabaseConnection
+import sqlite3
+from database_connection import DatabaseConnection, ChangeWatcher, ConcurrentUpdateError
+from todo_repository import TodoRepository, PRIORITY_LABELS, DEFAULT_PRIORITY
+import task_store
+import calendar_days
+import backup
+import profiling
+import interaction_trace
+import project_databases
+from prefix_index import PrefixIndex
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QCalendarWidget, QVBoxLayout, 
                              QHBoxLayout, QWidget, QTableWidget, QTableWidgetItem, 
                              QPushButton, QDialog, QFormLayout, QLineEdit, QComboBox, 
-                             QMessageBox, QAbstractItemView, QTextEdit, QLabel, QDialogButtonBox, QRadioButton)
-from PyQt5.QtCore import QDate, Qt, QTimer, QDateTime
-from PyQt5.QtGui import QTextCharFormat, QColor
-import matplotlib.pyplot as plt
+                             QMessageBox, QAbstractItemView, QTextEdit, QLabel, QDialogButtonBox, QRadioButton,
+                             QDateEdit, QAbstractScrollArea, QToolTip, QDoubleSpinBox, QHeaderView,
+                             QShortcut, QListView, QStyledItemDelegate, QStyle, QCompleter)
+from PyQt5.QtCore import (QDate, Qt, QTimer, QDateTime, QEvent, QThread, pyqtSignal, QPointF, QRect,
+                          QAbstractListModel, QModelIndex, QSize, QStringListModel, QObject)
+from PyQt5.QtGui import (QTextCharFormat, QColor, QFont, QFontMetrics, QStaticText, QPixmap, QPainter,
+                         QKeySequence)
+import matplotlib
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from datetime import datetime, timedelta
+import time
+import numpy as np
+import task_analytics
 import traceback
 import sys
+from collections import OrderedDict
 
 # 日本語フォント設定
-plt.rcParams['font.family'] = 'meiryo'  # IPAexゴシックフォントを使用
-plt.rcParams['axes.unicode_minus'] = False   # マイナス記号の文字化け防止
+matplotlib.rcParams['font.family'] = 'meiryo'  # IPAexゴシックフォントを使用
+matplotlib.rcParams['axes.unicode_minus'] = False   # マイナス記号の文字化け防止
+
+# ステータスごとの表示色
+STATUS_COLORS = {
+    "未着手": QColor("blue"),
+    "進行中": QColor("green"),
+    "完了済": QColor("orange")
+}
+
+class CalendarRenderCache:
+    """
+    カレンダーのセル描画に使うフォント・色・テキストのキャッシュ
+
+    テキストは省略（…）済みの QStaticText として (内容, セル幅) ごとに保持し、
+    再描画のたびにフォントの設定や文字列の組み立て・レイアウトをしないようにする
+    """
+    # 保持するテキストの最大数
+    MAX_TEXT_ENTRIES = 4096
+
+    def __init__(self, base_font):
+        """
+        :param base_font: カレンダーウィジェットのフォント
+        """
+        self.date_font = QFont(base_font)
+        self.date_font.setPointSize(20)
+        self.selected_date_font = QFont(self.date_font)
+        self.selected_date_font.setBold(True)
+        self.todo_font = QFont(base_font)
+        self.todo_font.setPointSize(9)
+        self.todo_font.setBold(False)
+        self.todo_metrics = QFontMetrics(self.todo_font)
+
+        self.colors = {name: QColor(name) for name in ('red', 'blue', 'silver', 'gray', 'black')}
+        self.today_background = QColor("#e6f7ff")
+        self.selected_background = QColor("#d0f0c0")
+
+        self.texts = OrderedDict()
+
+    def clear(self):
+        """キャッシュしたテキストを破棄（セルの大きさやデータが変わったとき）"""
+        self.texts.clear()
+
+    def status_color(self, status):
+        """ステータスの表示色"""
+        return STATUS_COLORS.get(status, self.colors['black'])
+
+    def _static_text(self, key, build_text, font):
+        """
+        キャッシュからテキストを取得し、なければ作成して追加
+
+        :param key: キャッシュのキー
+        :param build_text: 表示する文字列を作成する関数（キャッシュにない場合のみ呼ぶ）
+        :param font: 描画に使うフォント
+        :return: QStaticTextオブジェクト
+        """
+        static_text = self.texts.get(key)
+        if static_text is not None:
+            self.texts.move_to_end(key)
+            return static_text
+
+        static_text = QStaticText(build_text())
+        static_text.setTextFormat(Qt.PlainText)
+        static_text.prepare(font=font)
+        self.texts[key] = static_text
+        if len(self.texts) > self.MAX_TEXT_ENTRIES:
+            self.texts.popitem(last=False)
+        return static_text
+
+    def date_font_for(self, selected):
+        """日付の数字のフォント（選択中の日付は太字）"""
+        return self.selected_date_font if selected else self.date_font
+
+    def date_text(self, day, selected):
+        """日付の数字のテキスト"""
+        return self._static_text(('date', day, selected), lambda: str(day), self.date_font_for(selected))
+
+    def todo_text(self, mark, title, status, width):
+        """
+        ToDoの1行分のテキスト
+
+        ステータスが常に見えるよう、セル幅に収まらない場合はタイトルを省略する
+        """
+        def build_text():
+            prefix = f"{mark} "
+            suffix = f" ({status})"
+            available = width - self.todo_metrics.horizontalAdvance(prefix + suffix)
+            elided_title = self.todo_metrics.elidedText(str(title), Qt.ElideRight, max(available, 0))
+            return prefix + elided_title + suffix
+
+        return self._static_text(('todo', mark, title, status, width), build_text, self.todo_font)
+
+    def more_text(self, count):
+        """表示しきれないToDoの件数のテキスト"""
+        return self._static_text(('more', count), lambda: f"＋ 他 {count}件", self.todo_font)
+
+class CalendarCellCache:
+    """
+    描画済みのカレンダーのセルを QPixmap として保持するキャッシュ
+
+    キーは (日付, データのバージョン, セルの大きさ, 表示状態)。
+    ToDoが変わった日付はバージョンを上げ、その日のセルだけが描き直されるようにする
+    """
+    # 保持するセルの最大数（月表示6週×7日で数画面分）
+    MAX_ENTRIES = 512
+
+    def __init__(self):
+        # False の場合はキャッシュせず毎回描画する（比較計測用）
+        self.enabled = True
+        self.pixmaps = OrderedDict()
+        self.versions = {}
+        self.generation = 0
+
+    def key(self, date_str, size, state):
+        """
+        セルのキャッシュキーを作成
+
+        :param date_str: 日付文字列（'yyyy-MM-dd'）
+        :param size: セルの大きさ（QSize）
+        :param state: 選択状態や表示中の月など、描画結果を左右する値のタプル
+        :return: キャッシュキー
+        """
+        version = (self.generation, self.versions.get(date_str, 0))
+        return (date_str, version, size.width(), size.height(), state)
+
+    def get(self, key):
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.pixmaps[key] = pixmap
+        if len(self.pixmaps) > self.MAX_ENTRIES:
+            self.pixmaps.popitem(last=False)
+
+    def invalidate(self, date_strs=None):
+        """
+        ToDoが変わった日付のセルを無効化
+
+        :param date_strs: 対象の日付文字列の集合。Noneの場合は全日付
+        """
+        if date_strs is None:
+            self.generation += 1
+            self.versions.clear()
+            self.pixmaps.clear()
+            return
+
+        # 古いバージョンのセルは参照されなくなり、上限を超えた分から破棄される
+        for date_str in date_strs:
+            self.versions[date_str] = self.versions.get(date_str, 0) + 1
 
 class ToDoBaseDialog(QDialog):
     def __init__(self, parent=None):
@@ -32,22 +199,529 @@ class ToDoBaseDialog(QDialog):
         if due_date < start_date:
             self.due_date_input.setSelectedDate(start_date)
 
-    def get_dropdown_data(self, column):
+    def create_priority_combo(self, priority=DEFAULT_PRIORITY):
         """
-        データベースからドロップダウンのデータを取得する
+        優先度のコンボボックスを作成
+
+        :param priority: 初期値
+        """
+        combo = QComboBox()
+        for value, label in PRIORITY_LABELS.items():
+            combo.addItem(label, value)
+        self.set_priority(combo, priority)
+        return combo
+
+    def set_priority(self, combo, priority):
+        """優先度のコンボボックスの選択を設定"""
+        index = combo.findData(priority)
+        combo.setCurrentIndex(index if index >= 0 else combo.findData(DEFAULT_PRIORITY))
+
+    def create_completion_combo(self, column):
+        """
+        入力候補付きの編集可能なコンボボックスを作成
+
+        一覧には使用件数の多い値だけを入れ、入力中は索引から一致する値を候補として表示する
+
+        :param column: DROPDOWN_COLUMNS のいずれか
+        """
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.NoInsert)
+        index = self.get_completion_index(column)
+        combo.addItems(index.top(IndexedCompleter.DROPDOWN_LIMIT))
+        combo.setCompleter(IndexedCompleter(index, combo))
+        return combo
+
+    def get_completion_index(self, column):
+        """
+        入力候補の索引を取得する
         """
         try:
-            query = f'SELECT DISTINCT {column} FROM ToDo WHERE {column} IS NOT NULL AND {column} != ""'
-            results = self.parent_window.db.execute_query(query)
-            return [str(item[0]) for item in results if item[0]]
+            return self.parent_window.get_completion_index(column)
         except Exception as e:
             print(f"Error fetching {column} data: {e}")
-            return []
+            return PrefixIndex()
+
+class IndexedCompleter(QCompleter):
+    """
+    入力中の文字列に一致する値を PrefixIndex から検索して表示する QCompleter
+
+    部分一致・カタカナとひらがなを区別しない一致は索引で絞り込むため、
+    モデルには検索結果の上位だけを入れてそのまま表示する
+    """
+    # 表示する候補の数
+    SUGGESTION_LIMIT = 20
+    # ドロップダウンの一覧に入れる値の数
+    DROPDOWN_LIMIT = 30
+
+    def __init__(self, index, combo):
+        """
+        :param index: PrefixIndex オブジェクト
+        :param combo: 編集可能なコンボボックス
+        """
+        super().__init__(combo)
+        self.index = index
+        self.suggestions = QStringListModel(self)
+        self.setModel(self.suggestions)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        combo.lineEdit().textEdited.connect(self.update_suggestions)
+
+    def update_suggestions(self, text):
+        """入力が変わるたびに候補を検索して表示"""
+        self.suggestions.setStringList(self.index.search(text, self.SUGGESTION_LIMIT) if text.strip() else [])
+        if self.suggestions.rowCount():
+            self.complete()
+        else:
+            self.popup().hide()
+
+class TaskPanelModel(QAbstractListModel):
+    """
+    本日のタスク・遅延タスクの一覧のモデル
+
+    表示に必要な項目だけをタプルで保持し、詳細・備考は展開した行の分だけ読み込む。
+    スクロールで末尾に近づいたときに次のページを取得する（fetchMore）
+    """
+    # 行のタプルの位置（ID は読み取り元の get() に渡すキー）
+    ID, TITLE, PRIORITY, STATUS, START_DAY, DUE_DATE, ASSIGNEE, PROJECT = range(8)
+
+    # 詳細・備考を返すロール
+    DescriptionRole = Qt.UserRole + 1
+
+    def __init__(self, panel, empty_text, parent=None):
+        """
+        :param panel: 'delayed'（遅延タスク）または 'today'（本日のタスク）
+        :param empty_text: タスクがない場合に表示する文
+        :param parent: 親オブジェクト
+        """
+        super().__init__(parent)
+        self.panel = panel
+        self.empty_text = empty_text
+        self.tasks = None
+        self.date_str = None
+        self.page_size = 0
+        self.rows = []
+        self.total = 0
+        self.message = None
+        # 展開中のToDoのIDと、読み込んだ詳細・備考
+        self.expanded = set()
+        self.descriptions = {}
+
+    def set_message(self, message):
+        """タスクの代わりに1行の文を表示（読み込み中など）"""
+        self.beginResetModel()
+        self.rows = []
+        self.total = 0
+        self.message = message
+        self.endResetModel()
+
+    def load(self, tasks, date_str, page_size):
+        """
+        最初のページを取得して表示を作り直す（展開中の行は展開したまま、詳細・備考は読み直す）
+
+        :param tasks: ToDoの読み取り元（TodoRepository または TaskStore）
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        :param page_size: 1回に取得する件数
+        """
+        records, total = tasks.top_open_tasks(self.panel, date_str, page_size)
+        self.beginResetModel()
+        self.tasks = tasks
+        self.date_str = date_str
+        self.page_size = page_size
+        self.rows = [self._row(record) for record in records]
+        self.total = total
+        self.message = None if self.rows else self.empty_text
+        self.descriptions.clear()
+        self.endResetModel()
+
+    @staticmethod
+    def _row(record):
+        return (record.key, record.title, record.priority, record.status,
+                record.start_day, record.due_date, record.assignee, getattr(record, 'project', None))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) if self.message is None else 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.message is None and len(self.rows) < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        # 取得済みの件数に1ページ分を加えて上位から取り直し、増えた分だけ追加する
+        records, self.total = self.tasks.top_open_tasks(self.panel, self.date_str, len(self.rows) + self.page_size)
+        new_rows = [self._row(record) for record in records[len(self.rows):]]
+        if not new_rows:
+            self.total = len(self.rows)
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+        self.rows.extend(new_rows)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self.message is not None:
+            return self.message if role == Qt.DisplayRole else None
+
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row[self.TITLE]
+        if role == Qt.UserRole:
+            return row
+        if role == self.DescriptionRole:
+            return self.description(row[self.ID]) if row[self.ID] in self.expanded else None
+        return None
+
+    def flags(self, index):
+        if self.message is not None:
+            return Qt.ItemIsEnabled
+        return super().flags(index)
+
+    def description(self, todo_id):
+        """
+        展開した行の詳細・備考（初回のみ読み込む）
+
+        :param todo_id: 読み取り元の get() に渡すキー
+        """
+        if todo_id not in self.descriptions:
+            todo = self.tasks.get(todo_id)
+            self.descriptions[todo_id] = (todo.description or '') if todo is not None else ''
+        return self.descriptions[todo_id]
+
+    def toggle_expanded(self, index):
+        """行の展開・折りたたみを切り替える"""
+        if self.message is not None or not index.isValid():
+            return
+        todo_id = self.rows[index.row()][self.ID]
+        if todo_id in self.expanded:
+            self.expanded.discard(todo_id)
+            self.descriptions.pop(todo_id, None)
+        else:
+            self.expanded.add(todo_id)
+        self.dataChanged.emit(index, index)
+
+class StatusComboDelegate(QStyledItemDelegate):
+    """ToDoテーブルのステータス列を、選択肢から選ぶコンボボックスで編集する"""
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(list(STATUS_COLORS))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data())
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText())
+
+class TaskPanelDelegate(QStyledItemDelegate):
+    """
+    本日のタスク・遅延タスクの行の描画
+
+    折りたたんだ行はすべて同じ高さ（2行）で描画し、展開した行のみ詳細・備考の分だけ高くする
+    """
+    MARGIN = 4
+
+    def __init__(self, mark, show_delay, parent=None):
+        """
+        :param mark: タイトルの前に付ける記号
+        :param show_delay: 遅延日数を表示する場合はTrue
+        :param parent: 親オブジェクト
+        """
+        super().__init__(parent)
+        self.mark = mark
+        self.show_delay = show_delay
+        self.title_font = QFont()
+        self.title_font.setBold(True)
+        self.detail_font = QFont()
+        self.title_metrics = QFontMetrics(self.title_font)
+        self.detail_metrics = QFontMetrics(self.detail_font)
+        self.detail_color = QColor('#555555')
+        self.separator_color = QColor('#dddddd')
+
+    def collapsed_height(self):
+        return self.title_metrics.height() + self.detail_metrics.height() + self.MARGIN * 3
+
+    def sizeHint(self, option, index):
+        description = index.data(TaskPanelModel.DescriptionRole)
+        height = self.collapsed_height()
+        if description:
+            # 一覧の幅で折り返した高さにする
+            view_width = option.widget.viewport().width() if option.widget is not None else option.rect.width()
+            width = max(view_width - self.MARGIN * 2, 50)
+            height += self.detail_metrics.boundingRect(
+                QRect(0, 0, width, 100000), Qt.TextWordWrap, description
+            ).height() + self.MARGIN
+        return QSize(option.rect.width(), height)
+
+    def detail_text(self, row, date_str):
+        """2行目（優先度・ステータス・期間・遅延日数・作業者）"""
+        parts = [
+            f"優先度 {PRIORITY_LABELS.get(row[TaskPanelModel.PRIORITY], row[TaskPanelModel.PRIORITY])}",
+            row[TaskPanelModel.STATUS] or '',
+            f"{row[TaskPanelModel.START_DAY]} 〜 {row[TaskPanelModel.DUE_DATE] or ''}"
+        ]
+        if self.show_delay and row[TaskPanelModel.DUE_DATE]:
+            due_date = QDate.fromString(row[TaskPanelModel.DUE_DATE][:10], 'yyyy-MM-dd')
+            if due_date.isValid():
+                parts.append(f"遅延 {due_date.daysTo(QDate.fromString(date_str, 'yyyy-MM-dd'))}日")
+        parts.append(f"作業者 {row[TaskPanelModel.ASSIGNEE] or ''}")
+        return ' / '.join(parts)
+
+    def paint(self, painter, option, index):
+        row = index.data(Qt.UserRole)
+        if row is None:
+            super().paint(painter, option, index)
+            return
+
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        expanded_mark = '▼' if index.data(TaskPanelModel.DescriptionRole) is not None else '▶'
+
+        # 1行目：タイトル（ステータスの色）
+        painter.setFont(self.title_font)
+        painter.setPen(STATUS_COLORS.get(row[TaskPanelModel.STATUS], QColor('black')))
+        project = f"[{row[TaskPanelModel.PROJECT]}] " if row[TaskPanelModel.PROJECT] else ''
+        title = self.title_metrics.elidedText(
+            f"{expanded_mark} {self.mark}{project}{row[TaskPanelModel.TITLE]}", Qt.ElideRight, rect.width()
+        )
+        painter.drawText(QRect(rect.left(), rect.top(), rect.width(), self.title_metrics.height()),
+                         Qt.AlignLeft | Qt.AlignVCenter, title)
+
+        # 2行目：優先度・ステータス・期間など
+        painter.setFont(self.detail_font)
+        painter.setPen(self.detail_color)
+        top = rect.top() + self.title_metrics.height() + self.MARGIN
+        detail = self.detail_metrics.elidedText(
+            self.detail_text(row, index.model().date_str), Qt.ElideRight, rect.width()
+        )
+        painter.drawText(QRect(rect.left(), top, rect.width(), self.detail_metrics.height()),
+                         Qt.AlignLeft | Qt.AlignVCenter, detail)
+
+        # 展開した行：詳細・備考
+        description = index.data(TaskPanelModel.DescriptionRole)
+        if description:
+            top += self.detail_metrics.height() + self.MARGIN
+            painter.setPen(Qt.black)
+            painter.drawText(QRect(rect.left(), top, rect.width(), rect.bottom() - top),
+                             Qt.TextWordWrap, description)
+
+        painter.setPen(self.separator_color)
+        painter.drawLine(option.rect.left(), option.rect.bottom(), option.rect.right(), option.rect.bottom())
+        painter.restore()
+
+class DatabaseLoader(QThread):
+    """
+    データベースを開き、リポジトリ（とタスクストア）を準備するスレッド
+
+    テーブル作成や移行に時間がかかってもウィンドウの表示を妨げないようにする
+    """
+    loaded = pyqtSignal(object, object, object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, db_path=None, profile=None):
+        """
+        :param parent: 親オブジェクト
+        :param db_path: データベースファイルのパス（省略時は環境変数 TODO_DB_PATH または既定のファイル）
+        :param profile: 起動時のプロファイル（ProfileSession。記録しない場合はNone）
+        """
+        super().__init__(parent)
+        self.db_path = db_path
+        self.profile = profile
+
+    def run(self):
+        try:
+            with profiling.profile_thread(self.profile):
+                db = DatabaseConnection(self.db_path)
+                repository = TodoRepository(db)
+
+                # TODO_TASK_STORE が有効な場合はToDoをメモリ上に保持して読み取りを高速化する
+                store = None
+                if task_store.is_enabled():
+                    store = task_store.TaskStore(repository)
+                    if not store.load():
+                        store = None
+
+                # TODO_PROJECTS に指定されたプロジェクトのデータベースをまとめて読み取る
+                projects = None
+                project_paths = project_databases.project_paths_from_env()
+                if project_paths:
+                    try:
+                        projects = project_databases.ProjectSet(db, project_paths)
+                    except Exception as e:
+                        print(f"プロジェクトのデータベースを開けませんでした: {e}")
+
+            self.loaded.emit(db, repository, store, projects)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+
+class BackupWorker(QThread):
+    """
+    データベースのバックアップを作成するスレッド
+
+    ページ単位で少しずつコピーするため、バックアップ中も画面の操作やデータの更新を妨げない
+    """
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, manager, parent=None):
+        """
+        :param manager: backup.BackupManagerオブジェクト
+        :param parent: 親オブジェクト
+        """
+        super().__init__(parent)
+        self.manager = manager
+
+    def run(self):
+        try:
+            result = self.manager.backup(progress=self.progress.emit)
+            self.completed.emit(result)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+
+class ReminderScheduler(QObject):
+    """
+    日時の表示と期限のリマインダーを1つのタイマーで管理する
+
+    タイマーは次の分の始まりと次に期限を迎える日時（期限の日になる・期限を過ぎる日の始まり）の早い方に
+    1回だけ発火するよう設定する。次に期限を迎える日時は未完了のToDoの期限の索引から求め、
+    ToDoが変更されたときに求め直すため、期限を定期的に確認する必要はない
+    """
+    minute_changed = pyqtSignal()
+    day_changed = pyqtSignal(str)
+    reminder_due = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        """
+        :param parent: 親オブジェクト
+        """
+        super().__init__(parent)
+        # 期限を検索するリポジトリ（データの読み込み後に設定）
+        self.repository = None
+        # 次に期限を迎える日時（該当するToDoがない場合はNone）
+        self.next_event = None
+        self.today = datetime.now().date()
+
+        # 分の変わり目に合わせるため、精度の高いタイマーを1回ずつ設定し直す
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.on_timeout)
+        self.arm()
+
+    def set_repository(self, repository):
+        """期限を検索するリポジトリを設定し、次に期限を迎える日時を求める"""
+        self.repository = repository
+        self.reschedule()
+
+    def reschedule(self):
+        """未完了のToDoの期限から次に期限を迎える日時を求め、タイマーを設定し直す"""
+        self.next_event = None
+        if self.repository is not None:
+            try:
+                next_due = self.repository.next_open_due_date(self.today.strftime('%Y-%m-%d'))
+                if next_due:
+                    due_day = datetime.strptime(next_due[:10], '%Y-%m-%d')
+                    # 今日が期限のToDoは明日の始まりに期限切れになる
+                    self.next_event = due_day + timedelta(days=1) if due_day.date() <= self.today else due_day
+            except Exception as e:
+                print(f"期限の確認中にエラーが発生しました: {e}")
+        self.arm()
+
+    def arm(self):
+        """次の分の始まりと次に期限を迎える日時の早い方にタイマーを設定"""
+        now = datetime.now()
+        target = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if self.next_event is not None:
+            target = min(target, self.next_event)
+        self.timer.start(max(int((target - now).total_seconds() * 1000) + 1, 0))
+
+    def on_timeout(self):
+        """日時の表示を更新し、日付が変わった・期限を迎えた場合は通知する"""
+        now = datetime.now()
+        self.minute_changed.emit()
+        if now.date() != self.today:
+            self.today = now.date()
+            self.day_changed.emit(self.today.strftime('%Y-%m-%d'))
+        if self.next_event is not None and now >= self.next_event:
+            self.reminder_due.emit(self.today.strftime('%Y-%m-%d'))
+            self.reschedule()
+        else:
+            self.arm()
+
+    def stop(self):
+        self.timer.stop()
 
 class ToDoCalendarApp(QMainWindow):
-    def __init__(self):
+    # テーブルで直接編集できる列とカラム名の対応
+    TABLE_EDIT_COLUMNS = {
+        1: 'title',
+        2: 'status',
+        3: 'registrant',
+        4: 'assignee',
+        5: 'due_date',
+        6: 'description'
+    }
+
+    # テーブル編集を保存するまでの待ち時間（ミリ秒）
+    EDIT_FLUSH_DELAY_MS = 800
+
+    # カレンダーの1日に表示するToDoの行数
+    CELL_TITLE_LIMIT = 6
+
+    # 期間がこの日数を超えるToDoが変更された場合は全日付の表示を更新する
+    SPAN_UPDATE_LIMIT_DAYS = 62
+
+    # 自動バックアップが必要かを確認する間隔（ミリ秒）
+    BACKUP_CHECK_INTERVAL_MS = 60 * 60 * 1000
+
+    # 本日のタスク・遅延タスクの一覧に1回で取得する件数（スクロールで続きを取得）
+    PANEL_TASK_LIMIT = 50
+
+    # 期限のリマインダーに表示するタイトルの件数と表示時間（ミリ秒）
+    REMINDER_TITLE_LIMIT = 3
+    REMINDER_MESSAGE_MS = 5 * 60 * 1000
+
+    def __init__(self, start_time=None, db_path=None, profile=None, trace=None):
+        """
+        :param start_time: 起動時間の計測の基準となる time.perf_counter() の値（省略時は生成時）
+        :param db_path: データベースファイルのパス（省略時は環境変数 TODO_DB_PATH または既定のファイル。
+            ':memory:' の場合はメモリ上のデータベース）
+        :param profile: 記録中の起動時のプロファイル（ProfileSession）。指定した場合は
+            操作可能になった時点で保存し、以降は Ctrl+Shift+P で操作中のプロファイルを記録できる
+        :param trace: 操作を記録する TraceRecorder（interaction_trace.py で再生できる）
+        """
         super().__init__()
-        self.db = DatabaseConnection()
+
+        # データベースはウィンドウ表示後にバックグラウンドで開く
+        self.db = None
+        self.repository = None
+        self.task_store = None
+        self.tasks = None
+        self.data_ready = False
+
+        # 複数のプロジェクトのデータベース（TODO_PROJECTS を指定した場合のみ）と、
+        # カレンダー・一覧（overview）と統計（overview_stats）の読み取り元
+        self.projects = None
+        self.overview = None
+        self.overview_stats = None
+
+        # 起動時間の計測（初回描画・操作可能になるまで）
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.startup_metrics = {}
+
+        # プロファイル（起動時と、Ctrl+Shift+P で開始・終了する操作中の記録）
+        self.startup_profile = profile
+        self.interaction_profile = None
+
+        # 操作の記録
+        self.trace = trace
         
         # 多重起動防止のためのクラス変数を追加
         ToDoCalendarApp.instance = None
@@ -79,6 +753,12 @@ class ToDoCalendarApp(QMainWindow):
         # カスタムペイントイベントを設定して日付にToDoタイトルを表示
         self.calendar_widget.paintCell = self.custom_paint_cell
 
+        # セル描画用のフォント・色・テキストのキャッシュ（大きさが変わったら破棄）
+        self.render_cache = CalendarRenderCache(self.calendar_widget.font())
+        # 描画済みのセル（ToDoや表示状態が変わらない限り再利用する）
+        self.cell_cache = CalendarCellCache()
+        self.calendar_widget.installEventFilter(self)
+
         # ToDoリストテーブル
         self.todo_table = QTableWidget()
         self.todo_table.setColumnCount(7)
@@ -86,8 +766,17 @@ class ToDoCalendarApp(QMainWindow):
         self.todo_table.setColumnHidden(7, True)
         self.todo_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.todo_table.setEditTriggers(QAbstractItemView.DoubleClicked)
+        self.todo_table.setItemDelegateForColumn(2, StatusComboDelegate(self.todo_table))
         self.todo_table.cellChanged.connect(self.update_todo_from_table)
 
+        # テーブル編集は行ごとにまとめて保存する
+        self.pending_edits = {}
+        self.edit_flush_timer = QTimer(self)
+        self.edit_flush_timer.setSingleShot(True)
+        self.edit_flush_timer.setInterval(self.EDIT_FLUSH_DELAY_MS)
+        self.edit_flush_timer.timeout.connect(self.flush_pending_edits)
+        self.todo_table.installEventFilter(self)
+
         # ID列を非表示
         self.todo_table.setColumnHidden(0, True) # ID列を非表示
 
@@ -131,14 +820,35 @@ class ToDoCalendarApp(QMainWindow):
         # ボタンレイアウトに追加（既存のボタンの後に）
         button_layout.addWidget(assignee_stats_button)
 
+        # タイムラインボタン
+        timeline_button = QPushButton('タイムライン')
+        timeline_button.setFixedHeight(50)
+        timeline_button.clicked.connect(self.open_timeline_dialog)
+        button_layout.addWidget(timeline_button)
+
+        # バックアップボタン
+        self.backup_button = QPushButton('バックアップ')
+        self.backup_button.setFixedHeight(50)
+        self.backup_button.clicked.connect(lambda: self.start_backup(manual=True))
+        button_layout.addWidget(self.backup_button)
+
+        # データの読み込みが終わるまで操作できないボタン
+        self.data_buttons = [
+            add_todo_button, delete_todo_button, edit_todo_button,
+            duplicate_todo_button, assignee_stats_button, timeline_button, self.backup_button
+        ]
+        for button in self.data_buttons:
+            button.setEnabled(False)
+
         # 初期化部分
         self.datetime_label = QLabel() # 現在の日時を表示するラベルを作成
         self.update_datetime() # 初期化時に日時を設定
 
-        # タイマー設定
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_datetime) # タイマーが発火するたびにupdate_datetimeを呼び出す
-        self.timer.start(1000) # 1秒ごとに更新
+        # 日時の表示と期限のリマインダー（分の変わり目と期限を迎える日時にだけ発火する1つのタイマー）
+        self.reminder_scheduler = ReminderScheduler(self)
+        self.reminder_scheduler.minute_changed.connect(self.update_datetime)
+        self.reminder_scheduler.day_changed.connect(self.on_day_changed)
+        self.reminder_scheduler.reminder_due.connect(self.show_due_reminder)
 
         # レイアウト構成
         left_layout = QVBoxLayout()
@@ -147,6 +857,13 @@ class ToDoCalendarApp(QMainWindow):
         header_layout.addWidget(QLabel('🌟選択した日時に登録されているタスク　　　　　　　　　　　🖱️右クリックで進捗状況更新'))
         header_layout.addWidget(self.datetime_label, alignment=Qt.AlignRight)  # ラベルを右端に配置
 
+        # 表示するプロジェクト（TODO_PROJECTS でプロジェクトを追加した場合のみ表示）
+        self.project_combo = QComboBox()
+        self.project_combo.addItem('すべてのプロジェクト', None)
+        self.project_combo.setVisible(False)
+        self.project_combo.currentIndexChanged.connect(self.on_project_selected)
+        left_layout.insertWidget(0, self.project_combo)
+
         right_layout = QVBoxLayout()
         right_layout.addLayout(header_layout) # 新しいヘッダーレイアウトを追加
         right_layout.addWidget(self.todo_table)
@@ -156,14 +873,13 @@ class ToDoCalendarApp(QMainWindow):
         # 本日のタスクと遅延タスクリストを左右に配置
         todo_status_layout = QHBoxLayout()
 
-        # 本日のタスクリスト
-        self.today_todos_list = QTextEdit()
-        self.today_todos_list.setReadOnly(True)
+        # 本日のタスクリスト・遅延タスクリスト（行をクリックすると詳細・備考を展開）
+        self.today_todos_model = TaskPanelModel('today', '本日のタスクはありません。', self)
+        self.today_todos_list = self.create_task_panel(self.today_todos_model, TaskPanelDelegate('📌', False, self))
         todo_status_layout.addWidget(self.today_todos_list)
 
-        # 遅延タスクリスト
-        self.delayed_todos_list = QTextEdit()
-        self.delayed_todos_list.setReadOnly(True)
+        self.delayed_todos_model = TaskPanelModel('delayed', '遅延しているタスクはありません。', self)
+        self.delayed_todos_list = self.create_task_panel(self.delayed_todos_model, TaskPanelDelegate('⚠️', True, self))
         todo_status_layout.addWidget(self.delayed_todos_list)
 
         # 右側のレイアウトに追加
@@ -177,9 +893,35 @@ class ToDoCalendarApp(QMainWindow):
         self.setCentralWidget(main_widget)
 
         self.calendar_widget.currentPageChanged.connect(self.show_delayed_todos)
-        
-        # アプリケーション起動時に遅延タスクを自動更新
-        self.load_initial_data()
+        self.calendar_widget.currentPageChanged.connect(self.annotate_calendar_page)
+
+        # 読み込み中の表示
+        self.today_todos_model.set_message('読み込み中...')
+        self.delayed_todos_model.set_message('読み込み中...')
+
+        # 外部プロセスによるデータベース変更の検知（データの読み込み後に開始）
+        self.change_watcher = None
+        self.change_timer = QTimer(self)
+        self.change_timer.timeout.connect(self.check_external_changes)
+
+        # 作業者別の作業量の予測（初めて表示するときに作成し、以降は変更分だけ更新）
+        self.workload_forecast = None
+        self.workload_dialog = None
+
+        # 入力候補の索引（カラムごとに最初に使うときに作成し、以降は変更履歴で更新）
+        self.completion_indexes = {}
+
+        # バックアップ（データの読み込み後に定期的に確認）
+        self.backup_manager = None
+        self.backup_worker = None
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.run_scheduled_backup)
+
+        # データベースを開く処理（テーブル作成・移行）はバックグラウンドで行う
+        self.database_loader = DatabaseLoader(self, db_path, profile)
+        self.database_loader.loaded.connect(self.on_database_loaded)
+        self.database_loader.failed.connect(self.on_database_failed)
+        self.database_loader.start()
 
         # テーブルをダブルクリックしたときに編集ダイアログを開く
         self.todo_table.doubleClicked.connect(self.edit_selected_todo)
@@ -192,26 +934,100 @@ class ToDoCalendarApp(QMainWindow):
         self.todo_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.todo_table.customContextMenuRequested.connect(self.show_todo_context_menu)
 
+        # 日付のクリックと月の切り替えを記録
+        if self.trace is not None:
+            self.calendar_widget.clicked[QDate].connect(
+                lambda date: self.record_interaction('date_click', date=date.toString('yyyy-MM-dd'))
+            )
+            self.calendar_widget.currentPageChanged.connect(self.trace.record_page)
+
     def update_datetime(self):
-        """現在の日時を更新する"""
-        current_datetime = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
+        """現在の日時を更新する（分単位）"""
+        current_datetime = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm")
         self.datetime_label.setText(current_datetime)
 
+    def on_day_changed(self, date_str):
+        """日付が変わったらカレンダーの今日の表示と本日のタスク・遅延タスクを読み直す"""
+        if self.data_ready:
+            self.refresh_overview()
+
+    def show_due_reminder(self, date_str):
+        """
+        期限が今日の未完了のタスクと期限切れのタスクをステータスバーに表示する
+
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        """
+        try:
+            due_titles, due_count = self.repository.open_due_titles('due', date_str, self.REMINDER_TITLE_LIMIT)
+            _, overdue_count = self.repository.open_due_titles('overdue', date_str, 1)
+        except Exception as e:
+            print(f"期限の確認中にエラーが発生しました: {e}")
+            return
+        if not due_count and not overdue_count:
+            return
+
+        parts = []
+        if due_count:
+            titles = '、'.join(due_titles) + ('…' if due_count > len(due_titles) else '')
+            parts.append(f"期限が本日のタスク {due_count}件（{titles}）")
+        if overdue_count:
+            parts.append(f"期限切れのタスク {overdue_count}件")
+        message = "⏰ " + " / ".join(parts)
+        self.statusBar().showMessage(message, self.REMINDER_MESSAGE_MS)
+        # ウィンドウが背面にある場合はタスクバーで知らせる
+        QApplication.alert(self)
+
     def _get_todo_cell_color(self, status):
         """ToDoステータスに基づく色を返すヘルパーメソッド"""
-        status_colors = {
-            "未着手": QColor("blue"),
-            "進行中": QColor("green"),
-            "完了済": QColor("orange")
-        }
-        return status_colors.get(status, QColor("black"))
+        return self.render_cache.status_color(status)
 
     def custom_paint_cell(self, painter, rect, date):
-        """セルのカスタム描画メソッド"""
+        """
+        セルのカスタム描画メソッド
+
+        ホバーやフォーカスの変化による再描画では、キャッシュしたセルの画像を貼り付けるだけにする
+        """
+        self.record_startup_metric('time_to_first_paint')
+
+        if not self.cell_cache.enabled:
+            self._paint_cell_contents(painter, rect, date)
+            return
+
+        today = QDate.currentDate()
+        state = (
+            date == self.calendar_widget.selectedDate(),
+            date == today,
+            date < today,
+            self.calendar_widget.yearShown(),
+            self.calendar_widget.monthShown(),
+            self.data_ready
+        )
+        key = self.cell_cache.key(date.toString('yyyy-MM-dd'), rect.size(), state)
+
+        pixmap = self.cell_cache.get(key)
+        if pixmap is None:
+            pixmap = self._render_cell_pixmap(painter, rect, date)
+            self.cell_cache.put(key, pixmap)
+        painter.drawPixmap(rect.topLeft(), pixmap)
+
+    def _render_cell_pixmap(self, painter, rect, date):
+        """セルを画面の解像度に合わせた QPixmap に描画"""
+        ratio = painter.device().devicePixelRatioF()
+        pixmap = QPixmap(rect.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+
+        cell_painter = QPainter(pixmap)
+        try:
+            cell_painter.setRenderHints(painter.renderHints())
+            self._paint_cell_contents(cell_painter, QRect(0, 0, rect.width(), rect.height()), date)
+        finally:
+            cell_painter.end()
+        return pixmap
+
+    def _paint_cell_contents(self, painter, rect, date):
+        """セルの背景・日付・ToDoタイトルを描画"""
         displayed_month = self.calendar_widget.monthShown()
         displayed_year = self.calendar_widget.yearShown()
-        date_month = date.month()
-        date_year = date.year()
         selected_date = self.calendar_widget.selectedDate()
 
         # 背景色の設定
@@ -229,276 +1045,612 @@ class ToDoCalendarApp(QMainWindow):
     def _set_cell_background(self, painter, rect, date, selected_date):
         """セルの背景色を設定"""
         if date == QDate.currentDate():
-            painter.fillRect(rect, QColor("#e6f7ff"))
+            painter.fillRect(rect, self.render_cache.today_background)
         elif date == selected_date:
-            painter.fillRect(rect, QColor("#d0f0c0"))
+            painter.fillRect(rect, self.render_cache.selected_background)
         else:
             painter.fillRect(rect, Qt.white)
 
     def _determine_date_text_color(self, date, displayed_month, displayed_year):
         """日付のテキスト色を決定"""
+        colors = self.render_cache.colors
         try:
             # 祝日チェック
-            date_str = date.toString('yyyy-MM-dd')
-            query = "SELECT is_holiday FROM Calendar WHERE date = ?"
-            result = self.db.execute_query(query, (date_str,))
-            is_holiday = result[0][0] if result else 0
-
-            if is_holiday:
-                return QColor("red")
+            if calendar_days.is_holiday(date.toPyDate()):
+                return colors["red"]
 
             weekday = date.dayOfWeek()
             if weekday == 6:  # 土曜日
-                return QColor("blue")
+                return colors["blue"]
             elif weekday == 7:  # 日曜日
-                return QColor("red")
+                return colors["red"]
             
             # 月の範囲外の日付
             if (date.year() < displayed_year or 
                 (date.year() == displayed_year and date.month() < displayed_month) or
                 (date.year() > displayed_year or date.month() > displayed_month)):
-                return QColor("silver")
+                return colors["silver"]
 
             # 現在の日付を取得
             today = QDate.currentDate()
 
             # 今日より前の日付を灰色に
             if date < today:
-                return QColor("gray")
+                return colors["gray"]
                 
-            return QColor("black")
+            return colors["black"]
 
         except Exception as e:
             print(f"テキスト色決定中にエラー: {e}")
-            return QColor("black")
+            return colors["black"]
 
     def _draw_date_text(self, painter, rect, date, text_color, selected_date):
         """日付のテキストを描画"""
-        date_font = painter.font()
-        date_font.setPointSize(20)
-        date_font.setBold(date == selected_date)
-        painter.setFont(date_font)
+        selected = date == selected_date
+        painter.setFont(self.render_cache.date_font_for(selected))
         painter.setPen(text_color)
-
-        painter.drawText(
-            rect.adjusted(5, 5, -5, -rect.height() // 2),
-            Qt.AlignLeft | Qt.AlignTop,
-            date.toString('d')
+        painter.drawStaticText(
+            QPointF(rect.x() + 5, rect.y() + 5),
+            self.render_cache.date_text(date.day(), selected)
         )
 
     def _draw_todo_titles(self, painter, rect, date):
         """ToDoタイトルを描画"""
+        # 読み込み中は日付のみ描画する
+        if not self.data_ready:
+            return
+
         try:
-            todos = self.db.execute_query(
-                '''
-                SELECT title, status FROM ToDo 
-                JOIN Calendar ON ToDo.calendar_id = Calendar.id 
-                WHERE Calendar.date = ?
-                ''',
-                (date.toString('yyyy-MM-dd'),)
-            )
+            # 期間（開始日〜期限）に含まれるToDoを優先度・期限の順に上位のみ取得し、残りは件数のみ表示する
+            todos, total = self.overview.top_active_titles_for_date(date.toString('yyyy-MM-dd'), self.CELL_TITLE_LIMIT)
 
             if todos:
-                todo_font = painter.font()
-                todo_font.setPointSize(9)
-                todo_font.setBold(False)
-                painter.setFont(todo_font)
+                cache = self.render_cache
+                painter.setFont(cache.todo_font)
+
+                # 表示しきれない場合は最後の行を残りの件数の表示に使う
+                if total > self.CELL_TITLE_LIMIT:
+                    todos = todos[:self.CELL_TITLE_LIMIT - 1]
 
                 x_offset = 25
                 y_offset = rect.height() // 2 - 28
-                for i, (title, status) in enumerate(todos[:6]): # 最大6件まで表示
-                    status_color = self._get_todo_cell_color(status)
-                    painter.setPen(status_color)
-                    painter.drawText(
-                        rect.adjusted(x_offset, y_offset + i * 15, -5, -5),
-                        Qt.AlignLeft,
-                        f"・ {title} ({status})"
+                # セル幅に収まるようにタイトルを省略する
+                text_width = rect.width() - x_offset - 5
+                for i, (title, status, priority) in enumerate(todos):
+                    painter.setPen(cache.status_color(status))
+                    # 優先度の高いタスクは印を変える
+                    mark = '★' if priority is not None and priority < DEFAULT_PRIORITY else '・'
+                    painter.drawStaticText(
+                        QPointF(rect.x() + x_offset, rect.y() + y_offset + i * 15),
+                        cache.todo_text(mark, title, status, text_width)
+                    )
+
+                if total > len(todos):
+                    painter.setPen(cache.colors['gray'])
+                    painter.drawStaticText(
+                        QPointF(rect.x() + x_offset, rect.y() + y_offset + len(todos) * 15),
+                        cache.more_text(total - len(todos))
                     )
         except Exception as e:
             print(f"セル描画中にエラーが発生: {e}")
 
     def show_todos_for_date(self, date):
-        selected_date = date.toString('yyyy-MM-dd')
+        if not self.data_ready:
+            return
 
-        # 選択した日付のToDoを取得するクエリ
-        query = '''
-        SELECT ToDo.id, ToDo.title, ToDo.status, ToDo.registrant, 
-            ToDo.assignee, ToDo.due_date, description
-        FROM ToDo
-        JOIN Calendar ON ToDo.calendar_id = Calendar.id
-        WHERE Calendar.date = ?
-        '''
+        # 表示を切り替える前に保留中の編集を保存
+        self.flush_pending_edits()
 
+        selected_date = date.toString('yyyy-MM-dd')
+
+        # 表示中にセル変更シグナルでDB更新が走らないようにする
+        self.todo_table.blockSignals(True)
         try:
-            todos = self.db.execute_query(query, (selected_date,))
+            # 選択した日付のToDoを取得
+            todos = self.tasks.list_active_on(selected_date)
 
             self.todo_table.setRowCount(0)
 
-            # タスクの数に応じてレイアウトを調整
-            max_tasks_per_column = 3 # 3つのタスクごとに新しい列を追加
-            row = 0
-            col = 0
-
             for todo in todos:
                 row_position = self.todo_table.rowCount()
                 self.todo_table.insertRow(row_position)
-
-                # ID (非表示)を最後の列に保存
-                for col, value in enumerate(todo):
-                    item = QTableWidgetItem(str(value) if value is not None else '')
-                    self.todo_table.setItem(row_position, col, item)
-
-                # 列の配置調整
-                col += 1
-                if col >= max_tasks_per_column:
-                    col = 0
-                    row += 1
+                self._set_todo_table_row(row_position, todo)
 
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"データ取得中にエラーが発生しました:\n{str(e)}")
+        finally:
+            self.todo_table.blockSignals(False)
 
-    def load_initial_data(self):
-        # 今日の日付のToDoを表示
-        today = QDate.currentDate()
-        self.show_todos_for_date(today)
-        
-        # カレンダーの再描画を強制
+    def _set_todo_table_row(self, row_position, todo):
+        """
+        ToDoテーブルの1行にToDoの内容を設定
+
+        :param row_position: 行番号
+        :param todo: TaskRecord
+        """
+        values = (todo.id, todo.title, todo.status, todo.registrant,
+                  todo.assignee, todo.due_date, todo.description)
+        for col, value in enumerate(values):
+            item = QTableWidgetItem(str(value) if value is not None else '')
+            self.todo_table.setItem(row_position, col, item)
+
+        # 楽観的排他制御用のバージョンをID列に保持
+        self.todo_table.item(row_position, 0).setData(Qt.UserRole, todo.version)
+
+    def on_database_loaded(self, db, repository, store, projects):
+        """
+        バックグラウンドでデータベースを開き終えたら、画面のデータを段階的に表示する
+
+        :param db: DatabaseConnectionオブジェクト
+        :param repository: TodoRepositoryオブジェクト
+        :param store: TaskStoreオブジェクト（無効な場合はNone）
+        :param projects: ProjectSetオブジェクト（プロジェクトを追加していない場合はNone）
+        """
+        self.db = db
+        self.repository = repository
+        self.task_store = store
+        self.tasks = store if store is not None else repository
+        self.projects = projects
+        if projects is not None:
+            self.project_combo.blockSignals(True)
+            for name in projects.names:
+                self.project_combo.addItem(name, [name])
+            self.project_combo.blockSignals(False)
+            self.project_combo.setVisible(True)
+        self.update_overview_sources()
+        self.data_ready = True
+        self.record_startup_metric('database_ready')
+        self.load_initial_data()
+
+    def update_overview_sources(self):
+        """
+        カレンダー・一覧・統計の読み取り元を選択中のプロジェクトに合わせる
+
+        メインのプロジェクトのみの場合は、リポジトリ（タスクストア）から直接読み取る
+        """
+        if self.projects is None or self.projects.only_main():
+            self.overview = self.tasks
+            self.overview_stats = self.repository
+        else:
+            self.overview = self.projects
+            self.overview_stats = self.projects
+
+    def on_project_selected(self, index):
+        """表示するプロジェクトを切り替え、カレンダーと一覧を作り直す"""
+        self.projects.select(self.project_combo.itemData(index))
+        self.update_overview_sources()
+        self.refresh_overview()
+
+    def refresh_overview(self):
+        """カレンダーの注釈・ToDoタイトルと本日のタスク・遅延タスクを読み直す"""
+        self.annotate_calendar_with_todos()
         self.calendar_widget.updateCells()
-        
-        # 遅延タスクを表示
         self.show_delayed_todos()
 
-    def annotate_calendar_with_todos(self):
-        try:
-            # 全ToDoデータを取得
-            query = '''
-            SELECT Calendar.date, GROUP_CONCAT(ToDo.title, ', ') as todo_titles
-            FROM ToDo
-            JOIN Calendar ON ToDo.calendar_id = Calendar.id
-            GROUP BY Calendar.date
-            '''
-            todo_dates = self.db.execute_query(query)
-
-            # カレンダーの既存のフォーマットをリセット
-            for date in self.calendar_widget.dateTextFormat():
-                format = QTextCharFormat()
-                self.calendar_widget.setDateTextFormat(date, format)
-
-            # 各日付にToDoタイトルを設定
-            for date_str, titles in todo_dates:
-                date = QDate.fromString(date_str, 'yyyy-MM-dd')
-                
-                # 日付の背景色とツールチップを設定
-                date_format = QTextCharFormat()
-                date_format.setToolTip(titles) # ツールチップにタイトルを設定
-                date_format.setBackground(QColor(200, 230, 255))  # 薄いブルー
-                
-                self.calendar_widget.setDateTextFormat(date, date_format)
+    def on_database_failed(self, message):
+        """データベースを開けなかった場合はエラーを表示して終了する"""
+        QMessageBox.critical(self, "エラー", f"データベースの初期化中にエラーが発生しました:\n{message}")
+        self.close()
+
+    def load_initial_data(self):
+        """
+        起動時のデータを段階的に表示する
+
+        各段階の間でイベントループに戻り、準備できたものから描画されるようにする
+        """
+        stages = [
+            # 今日の日付のToDoを表示
+            lambda: self.show_todos_for_date(QDate.currentDate()),
+            # 遅延タスクを表示
+            self.show_delayed_todos,
+            # カレンダーの注釈とToDoタイトルを表示
+            lambda: (self.annotate_calendar_with_todos(), self.calendar_widget.updateCells()),
+            self.finish_startup
+        ]
+
+        def run_next_stage():
+            stage = stages.pop(0)
+            stage()
+            if stages:
+                QTimer.singleShot(0, run_next_stage)
+
+        run_next_stage()
+
+    def finish_startup(self):
+        """ボタンと外部変更の検知を有効にし、操作可能になった時間を記録する"""
+        for button in self.data_buttons:
+            button.setEnabled(True)
+
+        # この画面から保存した変更は保存時に反映するため、変更履歴からは外部の変更のみ反映する
+        self.change_watcher = ChangeWatcher(self.db, self.repository.written_seqs)
+        self.change_timer.start(2000) # 2秒ごとに data_version を確認
+
+        # 次に期限を迎える日時にリマインダーを設定し、起動時点の期限のタスクを表示する
+        self.reminder_scheduler.set_repository(self.repository)
+        self.show_due_reminder(QDate.currentDate().toString('yyyy-MM-dd'))
+
+        # 前回のバックアップから間隔が空いていれば作成する（メモリ上のデータベースは終了時に破棄されるため作成しない）
+        if self.db.is_memory:
+            self.backup_button.setEnabled(False)
+        else:
+            self.backup_manager = backup.BackupManager(self.db.db_path)
+            self.backup_timer.start(self.BACKUP_CHECK_INTERVAL_MS)
+            self.run_scheduled_backup()
+
+        self.record_startup_metric('time_to_interactive')
+        print(
+            f"起動時間: 初回描画 {self.startup_metrics.get('time_to_first_paint', 0):.0f}ms / "
+            f"データベース準備 {self.startup_metrics['database_ready']:.0f}ms / "
+            f"操作可能 {self.startup_metrics['time_to_interactive']:.0f}ms"
+        )
+
+        if self.startup_profile is not None:
+            self.save_profile(self.startup_profile)
+            self.profile_shortcut = QShortcut(QKeySequence('Ctrl+Shift+P'), self)
+            self.profile_shortcut.activated.connect(self.toggle_interaction_profile)
+
+    def record_interaction(self, action, **fields):
+        """操作を記録（--record-trace で起動した場合のみ）"""
+        if self.trace is not None:
+            self.trace.record(action, **fields)
+
+    def toggle_interaction_profile(self):
+        """操作中のプロファイルの記録を開始・終了する"""
+        if self.interaction_profile is not None:
+            self.save_profile(self.interaction_profile)
+            self.interaction_profile = None
+            return
+
+        self.interaction_profile = profiling.ProfileSession('interaction', self.startup_profile.memory)
+        self.interaction_profile.start()
+        self.statusBar().showMessage("プロファイルを記録中です（Ctrl+Shift+P で終了して保存）")
+
+    def save_profile(self, session):
+        """
+        プロファイルの記録を終了し、データベースと同じ場所に保存
+
+        :param session: 記録中の ProfileSession
+        """
+        try:
+            paths = session.stop(profiling.output_folder_for(self.db))
+        except Exception as e:
+            print(f"プロファイルの保存中にエラーが発生しました: {e}")
+            return
+        message = f"プロファイルを保存しました: {paths[0]}"
+        self.statusBar().showMessage(message, 10000)
+        print(message)
+
+    def run_scheduled_backup(self):
+        """前回のバックアップから設定した間隔が経過していればバックアップを作成する"""
+        try:
+            if self.backup_manager.is_due():
+                self.start_backup(manual=False)
+        except Exception as e:
+            print(f"バックアップの確認中にエラーが発生しました: {e}")
+
+    def start_backup(self, manual):
+        """
+        バックグラウンドでバックアップを開始
+
+        :param manual: ボタンから実行した場合はTrue（完了時に結果を表示する）
+        """
+        if self.backup_worker is not None and self.backup_worker.isRunning():
+            if manual:
+                QMessageBox.information(self, "バックアップ", "バックアップを作成中です。")
+            return
+
+        self.backup_button.setEnabled(False)
+        self.backup_worker = BackupWorker(self.backup_manager, self)
+        self.backup_worker.progress.connect(
+            lambda copied, total: self.statusBar().showMessage(f"バックアップ中... {copied}/{total}ページ")
+        )
+        self.backup_worker.completed.connect(lambda result: self.on_backup_completed(result, manual))
+        self.backup_worker.failed.connect(self.on_backup_failed)
+        self.backup_worker.start()
+
+    def on_backup_completed(self, result, manual):
+        """バックアップの完了を表示"""
+        self.backup_button.setEnabled(True)
+        message = f"バックアップを作成しました: {result.path}"
+        self.statusBar().showMessage(message, 10000)
+        print(f"{message}（{result.pages}ページ / コピー {result.copy_seconds * 1000:.0f}ms / "
+              f"検証 {result.verify_seconds * 1000:.0f}ms）")
+        if manual:
+            QMessageBox.information(self, "バックアップ", message)
+
+    def on_backup_failed(self, message):
+        """バックアップの失敗を表示"""
+        self.backup_button.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "バックアップ", f"バックアップに失敗しました:\n{message}")
+
+    def record_startup_metric(self, name):
+        """
+        起動からの経過時間を記録（最初の1回のみ）
+
+        :param name: 計測項目名
+        """
+        if name not in self.startup_metrics:
+            self.startup_metrics[name] = (time.perf_counter() - self.start_time) * 1000
+
+    def visible_calendar_dates(self):
+        """カレンダーに表示中の月のページ（前後の月の日付を含む6週間）の日付文字列のリスト"""
+        first_of_month = QDate(self.calendar_widget.yearShown(), self.calendar_widget.monthShown(), 1)
+        offset = (first_of_month.dayOfWeek() - self.calendar_widget.firstDayOfWeek()) % 7
+        first = first_of_month.addDays(-offset)
+        return [first.addDays(day).toString('yyyy-MM-dd') for day in range(42)]
+
+    def annotate_calendar_page(self, year=None, month=None):
+        """表示する月のページが切り替わった場合、そのページの日付の注釈を設定"""
+        self.annotate_calendar_with_todos(self.visible_calendar_dates())
+        self.calendar_widget.updateCells()
+
+    def annotate_calendar_with_todos(self, date_strs=None):
+        """
+        カレンダーの日付にToDoの件数の注釈を設定
+
+        セルのタイトルと同じ読み取り元から、期間（開始日〜期限）にその日が含まれるToDoを
+        ステータス別に数える
+
+        :param date_strs: 更新対象の日付文字列（'yyyy-MM-dd'）の集合。Noneの場合は表示中のページの日付を更新
+        """
+        if not self.data_ready:
+            return
+
+        try:
+            if date_strs is None:
+                # データを読み直した場合は描画用のテキストとセルも作り直す
+                self.render_cache.clear()
+                self.cell_cache.invalidate()
+
+                # カレンダーの既存のフォーマットをリセット
+                for date in self.calendar_widget.dateTextFormat():
+                    format = QTextCharFormat()
+                    self.calendar_widget.setDateTextFormat(date, format)
+
+                # 表示中のページの件数を取得（他のページは切り替えたときに取得する）
+                todo_counts = self.overview.day_status_counts(self.visible_calendar_dates())
+            else:
+                # 指定された日付の件数のみ取得
+                date_strs = list(date_strs)
+                if not date_strs:
+                    return
+                todo_counts = self.overview.day_status_counts(date_strs)
+                self.cell_cache.invalidate(date_strs)
+
+                # 対象日付のフォーマットのみリセット
+                for date_str in date_strs:
+                    date = QDate.fromString(date_str, 'yyyy-MM-dd')
+                    self.calendar_widget.setDateTextFormat(date, QTextCharFormat())
+
+            # 日付ごとにステータス別の件数をまとめる
+            counts_by_date = {}
+            for date_str, status, count in todo_counts:
+                counts_by_date.setdefault(date_str, {})[status] = count
+
+            # 各日付にToDo件数を設定
+            for date_str, counts in counts_by_date.items():
+                date = QDate.fromString(date_str, 'yyyy-MM-dd')
+                breakdown = ' / '.join(
+                    f"{status} {counts[status]}" for status in ('未着手', '進行中', '完了済') if status in counts
+                )
+                
+                # 日付の背景色とツールチップを設定
+                date_format = QTextCharFormat()
+                date_format.setToolTip(f"タスク {sum(counts.values())}件（{breakdown}）") # ツールチップに件数を設定
+                date_format.setBackground(QColor(200, 230, 255))  # 薄いブルー
+                
+                self.calendar_widget.setDateTextFormat(date, date_format)
+
+        except Exception as e:
+            print(f"カレンダー注釈中にエラーが発生しました: {e}")
+
+    def check_external_changes(self):
+        """data_version を確認し、変更があれば差分のみ画面に反映する"""
+        changes = self.change_watcher.poll()
+        if changes:
+            if self.task_store is not None:
+                self.task_store.apply_changes(changes)
+            self.apply_todo_changes(changes)
+
+        # 追加のプロジェクトは変更履歴を持たないため、変更があれば表示を読み直す
+        if self.projects is not None and self.projects.poll_changed() and not self.projects.only_main():
+            self.refresh_overview()
+
+    def apply_todo_changes(self, changes):
+        """
+        変更履歴をもとにカレンダー・テーブル・遅延タスクを差分更新
+
+        :param changes: ChangeWatcher.poll() が返す変更履歴のリスト
+        """
+        changed_ids = set()
+        deleted_ids = set()
+        inserted_ids = set()
+        affected_dates = set()
+        open_statuses = ('未着手', '進行中')
+        delayed_affected = False
+
+        for _, todo_id, op, old_date, new_date, old_status, new_status, old_due, new_due in changes:
+            for start_date, due_date in ((old_date, old_due), (new_date, new_due)):
+                if start_date and affected_dates is not None:
+                    affected_dates = self._add_span_dates(affected_dates, start_date, due_date)
+
+            if op == 'D':
+                deleted_ids.add(todo_id)
+                changed_ids.discard(todo_id)
+            else:
+                changed_ids.add(todo_id)
+                if op == 'I':
+                    inserted_ids.add(todo_id)
+
+            if old_status in open_statuses or new_status in open_statuses:
+                delayed_affected = True
+
+        try:
+            # 変更された行だけを取得
+            changed_todos = self.tasks.get_many(changed_ids)
+
+            # 変更対象の日付のみ注釈を更新
+            self.annotate_calendar_with_todos(affected_dates)
+            self.calendar_widget.updateCells()
+
+            # 表示中の日付のテーブル行を更新
+            self.update_todo_table_rows(changed_todos, deleted_ids)
+
+            # 入力候補に追加されたToDoの値と新しい値を反映
+            self.update_completion_indexes(changed_todos, inserted_ids)
+
+            # 未完了タスクに関わる変更があった場合のみ遅延タスク・作業量の予測・リマインダーを更新
+            if delayed_affected:
+                self.show_delayed_todos()
+                self.reminder_scheduler.reschedule()
+                if self.workload_forecast is not None:
+                    self.workload_forecast.apply_changes(changed_todos, deleted_ids)
+                    if self.workload_dialog is not None:
+                        self.workload_dialog.update_table()
+
+        except Exception as e:
+            print(f"外部変更の反映中にエラーが発生しました: {e}")
+
+    def apply_local_write(self, changed_ids=(), deleted_ids=(), inserted_ids=()):
+        """
+        この画面から保存したToDoを入力候補・リマインダー・作業量の予測に反映
+
+        カレンダーと一覧は保存した処理で更新するため、ここでは更新しない
+
+        :param changed_ids: 変更したToDoのIDのリスト
+        :param deleted_ids: 削除したToDoのIDのリスト
+        :param inserted_ids: 追加したToDoのIDのリスト
+        """
+        try:
+            inserted_ids = {int(todo_id) for todo_id in inserted_ids}
+            deleted_ids = {int(todo_id) for todo_id in deleted_ids}
+            changed_todos = self.tasks.get_many({int(todo_id) for todo_id in changed_ids} | inserted_ids)
+
+            self.update_completion_indexes(changed_todos, inserted_ids)
+            self.reminder_scheduler.reschedule()
+            if self.workload_forecast is not None:
+                self.workload_forecast.apply_changes(changed_todos, deleted_ids)
+                if self.workload_dialog is not None:
+                    self.workload_dialog.update_table()
+
+        except Exception as e:
+            print(f"保存した変更の反映中にエラーが発生しました: {e}")
+
+    def _add_span_dates(self, dates, start_date, due_date):
+        """
+        ToDoの期間（開始日〜期限）の日付を追加
+
+        :param dates: 日付文字列の集合
+        :param start_date: 開始日
+        :param due_date: 期限（日付でない場合は開始日のみ）
+        :return: 追加後の集合。期間が長すぎる場合は全日付の更新を表す None
+        """
+        try:
+            span = calendar_days.span_dates(start_date, due_date or start_date, self.SPAN_UPDATE_LIMIT_DAYS)
+        except ValueError:
+            span = [start_date[:10]]
+        if span is None:
+            return None
+        dates.update(span)
+        return dates
+
+    def update_todo_table_rows(self, changed_todos, deleted_ids):
+        """
+        ToDoテーブルの行を差分更新
+
+        :param changed_todos: 変更された TaskRecord のリスト
+        :param deleted_ids: 削除されたToDoのIDの集合
+        """
+        selected_date = self.calendar_widget.selectedDate().toString('yyyy-MM-dd')
+
+        # 表示中の行をIDで引けるようにする
+        rows_by_id = {}
+        for row in range(self.todo_table.rowCount()):
+            id_item = self.todo_table.item(row, 0)
+            if id_item is not None:
+                rows_by_id[id_item.text()] = row
+
+        # 差分更新中にセル変更シグナルでDB更新が走らないようにする
+        self.todo_table.blockSignals(True)
+        try:
+            rows_to_remove = [rows_by_id[str(todo_id)] for todo_id in deleted_ids if str(todo_id) in rows_by_id]
+
+            for todo in changed_todos:
+                todo_id = str(todo.id)
+
+                # 保存前の編集がある行は編集中の値を残す（保存時にバージョンの競合として報告する）
+                if todo.id in self.pending_edits:
+                    continue
+
+                if not todo.start_day or not todo.start_day <= selected_date <= todo.end_day:
+                    # 期間が選択中の日付を含まなくなったタスクは表示から外す
+                    if todo_id in rows_by_id:
+                        rows_to_remove.append(rows_by_id[todo_id])
+                    continue
+
+                if todo_id in rows_by_id:
+                    row_position = rows_by_id[todo_id]
+                else:
+                    row_position = self.todo_table.rowCount()
+                    self.todo_table.insertRow(row_position)
+                    rows_by_id[todo_id] = row_position
+
+                self._set_todo_table_row(row_position, todo)
+
+            # 行番号がずれないよう後ろから削除
+            for row in sorted(set(rows_to_remove), reverse=True):
+                self.todo_table.removeRow(row)
+        finally:
+            self.todo_table.blockSignals(False)
+
+    def create_task_panel(self, model, delegate):
+        """
+        本日のタスク・遅延タスクの一覧を作成
 
-        except Exception as e:
-            print(f"カレンダー注釈中にエラーが発生しました: {e}")
+        :param model: TaskPanelModel
+        :param delegate: TaskPanelDelegate
+        :return: QListView
+        """
+        view = QListView()
+        view.setModel(model)
+        view.setItemDelegate(delegate)
+        view.setUniformItemSizes(True)
+        view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        view.clicked.connect(lambda index: self.toggle_task_panel_row(view, index))
+        return view
+
+    def toggle_task_panel_row(self, view, index):
+        """一覧の行の詳細・備考を展開・折りたたむ"""
+        model = view.model()
+        model.toggle_expanded(index)
+        # 展開した行がある間だけ行ごとに高さを計算する
+        view.setUniformItemSizes(not model.expanded)
 
     def show_delayed_todos(self):
-        # 今日の日付を取得
-        today = QDate.currentDate()
-        today_str = today.toString('yyyy-MM-dd')
-        
-        # 遅延タスクのクエリ（期限が昨日以前で未完了のタスク）
-        delayed_query = '''
-        SELECT title, status, start_date, due_date, assignee, description
-        FROM ToDo 
-        JOIN Calendar ON ToDo.calendar_id = Calendar.id 
-        WHERE Calendar.date < ? AND (status = '未着手' OR status = '進行中')
-        ORDER BY due_date ,start_date
-        '''
-        
-        # 本日のタスクのクエリ（今日までの未完了タスク）
-        today_query = '''
-        SELECT title, status, start_date, due_date, assignee, description
-        FROM ToDo 
-        JOIN Calendar ON ToDo.calendar_id = Calendar.id 
-        WHERE Calendar.date <= ? AND (status = '未着手' OR status = '進行中')
-        ORDER BY due_date, start_date
-        '''
-        
+        if not self.data_ready:
+            return
+
+        today_str = QDate.currentDate().toString('yyyy-MM-dd')
+
         try:
-            # リストをクリア
-            self.delayed_todos_list.clear()
-            self.today_todos_list.clear()
-            
-            # 遅延タスクの取得と表示
-            delayed_todos = self.db.execute_query(delayed_query, (today_str,))
-            
-            if delayed_todos:
-                for todo in delayed_todos:
-                    start_date = QDate.fromString(todo[2].split()[0], "yyyy-MM-dd")
-                    due_date = QDate.fromString(todo[3], "yyyy-MM-dd")
-                    
-                    # 遅延日数の計算（期限からの日数）
-                    delay_days = due_date.daysTo(today)
-                    
-                    # 遅延タスクは本日のリストに表示しない（期限が昨日以前のタスク）
-                    if due_date > today:
-                        continue
-                    
-                    delayed_text = (
-                        f"⚠️タイトル　 {todo[0]}\n"
-                        f"ステータス　 {todo[1]}\n"
-                        f"開始日　 {start_date.toString('yyyy-MM-dd')}\n"
-                        f"期限　 {due_date.toString('yyyy-MM-dd')}\n"
-                        f"遅延日数　 {delay_days}日\n"
-                        f"作業者　 {todo[4]}\n"
-                        f"詳細・備考　 {todo[5]}\n"
-                        "------------------\n"
-                    )
-                    self.delayed_todos_list.append(delayed_text)
-                    
-            else:
-                self.delayed_todos_list.append("遅延しているタスクはありません。\n")
-            
-            # 本日のタスクの取得と表示
-            today_todos = self.db.execute_query(today_query, (today_str,))
-            
-            if today_todos:
-                for todo in today_todos:
-                    start_date = QDate.fromString(todo[2].split()[0], "yyyy-MM-dd")
-                    due_date = QDate.fromString(todo[3], "yyyy-MM-dd")
-                    
-                    # 遅延タスクは本日のリストに表示しない（期限が昨日以前のタスク）
-                    if due_date < today:
-                        continue
-                    
-                    today_text = (
-                        f"📌タイトル　 {todo[0]}\n"
-                        f"ステータス　 {todo[1]}\n"
-                        f"開始日　 {start_date.toString('yyyy-MM-dd')}\n"
-                        f"期限　 {due_date.toString('yyyy-MM-dd')}\n"
-                        f"作業者　 {todo[4]}\n"
-                        f"詳細・備考　 {todo[5]}\n"
-                        "------------------\n"
-                    )
-                    self.today_todos_list.append(today_text)
-            else:
-                self.today_todos_list.append("本日のタスクはありません。\n")
-            
-            # 何もタスクがない場合のデフォルトメッセージ
-            if not delayed_todos and not today_todos:
-                self.delayed_todos_list.setPlainText('現在、遅延しているタスクはありません')
-                self.today_todos_list.setPlainText('現在、本日のタスクはありません')
-        
+            # 遅延タスク（昨日以前に開始し、期限が今日以前の未完了タスク）と
+            # 本日のタスク（今日までに開始し、期限が今日以降の未完了タスク）を優先度・期限の順に1ページ分取得
+            for model, view in ((self.delayed_todos_model, self.delayed_todos_list),
+                                (self.today_todos_model, self.today_todos_list)):
+                model.load(self.overview, today_str, self.PANEL_TASK_LIMIT)
+                view.setUniformItemSizes(not model.expanded)
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"タスクの取得中にエラーが発生しました:\n{str(e)}")
-    
-        # タスク表示後にスクロールバーを一番上に移動
-        if self.delayed_todos_list:
-            scrollbar = self.delayed_todos_list.verticalScrollBar()
-            scrollbar.setValue(scrollbar.minimum())
 
-        if self.today_todos_list:
-            scrollbar = self.today_todos_list.verticalScrollBar()
-            scrollbar.setValue(scrollbar.minimum())
+        # タスク表示後にスクロールバーを一番上に移動
+        self.delayed_todos_list.scrollToTop()
+        self.today_todos_list.scrollToTop()
 
     def edit_selected_todo(self):
+        self.flush_pending_edits()
+
         # 選択された行を取得
         selected_rows = self.todo_table.selectedIndexes()
         if not selected_rows:
@@ -514,43 +1666,123 @@ class ToDoCalendarApp(QMainWindow):
         dialog.exec_()
 
     def update_todo_from_table(self, row, column):
+        """
+        テーブルで直接編集された値を保留中の変更として記録する
+
+        変更は行（ToDo）ごとにまとめ、一定時間編集がないか、テーブルからフォーカスが外れたときに
+        flush_pending_edits で1つのトランザクションとして保存する
+        """
+        # ID 項目が存在し、None でないことを確認
+        id_item = self.todo_table.item(row, 0)
+        if id_item is None:
+            print("ID item is None. Skipping update.")
+            return
+
+        # 更新されたセル項目が存在し、None ではないかどうかを確認
+        updated_item = self.todo_table.item(row, column)
+        if updated_item is None:
+            print(f"Updated item at row {row}, column {column} is None. Skipping update.")
+            return
+
+        if column not in self.TABLE_EDIT_COLUMNS:
+            return
+
+        todo_id = int(id_item.text())
+
+        # ステータスは選択肢以外の値を保存できないため、元の値に戻す（貼り付けなどで入力された場合）
+        if self.TABLE_EDIT_COLUMNS[column] == 'status' and updated_item.text() not in STATUS_COLORS:
+            QMessageBox.warning(self, "エラー", f"ステータスは {'・'.join(STATUS_COLORS)} のいずれかを指定してください。")
+            pending_status = self.pending_edits.get(todo_id, {}).get('values', {}).get('status')
+            todo = self.tasks.get(todo_id)
+            self.todo_table.blockSignals(True)
+            updated_item.setText(pending_status or (todo.status if todo is not None else ''))
+            self.todo_table.blockSignals(False)
+            return
+
+        edit = self.pending_edits.setdefault(todo_id, {
+            'version': id_item.data(Qt.UserRole),
+            'values': {}
+        })
+        edit['values'][self.TABLE_EDIT_COLUMNS[column]] = updated_item.text()
+
+        # 最後の編集から一定時間後にまとめて保存
+        self.edit_flush_timer.start()
+
+    def flush_pending_edits(self):
+        """保留中のテーブル編集を1つのトランザクションで保存し、画面を1回だけ更新する"""
+        self.edit_flush_timer.stop()
+        if not self.pending_edits:
+            return
+
+        pending_edits, self.pending_edits = self.pending_edits, {}
+        edits = [(todo_id, edit['version'], edit['values']) for todo_id, edit in pending_edits.items()]
+        # 期限の変更で期間が縮んだ場合も表示を更新できるよう、更新前の期間を控えておく
+        previous_spans = [(todo.start_date, todo.due_date) for todo in self.tasks.get_many(pending_edits)]
+
         try:
-            # ID 項目が存在し、None でないことを確認
-            id_item = self.todo_table.item(row, 5)
-            if id_item is None:
-                print("ID item is None. Skipping update.")
-                return
-            
-            todo_id = id_item.text()
-            
-            # 更新されたセル項目が存在し、None ではないかどうかを確認
-            updated_item = self.todo_table.item(row, column)
-            if updated_item is None:
-                print(f"Updated item at row {row}, column {column} is None. Skipping update.")
-                return
-            
-            # 更新するカラム名を決定
-            columns = ['title', 'status', 'registrant', 'assignee', 'due_date']
-            
-            if column < len(columns):
-                column_name = columns[column]
-                new_value = updated_item.text()
-                
-                # 更新クエリ
-                query = f'UPDATE ToDo SET {column_name} = ? WHERE id = ?'
-                self.db.execute_query(query, (new_value, todo_id))
-                
-                # カレンダーの注釈を更新
-                self.annotate_calendar_with_todos()
-        
+            versions, conflicts, failures = self.tasks.update_many_if_unchanged(edits)
+        except sqlite3.OperationalError as e:
+            # ロック中などの一時的なエラーは、保存中に追加された編集を優先してまとめ直し、しばらく後に再試行する
+            for todo_id, edit in self.pending_edits.items():
+                pending_edits.setdefault(todo_id, edit)['values'].update(edit['values'])
+            self.pending_edits = pending_edits
+            self.statusBar().showMessage(f"ToDoを保存できませんでした。再試行します: {e}", 5000)
+            self.edit_flush_timer.start()
+            return
         except Exception as e:
+            # 再試行しても保存できない変更は破棄し、保存済みの内容を再表示する
             QMessageBox.critical(self, "エラー", f"ToDo更新中にエラーが発生しました:\n{str(e)}")
-            import traceback
             traceback.print_exc()
+            self.show_todos_for_date(self.calendar_widget.selectedDate())
+            return
 
+        # テーブルの行に更新後のバージョンを反映
+        self.todo_table.blockSignals(True)
+        try:
+            for row in range(self.todo_table.rowCount()):
+                id_item = self.todo_table.item(row, 0)
+                if id_item is not None and int(id_item.text()) in versions:
+                    id_item.setData(Qt.UserRole, versions[int(id_item.text())])
+        finally:
+            self.todo_table.blockSignals(False)
+
+        # 更新したToDoの期間（更新前・更新後）の日付のみ注釈と表示を更新
+        affected_dates = set()
+        spans = previous_spans + [(todo.start_date, todo.due_date) for todo in self.tasks.get_many(versions)]
+        for start_date, due_date in spans:
+            if start_date and affected_dates is not None:
+                affected_dates = self._add_span_dates(affected_dates, start_date, due_date)
+        self.annotate_calendar_with_todos(affected_dates)
+        self.calendar_widget.updateCells()
         self.show_delayed_todos()
+        self.apply_local_write(versions)
+
+        if failures:
+            messages = '\n'.join(f"ToDo(id={todo_id}): {e}" for todo_id, e in failures)
+            QMessageBox.critical(self, "エラー", f"次のToDoを更新できませんでした:\n{messages}\n保存済みの内容を再表示します。")
+        if conflicts:
+            messages = '\n'.join(str(e) for e in conflicts)
+            QMessageBox.warning(self, "更新の競合", f"{messages}\n最新の内容を再表示します。")
+        if failures or conflicts:
+            self.show_todos_for_date(self.calendar_widget.selectedDate())
+
+    def eventFilter(self, obj, event):
+        """
+        テーブルからフォーカスが外れたときに保留中の編集を保存する
+
+        カレンダーの大きさが変わったときは、セル幅に合わせて省略したテキストを破棄する
+        """
+        if obj is self.calendar_widget and event.type() == QEvent.Resize:
+            self.render_cache.clear()
+        elif obj is self.todo_table and event.type() == QEvent.FocusOut:
+            # セルのエディタへのフォーカス移動では保存しない
+            if not self.todo_table.isAncestorOf(QApplication.focusWidget()):
+                self.flush_pending_edits()
+        return super().eventFilter(obj, event)
 
     def delete_selected_todo(self):
+        self.flush_pending_edits()
+
         # 選択された行を取得
         selected_rows = self.todo_table.selectedIndexes()
         if not selected_rows:
@@ -572,11 +1804,8 @@ class ToDoCalendarApp(QMainWindow):
             try:
                 
                 # ToDo削除
-                query = 'DELETE FROM ToDo WHERE id = ?'
-                result = self.db.execute_query(query, (todo_id,))
-                
-                # デバッグ用：削除結果の確認
-                print(f"DELETE query result: {result}")
+                self.tasks.delete(todo_id)
+                self.apply_local_write(deleted_ids=[todo_id])
                 
                 # テーブルから行を削除
                 self.todo_table.removeRow(row)
@@ -593,12 +1822,13 @@ class ToDoCalendarApp(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "エラー", f"ToDo削除中にエラーが発生しました:\n{str(e)}")
                 # エラーの詳細をコンソールに出力
-                import traceback
                 traceback.print_exc()
 
         self.show_delayed_todos()
 
     def duplicate_selected_todo(self):
+        self.flush_pending_edits()
+
         # 選択された行を取得
         selected_rows = self.todo_table.selectedIndexes()
         if not selected_rows:
@@ -625,6 +1855,9 @@ class ToDoCalendarApp(QMainWindow):
         """
         Opens the Add Todo dialog for the selected date when the calendar is double-clicked
         """
+        if not self.data_ready:
+            return
+
         dialog = AddToDoDialog(self)
         # 選択された日付を開始日と期限日にデフォルト設定
         dialog.start_date_input.setSelectedDate(date)
@@ -639,8 +1872,62 @@ class ToDoCalendarApp(QMainWindow):
         dialog = AssigneeStatsDialog(self)
         dialog.exec_()
 
+    def get_completion_index(self, column):
+        """
+        入力候補の索引を取得（未作成の場合は値ごとの件数を読み込んで作成）
+
+        :param column: DROPDOWN_COLUMNS のいずれか
+        :return: PrefixIndex オブジェクト
+        """
+        index = self.completion_indexes.get(column)
+        if index is None:
+            # 作成前の変更を後から二重に数えないよう、未反映の変更履歴を先に反映する
+            self.check_external_changes()
+            index = PrefixIndex(self.repository.value_counts(column))
+            self.completion_indexes[column] = index
+        return index
+
+    def update_completion_indexes(self, changed_todos, inserted_ids):
+        """
+        作成済みの入力候補の索引に変更されたToDoの値を反映
+
+        追加されたToDoの値は件数を加算し、変更されたToDoは未登録の値のみ追加する
+        （削除・変更前の値は過去の入力として候補に残す）
+
+        :param changed_todos: 変更されたToDoのリスト
+        :param inserted_ids: 追加されたToDoのIDの集合
+        """
+        for column, index in self.completion_indexes.items():
+            for todo in changed_todos:
+                value = getattr(todo, column)
+                if todo.id in inserted_ids or value not in index:
+                    index.add(value)
+
+    def get_workload_forecast(self, rebuild=False):
+        """
+        作業量の予測を取得（未作成・日付が変わった・rebuild指定の場合は全件から作り直す）
+
+        :param rebuild: Trueの場合は必ず作り直す
+        :return: WorkloadForecast
+        """
+        today = task_analytics.to_day_number(datetime.now())
+        forecast = self.workload_forecast
+        if rebuild or forecast is None or forecast.first_day != today:
+            capacity = forecast.capacity if forecast is not None else task_analytics.DEFAULT_DAILY_CAPACITY
+            self.flush_pending_edits()
+            self.workload_forecast = task_analytics.load_workload_forecast(self.db, today, capacity=capacity)
+        return self.workload_forecast
+
+    def open_timeline_dialog(self):
+        # 保留中の編集を反映してから表示する
+        self.flush_pending_edits()
+        dialog = TimelineDialog(self)
+        dialog.exec_()
+
     def show_todo_context_menu(self, pos):
         """右クリック時のコンテキストメニューを表示"""
+        self.flush_pending_edits()
+
         # クリックされた行のインデックスを取得
         index = self.todo_table.indexAt(pos)
         
@@ -657,7 +1944,6 @@ class ToDoCalendarApp(QMainWindow):
             return
         
         current_status = status_item.text()
-        todo_id = todo_id_item.text()
         
         # ステータス更新の確認ダイアログ
         if current_status == '完了済':
@@ -672,30 +1958,75 @@ class ToDoCalendarApp(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
-            try:
-                # ステータスを更新
-                new_status = '進行中' if current_status == '未着手' else '完了済'
-                
-                # データベース更新クエリ
-                query = 'UPDATE ToDo SET status = ? WHERE id = ?'
-                self.db.execute_query(query, (new_status, todo_id))
-                
-                # テーブル内のステータスを更新
-                status_item.setText(new_status)
-                
-                # カレンダーの注釈を更新
-                self.annotate_calendar_with_todos()
-                
-                # 遅延タスクリストを更新
-                self.show_delayed_todos()
-                
-            except Exception as e:
-                QMessageBox.critical(self, "エラー", f"ステータス更新中にエラーが発生しました:\n{str(e)}")
+            self.advance_todo_status(row)
+
+    def advance_todo_status(self, row):
+        """
+        テーブルの行のToDoの進捗状況を1段階進める（未着手→進行中→完了済）
+
+        :param row: テーブルの行番号
+        """
+        status_item = self.todo_table.item(row, 2)  # ステータス列
+        todo_id_item = self.todo_table.item(row, 0)  # ID列
+        if status_item is None or todo_id_item is None or status_item.text() == '完了済':
+            return
+
+        current_status = status_item.text()
+        todo_id = todo_id_item.text()
+        version = todo_id_item.data(Qt.UserRole)
+        try:
+            # ステータスを更新
+            new_status = '進行中' if current_status == '未着手' else '完了済'
+            
+            # 読込時のバージョンから変更されていない場合のみ更新
+            new_version = self.tasks.update_if_unchanged(todo_id, version, {'status': new_status})
+            self.record_interaction('advance_status', row=row)
+            self.apply_local_write([todo_id])
+            
+            # テーブル内のステータスを更新
+            self.todo_table.blockSignals(True)
+            status_item.setText(new_status)
+            todo_id_item.setData(Qt.UserRole, new_version)
+            self.todo_table.blockSignals(False)
+            
+            # カレンダーの注釈を更新
+            self.annotate_calendar_with_todos()
+            
+            # 遅延タスクリストを更新
+            self.show_delayed_todos()
+            
+        except ConcurrentUpdateError as e:
+            QMessageBox.warning(self, "更新の競合", f"{str(e)}\n最新の内容を再表示します。")
+            self.show_todos_for_date(self.calendar_widget.selectedDate())
+
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"ステータス更新中にエラーが発生しました:\n{str(e)}")
 
 
     def closeEvent(self, event):
         """アプリケーション終了時に多重起動防止用インスタンスをリセット"""
+        self.flush_pending_edits()
         ToDoCalendarApp.instance = None
+        if self.interaction_profile is not None:
+            self.save_profile(self.interaction_profile)
+            self.interaction_profile = None
+        if self.trace is not None:
+            self.trace.close()
+        self.change_timer.stop()
+        self.backup_timer.stop()
+        self.reminder_scheduler.stop()
+        # 読み込み中・バックアップ中に閉じられた場合は完了を待つ
+        self.database_loader.wait()
+        if self.backup_worker is not None:
+            self.backup_worker.wait()
+        if self.change_watcher is not None:
+            self.change_watcher.close()
+        if self.projects is not None:
+            self.projects.close()
+        if self.repository is not None:
+            self.repository.close()
+        if self.db is not None:
+            self.db.close()
         event.accept()
 
 class EditToDoDialog(ToDoBaseDialog):
@@ -712,10 +2043,7 @@ class EditToDoDialog(ToDoBaseDialog):
         self.load_initial_todo_data()
 
         # タイトルコンボボックス
-        self.title_combo = QComboBox()
-        self.title_combo.setEditable(True)
-        title_list = self.get_dropdown_data('title')
-        self.title_combo.addItems(title_list)
+        self.title_combo = self.create_completion_combo('title')
         self.title_combo.setCurrentText(self.initial_data['title'])
 
         # 詳細入力
@@ -726,6 +2054,9 @@ class EditToDoDialog(ToDoBaseDialog):
         status_options = ['未着手', '進行中', '完了済']
         self.status_combo.addItems(status_options)
         self.status_combo.setCurrentText(self.initial_data['status'])
+
+        # 優先度のコンボボックス
+        self.priority_combo = self.create_priority_combo(self.initial_data['priority'])
         
         # 開始日のカレンダー
         self.start_date_input = QCalendarWidget()
@@ -741,22 +2072,17 @@ class EditToDoDialog(ToDoBaseDialog):
         self.start_date_input.clicked[QDate].connect(self.validate_date_selection)
         
         # 承認者のコンボボックス
-        self.registrant_combo = QComboBox()
-        self.registrant_combo.setEditable(True)
-        registrant_list = self.get_dropdown_data('registrant')
-        self.registrant_combo.addItems(registrant_list)
+        self.registrant_combo = self.create_completion_combo('registrant')
         self.registrant_combo.setCurrentText(self.initial_data['registrant'])
         
         # 作業者のコンボボックス
-        self.assignee_combo = QComboBox()
-        self.assignee_combo.setEditable(True)
-        assignee_list = self.get_dropdown_data('assignee')
-        self.assignee_combo.addItems(assignee_list)
+        self.assignee_combo = self.create_completion_combo('assignee')
         self.assignee_combo.setCurrentText(self.initial_data['assignee'])
         
         layout.addRow('タイトル　', self.title_combo)
         layout.addRow('詳細・備考　', self.description_input)
         layout.addRow('ステータス　', self.status_combo)
+        layout.addRow('優先度　', self.priority_combo)
         layout.addRow('開始日　', self.start_date_input)
         layout.addRow('期限日　', self.due_date_input)
         layout.addRow('承認者　', self.registrant_combo)
@@ -770,24 +2096,21 @@ class EditToDoDialog(ToDoBaseDialog):
 
     def load_initial_todo_data(self):
         # ToDoの初期データを取得
-        query = '''
-        SELECT ToDo.*, Calendar.date as calendar_date
-        FROM ToDo
-        JOIN Calendar ON ToDo.calendar_id = Calendar.id
-        WHERE ToDo.id = ?
-        '''
         try:
-            results = self.parent_window.db.execute_query(query, (self.todo_id,))
-            if results:
+            todo = self.parent_window.tasks.get(self.todo_id)
+            if todo is not None:
                 self.initial_data = {
-                    'title': str(results[0][2]),
-                    'description': str(results[0][3]) if results[0][3] else '',
-                    'status': str(results[0][4]),
-                    'registrant': str(results[0][5]),
-                    'assignee': str(results[0][6]),
-                    'start_date': str(results[0][10]),
-                    'due_date': str(results[0][9])
+                    'title': str(todo.title),
+                    'description': str(todo.description) if todo.description else '',
+                    'status': str(todo.status),
+                    'registrant': str(todo.registrant),
+                    'assignee': str(todo.assignee),
+                    'start_date': todo.start_day,
+                    'due_date': str(todo.due_date),
+                    'priority': todo.priority
                 }
+                # 更新時の競合検出に使用するバージョン
+                self.loaded_version = todo.version
             else:
                 raise Exception("ToDoが見つかりませんでした")
         except Exception as e:
@@ -798,39 +2121,31 @@ class EditToDoDialog(ToDoBaseDialog):
         try:
             # 開始日のカレンダーIDを取得
             start_date = self.start_date_input.selectedDate().toString('yyyy-MM-dd')
-            start_calendar_id_query = 'SELECT id FROM Calendar WHERE date = ?'
-            start_calendar_results = self.parent_window.db.execute_query(start_calendar_id_query, (start_date,))
-            
-            if not start_calendar_results:
-                QMessageBox.warning(self, "エラー", "開始日のカレンダーデータが見つかりません。")
-                return
-            
-            start_calendar_id = start_calendar_results[0][0]
+            start_calendar_id = calendar_days.calendar_id_for_date(start_date)
 
             # 期限日
             due_date = self.due_date_input.selectedDate().toString('yyyy-MM-dd')
 
-            # 更新クエリ
-            query = '''
-            UPDATE ToDo 
-            SET calendar_id = ?, title = ?, description = ?, status = ?, 
-                registrant = ?, assignee = ?, due_date = ?, start_date = ?
-            WHERE id = ?
-            '''
-            params = (
-                start_calendar_id,
-                self.title_combo.currentText(),  # タイトルコンボボックスから取得
-                self.description_input.toPlainText(),  # QTextEditから取得
-                self.status_combo.currentText(),
-                self.registrant_combo.currentText(),
-                self.assignee_combo.currentText(),
-                due_date,
-                start_date,
-                self.todo_id
-            )
+            # 更新する値
+            values = {
+                'calendar_id': start_calendar_id,
+                'title': self.title_combo.currentText(),  # タイトルコンボボックスから取得
+                'description': self.description_input.toPlainText(),  # QTextEditから取得
+                'status': self.status_combo.currentText(),
+                'registrant': self.registrant_combo.currentText(),
+                'assignee': self.assignee_combo.currentText(),
+                'due_date': due_date,
+                'start_date': start_date,
+                'priority': self.priority_combo.currentData()
+            }
             
-            # クエリの実行
-            self.parent_window.db.execute_query(query, params)
+            # 読込時のバージョンから変更されていない場合のみ更新
+            self.loaded_version = self.parent_window.tasks.update_if_unchanged(
+                self.todo_id, self.loaded_version, values
+            )
+            self.parent_window.apply_local_write([self.todo_id])
+            self.parent_window.record_interaction('edit_todo', row=self.parent_window.todo_table.currentRow(),
+                                                  values=values)
             
             # 保存後にToDoリストを更新
             self.parent_window.show_todos_for_date(
@@ -843,9 +2158,32 @@ class EditToDoDialog(ToDoBaseDialog):
             # ダイアログを閉じる
             self.accept()
         
+        except ConcurrentUpdateError as e:
+            reply = QMessageBox.question(
+                self,
+                '更新の競合',
+                f"{str(e)}\n入力内容を破棄して最新の内容を読み込みますか？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply == QMessageBox.Yes:
+                self.reload_todo_data()
+
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"ToDo更新中にエラーが発生しました:\n{str(e)}")
 
+    def reload_todo_data(self):
+        """最新のToDoデータを読み込み、入力欄に反映する"""
+        self.load_initial_todo_data()
+        self.title_combo.setCurrentText(self.initial_data['title'])
+        self.description_input.setPlainText(self.initial_data['description'])
+        self.status_combo.setCurrentText(self.initial_data['status'])
+        self.set_priority(self.priority_combo, self.initial_data['priority'])
+        self.start_date_input.setSelectedDate(QDate.fromString(self.initial_data['start_date'], 'yyyy-MM-dd'))
+        self.due_date_input.setSelectedDate(QDate.fromString(self.initial_data['due_date'], 'yyyy-MM-dd'))
+        self.registrant_combo.setCurrentText(self.initial_data['registrant'])
+        self.assignee_combo.setCurrentText(self.initial_data['assignee'])
+
 class AddToDoDialog(ToDoBaseDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -857,10 +2195,7 @@ class AddToDoDialog(ToDoBaseDialog):
         layout = QFormLayout()
 
         # タイトルコンボボックス
-        self.title_combo = QComboBox()
-        self.title_combo.setEditable(True)
-        title_list = self.get_dropdown_data('title')
-        self.title_combo.addItems(title_list)
+        self.title_combo = self.create_completion_combo('title')
         
         # 詳細入力
         self.description_input = QLineEdit()
@@ -868,6 +2203,9 @@ class AddToDoDialog(ToDoBaseDialog):
         # ステータスのコンボボックス
         self.status_combo = QComboBox()
         self.status_combo.addItems(['未着手', '進行中', '完了済'])
+
+        # 優先度のコンボボックス
+        self.priority_combo = self.create_priority_combo()
         
         # 開始日のカレンダー
         self.start_date_input = QCalendarWidget()
@@ -882,20 +2220,15 @@ class AddToDoDialog(ToDoBaseDialog):
         self.start_date_input.clicked[QDate].connect(self.validate_date_selection)
         
         # 承認者のコンボボックス
-        self.registrant_combo = QComboBox()
-        self.registrant_combo.setEditable(True)
-        registrant_list = self.get_dropdown_data('registrant')
-        self.registrant_combo.addItems(registrant_list)
+        self.registrant_combo = self.create_completion_combo('registrant')
         
         # 作業者のコンボボックス
-        self.assignee_combo = QComboBox()
-        self.assignee_combo.setEditable(True)
-        assignee_list = self.get_dropdown_data('assignee')
-        self.assignee_combo.addItems(assignee_list)
+        self.assignee_combo = self.create_completion_combo('assignee')
 
         layout.addRow('タイトル　', self.title_combo)
         layout.addRow('詳細・備考　', self.description_input)
         layout.addRow('ステータス　', self.status_combo)
+        layout.addRow('優先度　', self.priority_combo)
         layout.addRow('開始日　', self.start_date_input)
         layout.addRow('期限日　', self.due_date_input)
         layout.addRow('承認者　', self.registrant_combo)
@@ -911,38 +2244,25 @@ class AddToDoDialog(ToDoBaseDialog):
         try:
             # 開始日のカレンダーIDを取得
             start_date = self.start_date_input.selectedDate().toString('yyyy-MM-dd')
-            start_calendar_id_query = 'SELECT id FROM Calendar WHERE date = ?'
-            start_calendar_results = self.parent_window.db.execute_query(start_calendar_id_query, (start_date,))
-            
-            if not start_calendar_results:
-                QMessageBox.warning(self, "エラー", "開始日のカレンダーデータが見つかりません。")
-                return
-            
-            start_calendar_id = start_calendar_results[0][0]
+            start_calendar_id = calendar_days.calendar_id_for_date(start_date)
 
             # 期限日のカレンダーIDを取得
             due_date = self.due_date_input.selectedDate().toString('yyyy-MM-dd')
             
-            # 挿入クエリ
-            query = '''
-            INSERT INTO ToDo 
-            (calendar_id, title, description, status, registrant, assignee, due_date, start_date) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-
-            params = (
-                start_calendar_id,
-                self.title_combo.currentText(),
-                self.description_input.text(),
-                self.status_combo.currentText(),
-                self.registrant_combo.currentText(),
-                self.assignee_combo.currentText(),
-                due_date,
-                start_date
-            )
-            
-            # クエリの実行
-            self.parent_window.db.execute_query(query, params)
+            # ToDoを追加
+            values = {
+                'title': self.title_combo.currentText(),
+                'description': self.description_input.text(),
+                'status': self.status_combo.currentText(),
+                'registrant': self.registrant_combo.currentText(),
+                'assignee': self.assignee_combo.currentText(),
+                'due_date': due_date,
+                'start_date': start_date,
+                'priority': self.priority_combo.currentData()
+            }
+            todo_id = self.parent_window.tasks.insert(calendar_id=start_calendar_id, **values)
+            self.parent_window.apply_local_write(inserted_ids=[todo_id])
+            self.parent_window.record_interaction('add_todo', values=values)
             
             # カレンダーの注釈を更新
             self.parent_window.annotate_calendar_with_todos()
@@ -987,41 +2307,24 @@ class DuplicateToDoDialog(EditToDoDialog):
         try:
             # 開始日のカレンダーIDを取得
             start_date = self.start_date_input.selectedDate().toString('yyyy-MM-dd')
-            start_calendar_id_query = 'SELECT id FROM Calendar WHERE date = ?'
-            start_calendar_results = self.parent_window.db.execute_query(start_calendar_id_query, (start_date,))
-            
-            if not start_calendar_results:
-                QMessageBox.warning(self, "エラー", "開始日のカレンダーデータが見つかりません。")
-                return
-            
-            start_calendar_id = start_calendar_results[0][0]
+            start_calendar_id = calendar_days.calendar_id_for_date(start_date)
 
             # 期限日
             due_date = self.due_date_input.selectedDate().toString('yyyy-MM-dd')
 
-            # 複製クエリ（新しいIDで挿入）
-            query = '''
-            INSERT INTO ToDo 
-            (calendar_id, title, description, status, registrant, assignee, due_date, start_date) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-
-            duplicate_title = self.title_combo.currentText()
-            duplicate_description = self.description_input.toPlainText()
-            
-            params = (
-                start_calendar_id,
-                duplicate_title,
-                duplicate_description,
-                '未着手',  # ステータスを「未着手」にリセット
-                self.registrant_combo.currentText(),
-                self.assignee_combo.currentText(),
-                due_date,
-                start_date
+            # 新しいIDで複製を追加
+            todo_id = self.parent_window.tasks.insert(
+                calendar_id=start_calendar_id,
+                title=self.title_combo.currentText(),
+                description=self.description_input.toPlainText(),
+                status='未着手',  # ステータスを「未着手」にリセット
+                registrant=self.registrant_combo.currentText(),
+                assignee=self.assignee_combo.currentText(),
+                due_date=due_date,
+                start_date=start_date,
+                priority=self.priority_combo.currentData()
             )
-            
-            # クエリの実行
-            self.parent_window.db.execute_query(query, params)
+            self.parent_window.apply_local_write(inserted_ids=[todo_id])
             
             # 保存後にToDoリストを更新
             self.parent_window.show_todos_for_date(
@@ -1040,6 +2343,304 @@ class DuplicateToDoDialog(EditToDoDialog):
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"ToDo複製中にエラーが発生しました:\n{str(e)}")
 
+class TimelineView(QAbstractScrollArea):
+    """
+    作業者ごとにToDoを開始日〜期限のバーで表示するタイムライン
+
+    表示中の期間の前後だけを1回の範囲検索（list_overlapping）で読み込み、
+    スクロールがその範囲を出たときだけ読み直す。描画は見えている行と日付のみ行う
+    """
+    ROW_HEIGHT = 22
+    HEADER_HEIGHT = 36
+    LABEL_WIDTH = 180
+
+    # スクロールできる範囲（今日からの日数）
+    PAST_DAYS = 365
+    FUTURE_DAYS = 730
+
+    def __init__(self, tasks, parent=None):
+        """
+        :param tasks: ToDoの読み取り元（TodoRepository または TaskStore）
+        :param parent: 親ウィジェット
+        """
+        super().__init__(parent)
+        self.tasks = tasks
+        self.day_width = 16
+        self.origin = datetime.now().date() - timedelta(days=self.PAST_DAYS)
+        self.total_days = self.PAST_DAYS + self.FUTURE_DAYS + 1
+
+        # 読み込み済みの日の範囲（origin からの日数）と表示する行
+        self.loaded_range = None
+        # ('group', 作業者, 件数) または ('task', TaskRecord, 開始日の位置, 最終日の位置)
+        self.rows = []
+
+        self.label_font = QFont(self.font())
+        self.group_font = QFont(self.font())
+        self.group_font.setBold(True)
+        self.group_background = QColor("#eeeeee")
+        self.holiday_background = QColor("#fff0f0")
+        self.grid_color = QColor("#dddddd")
+        self.today_color = QColor("red")
+
+        self.viewport().setMouseTracking(True)
+        self.horizontalScrollBar().valueChanged.connect(self.on_scrolled)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+
+    # ---- スクロール範囲・読み込み ----
+
+    def chart_width(self):
+        return max(self.viewport().width() - self.LABEL_WIDTH, 0)
+
+    def chart_height(self):
+        return max(self.viewport().height() - self.HEADER_HEIGHT, 0)
+
+    def update_scroll_ranges(self):
+        """日付の幅・行数・表示領域の大きさに合わせてスクロールバーの範囲を設定"""
+        horizontal = self.horizontalScrollBar()
+        horizontal.setRange(0, max(self.total_days * self.day_width - self.chart_width(), 0))
+        horizontal.setPageStep(self.chart_width())
+        horizontal.setSingleStep(self.day_width)
+
+        vertical = self.verticalScrollBar()
+        vertical.setRange(0, max(len(self.rows) * self.ROW_HEIGHT - self.chart_height(), 0))
+        vertical.setPageStep(self.chart_height())
+        vertical.setSingleStep(self.ROW_HEIGHT)
+
+    def visible_day_range(self):
+        """表示中の最初と最後の日（origin からの日数）"""
+        first = self.horizontalScrollBar().value() // self.day_width
+        last = (self.horizontalScrollBar().value() + self.chart_width()) // self.day_width
+        return first, min(last, self.total_days - 1)
+
+    def ensure_loaded(self):
+        """表示中の期間が読み込み済みの範囲を出た場合、前後に余裕を持たせて読み直す"""
+        first, last = self.visible_day_range()
+        if self.loaded_range is not None and self.loaded_range[0] <= first and last <= self.loaded_range[1]:
+            return
+        margin = last - first + 1
+        self.load_range(max(first - margin, 0), min(last + margin, self.total_days - 1))
+
+    def load_range(self, first, last):
+        """
+        指定した期間と重なるToDoを読み込み、作業者ごとの行を作成
+
+        :param first: 最初の日（origin からの日数）
+        :param last: 最後の日（origin からの日数）
+        """
+        first_date = (self.origin + timedelta(days=first)).strftime('%Y-%m-%d')
+        last_date = (self.origin + timedelta(days=last)).strftime('%Y-%m-%d')
+        try:
+            todos = self.tasks.list_overlapping(first_date, last_date)
+        except Exception as e:
+            print(f"タイムラインの読み込み中にエラーが発生しました: {e}")
+            return
+
+        origin_number = calendar_days.to_day_number(self.origin)
+        groups = {}
+        for todo in todos:
+            start = calendar_days.to_day_number(todo.start_day) - origin_number
+            end = calendar_days.to_day_number(todo.end_day) - origin_number
+            groups.setdefault(todo.assignee or '（未割り当て）', []).append(('task', todo, start, end))
+
+        rows = []
+        for assignee in sorted(groups):
+            rows.append(('group', assignee, len(groups[assignee])))
+            rows.extend(groups[assignee])
+
+        self.rows = rows
+        self.loaded_range = (first, last)
+        self.update_scroll_ranges()
+        self.viewport().update()
+
+    def reload(self):
+        """読み込み済みの範囲を破棄して読み直す"""
+        self.loaded_range = None
+        self.ensure_loaded()
+
+    def set_day_width(self, day_width):
+        """
+        1日の幅（拡大率）を変更し、表示中の中央の日付を保つ
+
+        :param day_width: 1日の幅（ピクセル）
+        """
+        center = (self.horizontalScrollBar().value() + self.chart_width() // 2) / self.day_width
+        self.day_width = day_width
+        self.update_scroll_ranges()
+        self.horizontalScrollBar().setValue(int(center * day_width) - self.chart_width() // 2)
+        self.reload()
+
+    def scroll_to_date(self, target_date):
+        """指定した日付が左から1/4付近に来るようにスクロール"""
+        offset = (target_date - self.origin).days
+        self.horizontalScrollBar().setValue(offset * self.day_width - self.chart_width() // 4)
+        self.ensure_loaded()
+
+    def on_scrolled(self, value):
+        self.ensure_loaded()
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_ranges()
+        self.ensure_loaded()
+
+    # ---- 描画 ----
+
+    def row_at(self, y):
+        """表示領域のy座標にある行（ヘッダーや行のない位置の場合はNone）"""
+        if y < self.HEADER_HEIGHT:
+            return None
+        index = (y - self.HEADER_HEIGHT + self.verticalScrollBar().value()) // self.ROW_HEIGHT
+        return self.rows[index] if 0 <= index < len(self.rows) else None
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        try:
+            self._paint(painter)
+        finally:
+            painter.end()
+
+    def _paint(self, painter):
+        width = self.viewport().width()
+        height = self.viewport().height()
+        x_offset = self.LABEL_WIDTH - self.horizontalScrollBar().value()
+        y_offset = self.HEADER_HEIGHT - self.verticalScrollBar().value()
+        first_day, last_day = self.visible_day_range()
+        chart = QRect(self.LABEL_WIDTH, self.HEADER_HEIGHT, self.chart_width(), self.chart_height())
+        painter.fillRect(self.viewport().rect(), Qt.white)
+
+        # 土日・祝日の背景と日付の区切り線
+        painter.setClipRect(QRect(self.LABEL_WIDTH, 0, self.chart_width(), height))
+        for day in range(first_day, last_day + 1):
+            x = x_offset + day * self.day_width
+            day_date = self.origin + timedelta(days=day)
+            if day_date.weekday() >= 5 or calendar_days.is_holiday(day_date):
+                painter.fillRect(x, self.HEADER_HEIGHT, self.day_width, height, self.holiday_background)
+            if self.day_width >= 8 or day_date.day == 1:
+                painter.setPen(self.grid_color)
+                painter.drawLine(x, self.HEADER_HEIGHT // 2, x, height)
+
+        # 表示中の行だけを描画
+        first_row = max((self.HEADER_HEIGHT - y_offset) // self.ROW_HEIGHT, 0)
+        last_row = min((height - y_offset) // self.ROW_HEIGHT + 1, len(self.rows))
+        metrics = QFontMetrics(self.label_font)
+        for index in range(first_row, last_row):
+            row = self.rows[index]
+            y = y_offset + index * self.ROW_HEIGHT
+            if row[0] == 'group':
+                painter.setClipping(False)
+                painter.fillRect(0, y, width, self.ROW_HEIGHT, self.group_background)
+                painter.setFont(self.group_font)
+                painter.setPen(Qt.black)
+                painter.drawText(QRect(5, y, width, self.ROW_HEIGHT), Qt.AlignVCenter | Qt.AlignLeft,
+                                 f"{row[1]}（{row[2]}件）")
+                continue
+
+            _, todo, start, end = row
+            color = STATUS_COLORS.get(todo.status, QColor("black"))
+            painter.setClipRect(chart)
+            bar = QRect(x_offset + start * self.day_width, y + 4,
+                        (end - start + 1) * self.day_width - 1, self.ROW_HEIGHT - 8)
+            fill = QColor(color)
+            fill.setAlpha(90)
+            painter.fillRect(bar, fill)
+            painter.setPen(color)
+            painter.drawRect(bar)
+
+            painter.setClipping(False)
+            painter.setFont(self.label_font)
+            painter.setPen(color)
+            title = metrics.elidedText(str(todo.title), Qt.ElideRight, self.LABEL_WIDTH - 20)
+            painter.drawText(QRect(15, y, self.LABEL_WIDTH - 15, self.ROW_HEIGHT), Qt.AlignVCenter | Qt.AlignLeft, title)
+
+        # 日付の見出し（月と日）
+        painter.setClipping(False)
+        painter.fillRect(0, 0, width, self.HEADER_HEIGHT, Qt.white)
+        painter.setClipRect(QRect(self.LABEL_WIDTH, 0, self.chart_width(), self.HEADER_HEIGHT))
+        painter.setFont(self.label_font)
+        painter.setPen(Qt.black)
+        for day in range(first_day, last_day + 1):
+            x = x_offset + day * self.day_width
+            day_date = self.origin + timedelta(days=day)
+            if day_date.day == 1 or day == first_day:
+                painter.drawText(QRect(x + 2, 0, 120, self.HEADER_HEIGHT // 2), Qt.AlignVCenter | Qt.AlignLeft,
+                                 day_date.strftime('%Y年%m月'))
+            if self.day_width >= 16:
+                painter.drawText(QRect(x, self.HEADER_HEIGHT // 2, self.day_width, self.HEADER_HEIGHT // 2),
+                                 Qt.AlignCenter, str(day_date.day))
+
+        # 今日の位置
+        painter.setClipRect(QRect(self.LABEL_WIDTH, 0, self.chart_width(), height))
+        today_x = x_offset + (datetime.now().date() - self.origin).days * self.day_width + self.day_width // 2
+        painter.setPen(self.today_color)
+        painter.drawLine(today_x, 0, today_x, height)
+
+        painter.setClipping(False)
+        painter.setPen(self.grid_color)
+        painter.drawLine(0, self.HEADER_HEIGHT - 1, width, self.HEADER_HEIGHT - 1)
+        painter.drawLine(self.LABEL_WIDTH - 1, 0, self.LABEL_WIDTH - 1, height)
+
+    def viewportEvent(self, event):
+        """バーや行にマウスを合わせたときにToDoの内容を表示"""
+        if event.type() == QEvent.ToolTip:
+            row = self.row_at(event.pos().y())
+            if row is not None and row[0] == 'task':
+                todo = row[1]
+                QToolTip.showText(
+                    event.globalPos(),
+                    f"{todo.title}\n{todo.start_day} 〜 {todo.end_day}\n"
+                    f"ステータス: {todo.status} / 作業者: {todo.assignee or ''}"
+                )
+            else:
+                QToolTip.hideText()
+            return True
+        return super().viewportEvent(event)
+
+class TimelineDialog(QDialog):
+    # 拡大率と1日の幅（ピクセル）
+    ZOOM_LEVELS = {'日': 32, '週': 12, '月': 4}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_window = parent
+        self.setWindowTitle('タイムライン')
+        self.setGeometry(150, 150, 1200, 700)
+
+        self.timeline = TimelineView(parent.overview, self)
+
+        self.zoom_combo = QComboBox()
+        self.zoom_combo.addItems(list(self.ZOOM_LEVELS))
+        self.zoom_combo.setCurrentText('週')
+        self.zoom_combo.currentTextChanged.connect(
+            lambda text: self.timeline.set_day_width(self.ZOOM_LEVELS[text])
+        )
+
+        today_button = QPushButton('今日')
+        today_button.clicked.connect(lambda: self.timeline.scroll_to_date(datetime.now().date()))
+
+        reload_button = QPushButton('再読込')
+        reload_button.clicked.connect(self.timeline.reload)
+
+        toolbar_layout = QHBoxLayout()
+        toolbar_layout.addWidget(QLabel('表示単位:'))
+        toolbar_layout.addWidget(self.zoom_combo)
+        toolbar_layout.addWidget(today_button)
+        toolbar_layout.addStretch()
+        toolbar_layout.addWidget(reload_button)
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(toolbar_layout)
+        main_layout.addWidget(self.timeline)
+        self.setLayout(main_layout)
+
+        self.timeline.day_width = self.ZOOM_LEVELS['週']
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 表示領域の大きさが決まってから今日の位置までスクロールする
+        self.timeline.update_scroll_ranges()
+        self.timeline.scroll_to_date(datetime.now().date())
+
 class AssigneeStatsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1047,6 +2648,14 @@ class AssigneeStatsDialog(QDialog):
         self.setWindowTitle('作業者別タスク統計')
         self.setGeometry(200, 200, 800, 600)
 
+        # 期間・統計タイプごとの集計結果のキャッシュ
+        self.stats_cache = {}
+
+        # 再利用するグラフ要素（棒・ラベル）と表示中の作業者
+        self.bars = []
+        self.bar_labels = []
+        self.bar_assignees = None
+
         # メインレイアウト
         main_layout = QVBoxLayout()
 
@@ -1071,19 +2680,33 @@ class AssigneeStatsDialog(QDialog):
         # デフォルトで完了タスクを選択
         self.completed_radio.setChecked(True)
 
-        # グラフエリア
-        self.figure, self.ax = plt.subplots(figsize=(10, 6), dpi=100)
+        # グラフエリア（pyplotのグローバル状態を使わずダイアログごとにFigureを持つ）
+        self.figure = Figure(figsize=(10, 6), dpi=100)
+        self.ax = self.figure.add_subplot(111)
         self.canvas = FigureCanvas(self.figure)
 
-        # 更新ボタン
+        # 更新ボタン（キャッシュを破棄して再集計）
         update_button = QPushButton('統計更新')
-        update_button.clicked.connect(self.update_statistics)
+        update_button.clicked.connect(self.refresh_statistics)
+
+        # 推移分析ボタン
+        analytics_button = QPushButton('推移分析')
+        analytics_button.clicked.connect(self.open_analytics_dialog)
+
+        # 作業量の予測ボタン
+        workload_button = QPushButton('負荷予測')
+        workload_button.clicked.connect(self.open_workload_dialog)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(update_button)
+        button_layout.addWidget(analytics_button)
+        button_layout.addWidget(workload_button)
 
         # レイアウトに追加
         main_layout.addLayout(period_layout)
         main_layout.addLayout(radio_layout)
         main_layout.addWidget(self.canvas)
-        main_layout.addWidget(update_button)
+        main_layout.addLayout(button_layout)
 
         self.setLayout(main_layout)
 
@@ -1091,11 +2714,29 @@ class AssigneeStatsDialog(QDialog):
         self.update_statistics()
 
         # ラジオボタンと期間コンボボックスの変更イベント
-        self.completed_radio.toggled.connect(self.update_statistics)
-        self.uncompleted_radio.toggled.connect(self.update_statistics)
-        self.delayed_radio.toggled.connect(self.update_statistics)
+        self.completed_radio.toggled.connect(self.on_category_toggled)
+        self.uncompleted_radio.toggled.connect(self.on_category_toggled)
+        self.delayed_radio.toggled.connect(self.on_category_toggled)
         self.period_combo.currentTextChanged.connect(self.update_statistics)
 
+    def open_analytics_dialog(self):
+        dialog = TaskAnalyticsDialog(self.parent_window)
+        dialog.exec_()
+
+    def open_workload_dialog(self):
+        dialog = WorkloadForecastDialog(self.parent_window)
+        dialog.exec_()
+
+    def on_category_toggled(self, checked):
+        """ラジオボタンの切り替え時は選択された側のみで更新する"""
+        if checked:
+            self.update_statistics()
+
+    def refresh_statistics(self):
+        """キャッシュを破棄して統計を再集計"""
+        self.stats_cache.clear()
+        self.update_statistics()
+
     def get_date_range(self):
         """選択された期間の開始日と終了日を取得"""
         today = datetime.now()  # 本日の日付
@@ -1110,92 +2751,73 @@ class AssigneeStatsDialog(QDialog):
 
         return start_date, end_date
 
+    def get_category(self):
+        """選択された統計タイプを取得"""
+        if self.completed_radio.isChecked():
+            return 'completed'
+        elif self.uncompleted_radio.isChecked():
+            return 'uncompleted'
+        return 'delayed'
+
+    def fetch_statistics(self, category, start_date, end_date):
+        """
+        作業者別タスク数を集計する
+
+        :return: (作業者のタプル, タスク数のタプル, 全タスク数)
+        """
+        # データの読み込みが終わっているかの確認
+        if self.parent_window.overview_stats is None:
+            raise AttributeError("データベース接続が設定されていません")
+
+        # 集計テーブルから作業者別タスク数を取得（全タスク数は作業者別の件数の合計）
+        results = self.parent_window.overview_stats.assignee_counts(category, str(start_date), str(end_date))
+        total_tasks = sum(result[1] for result in results)
+
+        assignees = tuple(str(result[0]) if result[0] else '（未設定）' for result in results)
+        task_counts = tuple(result[1] for result in results)
+        return assignees, task_counts, total_tasks
+
     def update_statistics(self):
         """作業者別のタスク統計を取得し、グラフを更新"""
         try:
             start_date, end_date = self.get_date_range()
-
-            # 条件の定義
-            if self.completed_radio.isChecked():
-                where_condition = "status = '完了済'"
-                title_text = '完了タスク'
-            elif self.uncompleted_radio.isChecked():
-                where_condition = "status != '完了済'"
-                title_text = '未完了タスク'
-            else:  # 遅延タスク
-                where_condition = "status != '完了済' AND due_date < ?"
-                title_text = '遅延タスク'
-
-            # 作業者別タスク数を取得するクエリ
-            query = f'''
-            SELECT assignee, COUNT(*) as task_count 
-            FROM ToDo 
-            WHERE {where_condition} 
-            AND start_date BETWEEN ? AND ?
-            GROUP BY assignee
-            ORDER BY task_count DESC
-            '''
-
-            # 全タスク数を取得するクエリ
-            total_task_query = f'''
-            SELECT COUNT(*) as task_count 
-            FROM ToDo 
-            WHERE {where_condition} 
-            AND start_date BETWEEN ? AND ?
-            '''
-
-            # クエリパラメータの準備
-            if self.delayed_radio.isChecked():
-                query_params = (str(end_date), str(start_date), str(end_date))
-                total_task_params = (str(end_date), str(start_date), str(end_date))
-            else:
-                query_params = (str(start_date), str(end_date))
-                total_task_params = (str(start_date), str(end_date))
-
-            # データベース接続の確認
-            if not hasattr(self.parent_window, 'db'):
-                raise AttributeError("データベース接続が設定されていません")
-
-            # クエリの実行
-            results = self.parent_window.db.execute_query(query, query_params)
-            total_tasks = self.parent_window.db.execute_query(total_task_query, total_task_params)[0][0]
+            category = self.get_category()
+            title_text = {
+                'completed': '完了タスク',
+                'uncompleted': '未完了タスク',
+                'delayed': '遅延タスク'
+            }[category]
+
+            # 同じ期間・統計タイプの集計結果はキャッシュから取得
+            cache_key = (category, start_date, end_date)
+            if cache_key not in self.stats_cache:
+                self.stats_cache[cache_key] = self.fetch_statistics(category, start_date, end_date)
+            assignees, task_counts, total_tasks = self.stats_cache[cache_key]
 
             # データが空の場合の処理
-            if not results:
+            if not assignees:
                 QMessageBox.information(self, "情報", "該当するタスクがありません")
                 return
 
-            # データ準備
-            assignees = [result[0] for result in results]
-            task_counts = [result[1] for result in results]
-
             # パーセンテージ計算（ゼロ除算回避）
             task_percentages = [count / total_tasks * 100 if total_tasks > 0 else 0 for count in task_counts]
 
-            # グラフをクリア
-            self.ax.clear()
+            # 作業者の並びが変わった場合のみ棒とラベルを作り直す
+            if assignees != self.bar_assignees:
+                self.rebuild_bars(assignees)
 
-            # 棒グラフ描画
-            bars = self.ax.bar(assignees, task_counts)
+            # 棒の高さと数値ラベルのみ更新
+            for bar, label, count, percentage in zip(self.bars, self.bar_labels, task_counts, task_percentages):
+                bar.set_height(count)
+                label.set_y(count)
+                label.set_text(f'{count:.0f} ({percentage:.1f}%)')
+
+            self.ax.set_ylim(0, max(task_counts) * 1.15)
             self.ax.set_title(f'作業者別{title_text}統計 ({self.period_combo.currentText()})')
-            self.ax.set_xlabel('作業者')
             self.ax.set_ylabel(f'{title_text}数')
 
-            # 棒の上に数値とパーセンテージを表示
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                percentage = task_percentages[i]
-                self.ax.text(
-                    bar.get_x() + bar.get_width()/2., height,
-                    f'{height:.0f} ({percentage:.1f}%)', 
-                    ha='center', va='bottom'
-                )
-
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-
-            # キャンバスを再描画
-            self.canvas.draw()
+            # 次のイベントループでまとめて再描画
+            self.canvas.draw_idle()
 
         except Exception as e:
             QMessageBox.critical(
@@ -1204,9 +2826,263 @@ class AssigneeStatsDialog(QDialog):
                 f"統計取得中に予期せぬエラーが発生しました:\n{str(e)}"
             )
 
+    def rebuild_bars(self, assignees):
+        """作業者ごとの棒と数値ラベルを作成し直す"""
+        for artist in self.bars + self.bar_labels:
+            artist.remove()
+
+        positions = range(len(assignees))
+        self.bars = list(self.ax.bar(positions, [0] * len(assignees)))
+        self.bar_labels = [
+            self.ax.text(bar.get_x() + bar.get_width() / 2., 0, '', ha='center', va='bottom')
+            for bar in self.bars
+        ]
+        self.bar_assignees = assignees
+
+        self.ax.set_xticks(list(positions))
+        self.ax.set_xticklabels(assignees, rotation=45, ha='right')
+        self.ax.set_xlabel('作業者')
+        self.figure.tight_layout()
+
+class TaskAnalyticsDialog(QDialog):
+    # 作業者別スループットに表示する最大人数
+    MAX_THROUGHPUT_ASSIGNEES = 15
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_window = parent
+        self.setWindowTitle('タスク推移分析')
+        self.setGeometry(200, 200, 1000, 800)
+
+        main_layout = QVBoxLayout()
+
+        # 期間選択（初期値は過去90日）
+        range_layout = QHBoxLayout()
+        self.start_date_edit = QDateEdit(QDate.currentDate().addDays(-90))
+        self.start_date_edit.setCalendarPopup(True)
+        self.start_date_edit.setDisplayFormat('yyyy-MM-dd')
+        self.end_date_edit = QDateEdit(QDate.currentDate())
+        self.end_date_edit.setCalendarPopup(True)
+        self.end_date_edit.setDisplayFormat('yyyy-MM-dd')
+        range_layout.addWidget(QLabel('期間:'))
+        range_layout.addWidget(self.start_date_edit)
+        range_layout.addWidget(QLabel('～'))
+        range_layout.addWidget(self.end_date_edit)
+        range_layout.addStretch()
+        self.elapsed_label = QLabel()
+        range_layout.addWidget(self.elapsed_label)
+
+        # グラフエリア（日別推移・作業者別スループット・遅延件数の推移）
+        self.figure = Figure(figsize=(10, 8), dpi=100)
+        self.daily_ax = self.figure.add_subplot(311)
+        self.throughput_ax = self.figure.add_subplot(312)
+        self.overdue_ax = self.figure.add_subplot(313)
+        self.canvas = FigureCanvas(self.figure)
+
+        # 日別推移の線は作成済みのものを使い回す
+        self.created_line, = self.daily_ax.plot([], [], label='作成')
+        self.completed_line, = self.daily_ax.plot([], [], label='完了')
+        self.open_line, = self.daily_ax.plot([], [], label='未完了')
+        self.daily_ax.set_title('日別タスク件数')
+        self.daily_ax.legend(loc='upper left')
+        self.overdue_line, = self.overdue_ax.plot([], [], color='red')
+        self.overdue_ax.set_title('遅延タスク件数の推移')
+
+        # 再読込ボタン（データベースから再抽出）
+        reload_button = QPushButton('データ再読込')
+        reload_button.clicked.connect(self.reload_extract)
+
+        main_layout.addLayout(range_layout)
+        main_layout.addWidget(self.canvas)
+        main_layout.addWidget(reload_button)
+        self.setLayout(main_layout)
+
+        # ToDo全件を列指向で1回だけ抽出し、期間の変更時はメモリ上で再集計する
+        self.extract = None
+        self.reload_extract()
+
+        self.start_date_edit.dateChanged.connect(self.update_charts)
+        self.end_date_edit.dateChanged.connect(self.update_charts)
+
+    def reload_extract(self):
+        """データベースからタスクの列指向データを再取得"""
+        try:
+            self.extract = task_analytics.load_task_extract(self.parent_window.db)
+            self.update_charts()
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"分析データの取得中にエラーが発生しました:\n{str(e)}")
+
+    def update_charts(self):
+        """選択された期間で集計し、グラフを更新"""
+        if self.extract is None:
+            return
+
+        start = self.start_date_edit.date()
+        end = self.end_date_edit.date()
+        if end < start:
+            return
+
+        started_at = time.perf_counter()
+        series = task_analytics.compute_time_series(
+            self.extract,
+            task_analytics.to_day_number(start.toPyDate()),
+            task_analytics.to_day_number(end.toPyDate())
+        )
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        dates = task_analytics.day_numbers_to_datetime64(series['days'])
+        self.created_line.set_data(dates, series['created'])
+        self.completed_line.set_data(dates, series['completed'])
+        self.open_line.set_data(dates, series['open'])
+        self.overdue_line.set_data(dates, series['overdue'])
+        for ax in (self.daily_ax, self.overdue_ax):
+            ax.relim()
+            ax.autoscale_view()
+
+        # 完了件数の多い作業者から表示
+        throughput = series['throughput']
+        order = np.argsort(throughput)[::-1][:self.MAX_THROUGHPUT_ASSIGNEES]
+        names = [series['assignee_names'][i] or '（未設定）' for i in order]
+        self.throughput_ax.clear()
+        self.throughput_ax.bar(range(len(order)), throughput[order])
+        self.throughput_ax.set_xticks(list(range(len(order))))
+        self.throughput_ax.set_xticklabels(names, rotation=30, ha='right')
+        self.throughput_ax.set_title('作業者別完了件数（スループット）')
+
+        self.elapsed_label.setText(f'{len(self.extract)}件を{elapsed_ms:.1f}msで集計')
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+class WorkloadForecastDialog(QDialog):
+    # 作業者ごとの集計列（この後に予測期間の日ごとの列が続く）
+    SUMMARY_HEADERS = ['作業者', '未完了', '期限切れ', '最大/日', '過負荷日数']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_window = parent
+        self.setWindowTitle('作業者別の負荷予測')
+        self.setGeometry(150, 150, 1200, 600)
+
+        main_layout = QVBoxLayout()
+
+        # 1稼働日に対応できるタスク数の目安
+        capacity_layout = QHBoxLayout()
+        self.capacity_spin = QDoubleSpinBox()
+        self.capacity_spin.setRange(0.1, 50.0)
+        self.capacity_spin.setSingleStep(0.5)
+        capacity_layout.addWidget(QLabel('1日の目安（件）:'))
+        capacity_layout.addWidget(self.capacity_spin)
+        capacity_layout.addStretch()
+        self.elapsed_label = QLabel()
+        capacity_layout.addWidget(self.elapsed_label)
+
+        # 作業者ごとの集計と、日ごとの作業量（過負荷の日は赤で表示）
+        self.table = QTableWidget()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+
+        # 再計算ボタン（データベースから全件を読み直す）
+        reload_button = QPushButton('再計算')
+        reload_button.clicked.connect(lambda: self.load_forecast(rebuild=True))
+
+        main_layout.addLayout(capacity_layout)
+        main_layout.addWidget(self.table)
+        main_layout.addWidget(reload_button)
+        self.setLayout(main_layout)
+
+        self.forecast = None
+        self.load_forecast()
+        self.capacity_spin.setValue(self.forecast.capacity if self.forecast is not None
+                                    else task_analytics.DEFAULT_DAILY_CAPACITY)
+        self.capacity_spin.valueChanged.connect(self.on_capacity_changed)
+
+        # 表示中はタスクの変更時にメインウィンドウから更新される
+        parent.workload_dialog = self
+
+    def done(self, result):
+        if self.parent_window.workload_dialog is self:
+            self.parent_window.workload_dialog = None
+        super().done(result)
+
+    def load_forecast(self, rebuild=False):
+        """予測を取得（必要な場合は全件から計算）して表示"""
+        try:
+            started_at = time.perf_counter()
+            self.forecast = self.parent_window.get_workload_forecast(rebuild)
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            self.elapsed_label.setText(f'{len(self.forecast.contributions)}件 / {elapsed_ms:.1f}ms')
+            self.update_table()
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"負荷予測の計算中にエラーが発生しました:\n{str(e)}")
+
+    def on_capacity_changed(self, value):
+        """目安の変更は過負荷の判定だけに影響するため再計算しない"""
+        if self.forecast is not None:
+            self.forecast.capacity = value
+            self.update_table()
+
+    def update_table(self):
+        """予測をテーブルに表示（過負荷の日が多い作業者から）"""
+        forecast = self.forecast
+        if forecast is None:
+            return
+        summary = forecast.summary()
+        overloaded = forecast.overloaded()
+        order = np.lexsort((-summary['peak'], -summary['overloaded_days']))
+        order = [row for row in order if summary['open'][row] > 0]
+
+        day_dates = [task_analytics.from_day_number(forecast.first_day + offset) for offset in range(forecast.days)]
+        headers = self.SUMMARY_HEADERS + [day.strftime('%m/%d') for day in day_dates]
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(order))
+
+        day_column = len(self.SUMMARY_HEADERS)
+        holiday_color = QColor('#eeeeee')
+        overload_color = QColor('#ffb3b3')
+        for table_row, row in enumerate(order):
+            values = [
+                summary['assignee_names'][row] or '（未設定）',
+                str(summary['open'][row]),
+                str(summary['overdue'][row]),
+                f"{summary['peak'][row]:.1f}",
+                str(summary['overloaded_days'][row])
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if summary['overloaded_days'][row]:
+                    item.setForeground(QColor('red'))
+                self.table.setItem(table_row, column, item)
+
+            for offset in range(forecast.days):
+                amount = forecast.load[row, offset]
+                item = QTableWidgetItem(f'{amount:.1f}' if amount >= 0.05 else '')
+                item.setTextAlignment(Qt.AlignCenter)
+                if not forecast.workdays[offset]:
+                    item.setBackground(holiday_color)
+                elif overloaded[row, offset]:
+                    item.setBackground(overload_color)
+                self.table.setItem(table_row, day_column + offset, item)
+
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+
 def main():
-    app = QApplication(sys.argv)
-    todo_calendar_app = ToDoCalendarApp()
+    start_time = time.perf_counter()
+
+    # --profile / --profile-memory（または環境変数 TODO_PROFILE）で起動時からプロファイルを記録
+    profile_enabled, profile_memory, argv = profiling.parse_options(sys.argv)
+    profile = None
+    if profile_enabled:
+        profile = profiling.ProfileSession('startup', profile_memory)
+        profile.start()
+
+    # --record-trace <ファイル>（または環境変数 TODO_TRACE_RECORD）で操作を記録
+    trace_path, argv = interaction_trace.parse_options(argv)
+    trace = interaction_trace.TraceRecorder(trace_path) if trace_path else None
+
+    app = QApplication(argv)
+    todo_calendar_app = ToDoCalendarApp(start_time, profile=profile, trace=trace)
     todo_calendar_app.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,232 @@
+"""
+データベースのオンラインバックアップ
+
+sqlite3 の backup API で数百ページずつコピーし、ステップの間はロックを手放すため、
+バックアップ中もアプリケーションから読み書きできる（コピー中に他の接続が書き込んだ場合はコピーをやり直す）。
+コピーは PRAGMA integrity_check で検証してから保存し、世代管理の規則に従って古いものを削除する
+
+使い方:
+    python backup.py             バックアップを作成
+    python backup.py --list      バックアップの一覧を表示
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# 自動バックアップの間隔（時間）
+DEFAULT_INTERVAL_HOURS = float(os.environ.get('TODO_BACKUP_INTERVAL_HOURS', '24'))
+
+# 1ステップでコピーするページ数と、ロックされていた場合に再試行するまでの待ち時間（秒）
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_SLEEP = 0.005
+
+# 世代管理：最新の数件に加えて、日ごと・週ごとに最新の1件を残す
+KEEP_LATEST = 3
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+
+BACKUP_FOLDER_NAME = 'backups'
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+class BackupError(Exception):
+    """バックアップの作成・検証に失敗したことを表す例外"""
+
+class BackupResult:
+    """作成したバックアップの情報"""
+    __slots__ = ('path', 'created_at', 'pages', 'size', 'copy_seconds', 'verify_seconds', 'removed')
+
+    def __init__(self, path, created_at, pages, size, copy_seconds, verify_seconds, removed):
+        self.path = path
+        self.created_at = created_at
+        self.pages = pages
+        self.size = size
+        self.copy_seconds = copy_seconds
+        self.verify_seconds = verify_seconds
+        self.removed = removed
+
+    def __repr__(self):
+        return (f"BackupResult(path={self.path!r}, pages={self.pages}, size={self.size}, "
+                f"copy_seconds={self.copy_seconds:.3f}, verify_seconds={self.verify_seconds:.3f})")
+
+def select_backups_to_keep(created_times, now=None, keep_latest=KEEP_LATEST,
+                           keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """
+    世代管理の規則で残すバックアップを選ぶ
+
+    :param created_times: バックアップの作成日時のリスト
+    :param now: 基準日時（省略時は現在）
+    :param keep_latest: 無条件に残す最新の件数
+    :param keep_daily: 日ごとに最新の1件を残す日数
+    :param keep_weekly: 週ごとに最新の1件を残す週数
+    :return: 残す作成日時の集合
+    """
+    now = now or datetime.now()
+    newest_first = sorted(created_times, reverse=True)
+    keep = set(newest_first[:keep_latest])
+
+    daily_since = (now - timedelta(days=keep_daily - 1)).date()
+    weekly_since = (now - timedelta(weeks=keep_weekly - 1)).date()
+    seen_days = set()
+    seen_weeks = set()
+    for created_at in newest_first:
+        day = created_at.date()
+        if day >= daily_since and day not in seen_days:
+            seen_days.add(day)
+            keep.add(created_at)
+        week = day.isocalendar()[:2]
+        if day >= weekly_since and week not in seen_weeks:
+            seen_weeks.add(week)
+            keep.add(created_at)
+    return keep
+
+class BackupManager:
+    def __init__(self, db_path, backup_folder=None, pages_per_step=DEFAULT_PAGES_PER_STEP,
+                 step_sleep=DEFAULT_STEP_SLEEP):
+        """
+        データベースのバックアップを作成・管理するクラス
+
+        :param db_path: バックアップ元のデータベースファイルのパス
+        :param backup_folder: バックアップの保存先（省略時はデータベースと同じ場所の backups フォルダ）
+        :param pages_per_step: 1ステップでコピーするページ数
+        :param step_sleep: コピー元がロックされていた場合に再試行するまでの待ち時間（秒）
+        """
+        self.db_path = db_path
+        self.backup_folder = backup_folder or os.path.join(os.path.dirname(db_path), BACKUP_FOLDER_NAME)
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.name_prefix = os.path.splitext(os.path.basename(db_path))[0] + '-'
+
+    def list_backups(self):
+        """
+        保存されているバックアップの一覧
+
+        :return: (作成日時, パス) のリスト（新しい順）
+        """
+        if not os.path.isdir(self.backup_folder):
+            return []
+
+        backups = []
+        for name in os.listdir(self.backup_folder):
+            stem, ext = os.path.splitext(name)
+            if ext != '.db' or not stem.startswith(self.name_prefix):
+                continue
+            try:
+                created_at = datetime.strptime(stem[len(self.name_prefix):], TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            backups.append((created_at, os.path.join(self.backup_folder, name)))
+        backups.sort(reverse=True)
+        return backups
+
+    def latest_backup_time(self):
+        """最新のバックアップの作成日時（バックアップがない場合はNone）"""
+        backups = self.list_backups()
+        return backups[0][0] if backups else None
+
+    def is_due(self, interval_hours=DEFAULT_INTERVAL_HOURS, now=None):
+        """
+        前回のバックアップから指定した時間が経過しているか
+
+        :param interval_hours: バックアップの間隔（時間）
+        :param now: 基準日時（省略時は現在）
+        :return: バックアップが必要な場合はTrue
+        """
+        latest = self.latest_backup_time()
+        now = now or datetime.now()
+        return latest is None or now - latest >= timedelta(hours=interval_hours)
+
+    def backup(self, progress=None):
+        """
+        バックアップを作成して検証し、古いバックアップを削除する
+
+        :param progress: コピーの進捗を受け取る関数 progress(コピー済みページ数, 全ページ数)
+        :return: BackupResultオブジェクト
+        """
+        os.makedirs(self.backup_folder, exist_ok=True)
+        created_at = datetime.now().replace(microsecond=0)
+        path = os.path.join(self.backup_folder, f"{self.name_prefix}{created_at.strftime(TIMESTAMP_FORMAT)}.db")
+        partial_path = path + '.partial'
+
+        def report(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+
+        source = sqlite3.connect(self.db_path, timeout=10, uri=True)
+        target = sqlite3.connect(partial_path)
+        try:
+            start = time.perf_counter()
+            source.backup(target, pages=self.pages_per_step, progress=report, sleep=self.step_sleep)
+            copy_seconds = time.perf_counter() - start
+            # コピー先はアプリケーションが開かないため、単一ファイルで扱えるようにする
+            target.execute('PRAGMA journal_mode=DELETE')
+            pages = target.execute('PRAGMA page_count').fetchone()[0]
+
+            start = time.perf_counter()
+            problems = [row[0] for row in target.execute('PRAGMA integrity_check')]
+            verify_seconds = time.perf_counter() - start
+        except sqlite3.Error as e:
+            target.close()
+            os.remove(partial_path)
+            raise BackupError(f"バックアップの作成中にエラーが発生しました: {e}") from e
+        finally:
+            source.close()
+        target.close()
+
+        if problems != ['ok']:
+            os.remove(partial_path)
+            raise BackupError(f"バックアップの検証に失敗しました: {'; '.join(problems[:5])}")
+
+        os.replace(partial_path, path)
+        removed = self.rotate()
+        return BackupResult(path, created_at, pages, os.path.getsize(path), copy_seconds, verify_seconds, removed)
+
+    def rotate(self, now=None):
+        """
+        世代管理の規則に従って古いバックアップを削除
+
+        :param now: 基準日時（省略時は現在）
+        :return: 削除したバックアップのパスのリスト
+        """
+        backups = self.list_backups()
+        keep = select_backups_to_keep([created_at for created_at, _ in backups], now)
+        removed = []
+        for created_at, path in backups:
+            if created_at not in keep:
+                try:
+                    os.remove(path)
+                    removed.append(path)
+                except OSError as e:
+                    print(f"古いバックアップの削除に失敗しました: {path}: {e}")
+        return removed
+
+def main():
+    parser = argparse.ArgumentParser(description='ToDoカレンダーのデータベースのバックアップ')
+    parser.add_argument('--list', action='store_true', help='バックアップの一覧を表示')
+    args = parser.parse_args()
+
+    from database_connection import DatabaseConnection
+    db = DatabaseConnection()
+    if db.is_memory:
+        print("メモリ上のデータベースはバックアップできません。")
+        raise SystemExit(1)
+    manager = BackupManager(db.db_path)
+
+    if args.list:
+        for created_at, path in manager.list_backups():
+            print(f"{created_at:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 1024:10.1f}KB  {path}")
+        return
+
+    try:
+        result = manager.backup()
+    except BackupError as e:
+        print(e)
+        raise SystemExit(1)
+    print(f"バックアップを作成しました: {result.path}")
+    print(f"{result.pages}ページ / コピー {result.copy_seconds * 1000:.0f}ms / 検証 {result.verify_seconds * 1000:.0f}ms")
+    for path in result.removed:
+        print(f"古いバックアップを削除しました: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,749 @@
+"""
+ToDoカレンダーのベンチマーク・負荷試験スクリプト
+
+使い方:
+    python benchmarks.py concurrency --processes 8 --iterations 200
+    python benchmarks.py analytics --todos 100000
+    python benchmarks.py records --todos 20000
+    python benchmarks.py store --todos 20000
+    python benchmarks.py repaint --todos 20000
+    python benchmarks.py backup --todos 100000
+    python benchmarks.py spans --todos 100000 --history-days 3650
+    python benchmarks.py timeline --todos 100000 --history-days 365
+    python benchmarks.py workload --todos 100000
+    python benchmarks.py projects --todos 100000 --projects 4
+    python benchmarks.py completion --todos 100000
+    python benchmarks.py sync --todos 100000 --changes 100
+    python benchmarks.py storage --todos 100000 --changes 200
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from database_connection import DatabaseConnection, ConcurrentUpdateError
+import calendar_days
+import task_analytics
+import todo_repository
+from todo_repository import TodoRepository
+from task_store import TaskStore
+from backup import BackupManager
+from project_databases import ProjectSet
+from prefix_index import PrefixIndex
+import sync_log
+
+def seed_todos(db, count, seed=0, history_days=0):
+    """
+    ベンチマーク用のToDoデータを生成
+
+    :param db: DatabaseConnectionオブジェクト
+    :param count: 生成するToDoの件数
+    :param seed: 乱数シード
+    :param history_days: 今日より前に遡って開始日を分布させる日数（0の場合は今日以降の1年間のみ）
+    :return: 生成したToDoのIDのリスト
+    """
+    rng = random.Random(seed)
+    statuses = ['未着手', '進行中', '完了済']
+    assignees = [f'作業者{i}' for i in range(20)]
+    today = datetime.now()
+    dates = [(today + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(-history_days, 365)]
+
+    rows = []
+    for i in range(count):
+        start_date = rng.choice(dates)
+        due_date = (datetime.strptime(start_date, '%Y-%m-%d') + timedelta(days=rng.randint(0, 14))).strftime('%Y-%m-%d')
+        rows.append((
+            calendar_days.calendar_id_for_date(start_date),
+            f'タスク{i}',
+            '0',
+            rng.choice(statuses),
+            '承認者',
+            rng.choice(assignees),
+            due_date,
+            start_date
+        ))
+
+    with db.get_connection() as conn:
+        conn.executemany(
+            '''
+            INSERT INTO ToDo
+            (calendar_id, title, description, status, registrant, assignee, due_date, start_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            rows
+        )
+    return [row[0] for row in db.execute_query('SELECT id FROM ToDo ORDER BY id')]
+
+def _concurrency_worker(db_path, todo_ids, iterations, seed, result_queue):
+    """
+    楽観的排他制御で description のカウンタを加算し続けるワーカープロセス
+    """
+    repository = TodoRepository(DatabaseConnection(db_path))
+    rng = random.Random(seed)
+    successes = 0
+    conflicts = 0
+
+    for _ in range(iterations):
+        todo_id = rng.choice(todo_ids)
+        while True:
+            todo = repository.get(todo_id)
+            try:
+                repository.update_if_unchanged(todo_id, todo.version, {'description': str(int(todo.description) + 1)})
+                successes += 1
+                break
+            except ConcurrentUpdateError:
+                # 他のプロセスが先に更新した場合は読み直して再試行
+                conflicts += 1
+
+    result_queue.put((successes, conflicts))
+
+def run_concurrency(args):
+    """
+    複数プロセスから同じToDoを同時に更新し、更新の消失がないことを確認する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'stress.db')
+        db = DatabaseConnection(db_path)
+        todo_ids = seed_todos(db, args.todos)
+
+        result_queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=_concurrency_worker,
+                args=(db_path, todo_ids, args.iterations, seed, result_queue)
+            )
+            for seed in range(args.processes)
+        ]
+
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        results = [result_queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        successes = sum(result[0] for result in results)
+        conflicts = sum(result[1] for result in results)
+        counter_total, version_total = db.execute_query(
+            'SELECT SUM(CAST(description AS INTEGER)), SUM(version - 1) FROM ToDo'
+        )[0]
+
+        print(f"プロセス数: {args.processes} / 対象ToDo: {args.todos}件 / 1プロセスあたり更新: {args.iterations}回")
+        print(f"成功した更新: {successes}回 / 検出した競合: {conflicts}回 / 所要時間: {elapsed:.2f}秒")
+        print(f"カウンタ合計: {counter_total} / バージョン増分合計: {version_total}")
+
+        if counter_total != successes or version_total != successes:
+            print("NG: 更新の消失が発生しました")
+            return 1
+        print("OK: 更新の消失はありません")
+        return 0
+
+def run_analytics(args):
+    """
+    推移分析の抽出と集計にかかる時間を計測する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'analytics.db'))
+        seed_todos(db, args.todos)
+
+        start = time.perf_counter()
+        extract = task_analytics.load_task_extract(db)
+        load_elapsed = time.perf_counter() - start
+
+        first_day = int(extract.start_day.min())
+        last_day = int(extract.due_day.max())
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            task_analytics.compute_time_series(extract, first_day, last_day)
+        compute_elapsed = (time.perf_counter() - start) / args.repeat
+
+        print(f"タスク数: {len(extract)}件 / 集計期間: {last_day - first_day + 1}日")
+        print(f"列指向データの抽出: {load_elapsed * 1000:.1f}ms")
+        print(f"全系列の集計（{args.repeat}回平均）: {compute_elapsed * 1000:.2f}ms")
+        return 0
+
+def run_workload(args):
+    """
+    作業者別の作業量の予測を、全件の一括計算と変更分の差分更新で計測する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'workload.db'))
+        todo_ids = seed_todos(db, args.todos, history_days=30)
+        repository = TodoRepository(db)
+        today = task_analytics.to_day_number(datetime.now())
+
+        start = time.perf_counter()
+        forecast = task_analytics.load_workload_forecast(db, today)
+        load_elapsed = time.perf_counter() - start
+
+        # 一部のタスクを完了・担当変更し、差分更新の結果が全件の再計算と一致することを確認
+        rng = random.Random(1)
+        changed = repository.get_many(rng.sample(todo_ids, args.changes))
+        for todo in changed:
+            todo.status = rng.choice(['未着手', '完了済'])
+            todo.assignee = f'作業者{rng.randint(0, 25)}'
+            db.execute_query('UPDATE ToDo SET status = ?, assignee = ? WHERE id = ?',
+                             (todo.status, todo.assignee, todo.id))
+
+        start = time.perf_counter()
+        forecast.apply_changes(changed)
+        apply_elapsed = time.perf_counter() - start
+
+        expected = task_analytics.load_workload_forecast(db, today)
+        rows = [forecast.assignee_rows[name] for name in expected.assignee_names]
+        if not (abs(forecast.load[rows] - expected.load).max() < 1e-6
+                and (forecast.open_counts[rows] == expected.open_counts).all()):
+            print("NG: 差分更新の結果が全件の再計算と一致しません")
+            return 1
+
+        summary = forecast.summary()
+        print(f"タスク数: {args.todos}件 / 未完了: {len(forecast.contributions)}件 / "
+              f"作業者: {len(forecast.assignee_names)}人 / 予測期間: {forecast.days}日")
+        print(f"全件の一括計算（抽出を含む）: {load_elapsed * 1000:.1f}ms")
+        print(f"{args.changes}件の差分更新: {apply_elapsed * 1000:.2f}ms"
+              f"（1件あたり {apply_elapsed / args.changes * 1000:.3f}ms）")
+        print(f"過負荷の作業者: {int((summary['overloaded_days'] > 0).sum())}人")
+        return 0
+
+def run_projects(args):
+    """
+    同じ件数のToDoを1つのデータベースに入れた場合と、複数のプロジェクトに分けて ATTACH した場合の
+    カレンダー1画面分・遅延タスク・作業者別統計の読み取り時間を比較する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        single = DatabaseConnection(os.path.join(temp_dir, 'single.db'))
+        seed_todos(single, args.todos, history_days=args.history_days)
+
+        per_project = args.todos // args.projects
+        databases = []
+        for number in range(args.projects):
+            db = DatabaseConnection(os.path.join(temp_dir, f'project{number}.db'))
+            seed_todos(db, per_project, seed=number, history_days=args.history_days)
+            databases.append(db)
+        projects = ProjectSet(databases[0], [db.db_path for db in databases[1:]])
+        repository = TodoRepository(single)
+
+        today = datetime.now()
+        today_str = today.strftime('%Y-%m-%d')
+        month_start = today.strftime('%Y-%m-01')
+        page = [(datetime.strptime(month_start, '%Y-%m-%d') + timedelta(days=offset)).strftime('%Y-%m-%d')
+                for offset in range(42)]
+
+        print(f"タスク数: {args.todos}件 / プロジェクト: {args.projects}件（1件あたり {per_project}件）")
+        sources = [('1ファイル        ', repository), ('すべてのプロジェクト', projects)]
+        for label, source in sources + [('1プロジェクトのみ  ', projects)]:
+            if source is projects:
+                projects.select(None if label.startswith('すべて') else [projects.names[0]])
+            cells, _ = _measure(lambda: [source.top_active_titles_for_date(day, 6) for day in page], args.repeat)
+            delayed, _ = _measure(lambda: source.top_open_tasks('delayed', today_str, 50), args.repeat)
+            stats, _ = _measure(lambda: source.assignee_counts('uncompleted', month_start, today_str), args.repeat)
+            print(f"{label}: セル42日分 {cells:8.3f}ms / 遅延タスク50件 {delayed:8.3f}ms / "
+                  f"作業者別統計 {stats:8.3f}ms")
+        projects.close()
+        return 0
+
+def _measure(func, repeat):
+    """
+    関数の1回あたりの実行時間と割り当てメモリのピークを計測する
+
+    :return: (平均実行時間[ms], 割り当てメモリのピーク[KB])
+    """
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+def run_records(args):
+    """
+    従来のタプル（execute_query）と TaskRecord（TodoRepository）の読み取りを比較する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'records.db'))
+        seed_todos(db, args.todos)
+        repository = TodoRepository(db)
+
+        # 同じ列を取得し、タプルの位置で参照する従来の方法と比較する
+        tuple_query = todo_repository.SELECT_OPEN_TASKS
+
+        def tuple_path():
+            todos = db.execute_query(tuple_query)
+            return [(todo[2], todo[9].split()[0], todo[8]) for todo in todos]
+
+        def record_path():
+            todos = repository.list_open()
+            return [(todo.title, todo.start_day, todo.due_date) for todo in todos]
+
+        def tuple_lookup():
+            db.execute_query(todo_repository.SELECT_TASK_BY_ID, (1,))
+
+        def record_lookup():
+            repository.get(1)
+
+        open_count = len(record_path())
+        print(f"タスク数: {args.todos}件（未完了 {open_count}件）")
+        for label, func, repeat in (
+            ('未完了一覧 タプル      ', tuple_path, args.repeat),
+            ('未完了一覧 TaskRecord ', record_path, args.repeat),
+            ('1件取得   タプル      ', tuple_lookup, args.repeat * 100),
+            ('1件取得   TaskRecord ', record_lookup, args.repeat * 100),
+        ):
+            elapsed, peak = _measure(func, repeat)
+            print(f"{label}: {elapsed:8.3f}ms / 割り当てピーク {peak:10.1f}KB")
+        return 0
+
+def run_store(args):
+    """
+    TaskStore（メモリ）と TodoRepository（SQLite）の読み取りを比較し、1件あたりのメモリ使用量を計測する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'store.db'))
+        seed_todos(db, args.todos)
+        repository = TodoRepository(db)
+        store = TaskStore(repository, history_days=args.history_days, max_tasks=args.max_tasks)
+
+        start = time.perf_counter()
+        if not store.load():
+            return 1
+        load_elapsed = (time.perf_counter() - start) * 1000
+        memory = store.memory_usage()
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        # 月表示のカレンダー1画面分（42日）
+        page = [(datetime.now() + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(42)]
+
+        # メモリとSQLiteの結果が一致することを確認（画面と同じく期間で検索する）
+        for date_str in page:
+            if store.top_active_titles_for_date(date_str, 6) != repository.top_active_titles_for_date(date_str, 6):
+                print(f"NG: {date_str} のタイトル一覧が一致しません")
+                return 1
+        for panel in ('today', 'delayed'):
+            store_todos, store_total = store.top_open_tasks(panel, today, 50)
+            todos, total = repository.top_open_tasks(panel, today, 50)
+            if [todo.id for todo in store_todos] != [todo.id for todo in todos] or store_total != total:
+                print(f"NG: {panel} の一覧が一致しません")
+                return 1
+
+        print(f"タスク数: {args.todos}件 / ストア保持: {len(store)}件（{store.covered_from} 以降の完了済みを含む）")
+        print(f"読み込み: {load_elapsed:.1f}ms / メモリ: {memory / 1024:.1f}KB（1件あたり {memory / max(len(store), 1):.0f}バイト）")
+        for label, source in (('SQLite', repository), ('メモリ', store)):
+            paint_elapsed, _ = _measure(
+                lambda: [source.top_active_titles_for_date(date_str, 6) for date_str in page], args.repeat
+            )
+            open_elapsed, _ = _measure(
+                lambda: [source.top_open_tasks(panel, today, 50) for panel in ('today', 'delayed')], args.repeat
+            )
+            print(f"{label}: カレンダー1画面 {paint_elapsed:8.3f}ms / 本日・遅延タスク {open_elapsed:8.3f}ms")
+        return 0
+
+def run_repaint(args):
+    """
+    変更のない月表示のカレンダーの再描画時間を、セルのキャッシュなし・ありで比較する
+    """
+    # 画面のない環境でも計測できるようにする
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QTableView
+    from ToDo_Calendar_GUI import ToDoCalendarApp
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'repaint.db')
+        seed_todos(DatabaseConnection(db_path), args.todos)
+
+        app = QApplication.instance() or QApplication([])
+        window = ToDoCalendarApp(db_path=db_path)
+        window.show()
+        # 起動処理（データの読み込みと初回の注釈）の完了を待つ
+        while 'time_to_interactive' not in window.startup_metrics:
+            app.processEvents()
+
+        viewport = window.calendar_widget.findChild(QTableView).viewport()
+        print(f"タスク数: {args.todos}件 / セルの大きさ: {viewport.width() // 7}x{viewport.height() // 7}")
+        for label, enabled in (('キャッシュなし', False), ('キャッシュあり', True)):
+            window.cell_cache.enabled = enabled
+            elapsed, _ = _measure(viewport.repaint, args.repeat)
+            print(f"{label}: 1画面の再描画 {elapsed:8.3f}ms")
+
+        window.close()
+        return 0
+
+def run_backup(args):
+    """
+    バックアップの所要時間と、バックアップ中に行った更新の待ち時間を計測する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'backup.db'))
+        todo_ids = seed_todos(db, args.todos)
+        manager = BackupManager(db.db_path, pages_per_step=args.pages, step_sleep=args.sleep)
+        print(f"タスク数: {args.todos}件 / データベース: {os.path.getsize(db.db_path) / 1024 / 1024:.1f}MB")
+
+        result = manager.backup()
+        print(f"更新なし: {result.pages}ページ（{result.size / 1024 / 1024:.1f}MB） / "
+              f"コピー {result.copy_seconds * 1000:.0f}ms / 検証 {result.verify_seconds * 1000:.0f}ms")
+
+        # バックアップ中に別の接続から一定間隔で更新し、1件あたりの所要時間を記録する
+        # （コピー中に他の接続が書き込むと、backup API はコピーをやり直す）
+        results = []
+        worker = threading.Thread(target=lambda: results.append(manager.backup()))
+        latencies = []
+        rng = random.Random(0)
+        with db.get_connection() as conn:
+            worker.start()
+            while worker.is_alive():
+                start = time.perf_counter()
+                conn.execute('UPDATE ToDo SET description = description || ? WHERE id = ?', ('x', rng.choice(todo_ids)))
+                conn.commit()
+                latencies.append((time.perf_counter() - start) * 1000)
+                time.sleep(args.write_interval)
+            worker.join()
+
+        if not results:
+            print("NG: バックアップに失敗しました")
+            return 1
+        result = results[0]
+        latencies.sort()
+        print(f"{args.write_interval * 1000:.0f}msごとに更新: コピー {result.copy_seconds * 1000:.0f}ms / "
+              f"検証 {result.verify_seconds * 1000:.0f}ms")
+        print(f"バックアップ中の更新: {len(latencies)}回 / 中央値 {latencies[len(latencies) // 2]:.2f}ms / "
+              f"最大 {latencies[-1]:.2f}ms")
+        return 0
+
+def run_spans(args):
+    """
+    期間（開始日〜期限）による検索を R*Tree・索引なし・メモリ上の索引で比較する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'spans.db'))
+        seed_todos(db, args.todos, history_days=args.history_days)
+        if not db.span_index_available:
+            print("R*Tree を使用できないため比較できません")
+            return 1
+
+        repository = TodoRepository(db)
+        fallback = TodoRepository(db)
+        fallback.span_condition = todo_repository.SPAN_OVERLAP_CONDITIONS[False]
+        store = TaskStore(repository, history_days=args.history_days, max_tasks=args.todos)
+        if not store.load():
+            return 1
+
+        today = datetime.now()
+        day = today.strftime('%Y-%m-%d')
+        # 月表示のカレンダー1画面分（42日）
+        first_date = today.strftime('%Y-%m-01')
+        last_date = (datetime.strptime(first_date, '%Y-%m-%d') + timedelta(days=41)).strftime('%Y-%m-%d')
+
+        # 3つの方法の結果が一致することを確認
+        expected = [todo.id for todo in repository.list_overlapping(first_date, last_date)]
+        for source in (fallback, store):
+            if [todo.id for todo in source.list_overlapping(first_date, last_date)] != expected:
+                print("NG: 期間の検索結果が一致しません")
+                return 1
+
+        print(f"タスク数: {args.todos}件 / 開始日の範囲: {args.history_days + 365}日 / "
+              f"{day} に期間中: {len(repository.list_active_on(day))}件 / 1画面と重なる: {len(expected)}件")
+        for label, source in (('R*Tree  ', repository), ('索引なし', fallback), ('メモリ  ', store)):
+            day_elapsed, _ = _measure(lambda: source.top_active_titles_for_date(day, 6), args.repeat)
+            page_elapsed, _ = _measure(
+                lambda: [source.top_active_titles_for_date((today + timedelta(days=offset)).strftime('%Y-%m-%d'), 6)
+                         for offset in range(42)],
+                args.repeat
+            )
+            month_elapsed, _ = _measure(lambda: source.list_overlapping(first_date, last_date), args.repeat)
+            print(f"{label}: 1日 {day_elapsed:8.3f}ms / セル42日分 {page_elapsed:8.3f}ms / "
+                  f"1画面と重なるToDo {month_elapsed:8.3f}ms")
+        return 0
+
+def run_timeline(args):
+    """
+    タイムラインの読み込み（範囲検索）とスクロール時の再描画の時間を計測する
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from ToDo_Calendar_GUI import TimelineView
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'timeline.db'))
+        seed_todos(db, args.todos, history_days=args.history_days)
+        repository = TodoRepository(db)
+
+        app = QApplication.instance() or QApplication([])
+        view = TimelineView(repository)
+        view.resize(1200, 700)
+        view.show()
+        app.processEvents()
+
+        queries = []
+        list_overlapping = repository.list_overlapping
+        repository.list_overlapping = lambda first, last: queries.append((first, last)) or list_overlapping(first, last)
+
+        print(f"タスク数: {args.todos}件 / 表示領域: {view.viewport().width()}x{view.viewport().height()}")
+        for label, day_width in (('日', 32), ('週', 12), ('月', 4)):
+            view.set_day_width(day_width)
+            view.scroll_to_date(datetime.now().date())
+            load_elapsed, _ = _measure(view.reload, args.repeat)
+            paint_elapsed, _ = _measure(view.viewport().repaint, args.repeat)
+
+            # 1日ずつスクロールしながら再描画し、範囲検索の回数を数える
+            del queries[:]
+            scrollbar = view.horizontalScrollBar()
+            start = time.perf_counter()
+            for _ in range(args.scroll_days):
+                scrollbar.setValue(scrollbar.value() + day_width)
+                view.viewport().repaint()
+            scroll_elapsed = (time.perf_counter() - start) / args.scroll_days * 1000
+            print(f"{label}（1日{day_width}px）: 読み込み {load_elapsed:8.3f}ms（{len(view.rows)}行） / "
+                  f"再描画 {paint_elapsed:8.3f}ms / スクロール1日 {scroll_elapsed:8.3f}ms"
+                  f"（{args.scroll_days}日で検索{len(queries)}回）")
+
+        view.close()
+        return 0
+
+def run_completion(args):
+    """
+    入力候補の索引の作成時間と、1文字入力するごとの検索時間を計測する
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QComboBox
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = DatabaseConnection(os.path.join(temp_dir, 'completion.db'))
+        seed_todos(db, args.todos)
+        repository = TodoRepository(db)
+        app = QApplication.instance() or QApplication([])
+
+        # 変更前: すべての値をコンボボックスに追加する
+        start = time.perf_counter()
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.addItems([
+            str(row[0]) for row in db.execute_query("SELECT DISTINCT title FROM ToDo WHERE title IS NOT NULL AND title != ''")
+            if row[0]
+        ])
+        add_items_elapsed = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index = PrefixIndex(repository.value_counts('title'))
+        build_elapsed = (time.perf_counter() - start) * 1000
+        print(f"タイトル: {len(index)}件 / addItems {add_items_elapsed:8.1f}ms / 索引の作成 {build_elapsed:8.1f}ms")
+
+        # 入力途中の文字列ごとに検索（前方一致・部分一致・カタカナとひらがな・半角カナ）
+        for text in ('タスク12', 'すく99', 'ｽｸ7', '345', '存在しない'):
+            keystrokes = [text[:length] for length in range(1, len(text) + 1)]
+            elapsed = []
+            for prefix in keystrokes:
+                keystroke_elapsed, _ = _measure(lambda: index.search(prefix, 20), args.repeat)
+                elapsed.append(keystroke_elapsed)
+            suggestions = index.search(text, 20)
+            print(f"{text!r:12}: 1文字ごと 平均 {sum(elapsed) / len(elapsed):7.3f}ms / 最大 {max(elapsed):7.3f}ms"
+                  f"（候補 {len(suggestions)}件: {', '.join(suggestions[:3])}）")
+
+        start = time.perf_counter()
+        for i in range(args.changes):
+            index.add(f'追加タスク{i}')
+        print(f"値の追加: 1件あたり {(time.perf_counter() - start) / args.changes * 1000:7.3f}ms")
+        combo.deleteLater()
+        app.processEvents()
+        return 0
+
+def run_sync(args):
+    """
+    拠点間の同期ファイルの書き出し・取り込みの時間とファイルサイズを、全件と差分で比較する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = DatabaseConnection(os.path.join(temp_dir, 'office_a.db'))
+        ids = seed_todos(source, args.todos)
+        target = DatabaseConnection(os.path.join(temp_dir, 'office_b.db'))
+        repository = TodoRepository(source)
+
+        def report(label, since_seq):
+            path = os.path.join(temp_dir, f'{label}.todosync.gz')
+            exported = sync_log.export_changes(source, path, since_seq)
+            imported = sync_log.import_changes(target, path)
+            again = sync_log.import_changes(target, path)
+            print(f"{label}: {exported.changes:7d}件 / {os.path.getsize(path) / 1024:9.1f}KB / "
+                  f"書き出し {exported.seconds * 1000:8.1f}ms / 取り込み {imported.seconds * 1000:8.1f}ms"
+                  f"（反映 {imported.applied}件） / 再取り込み {again.seconds * 1000:8.1f}ms（反映 {again.applied}件）")
+            return exported.last_seq
+
+        print(f"タスク数: {args.todos}件 / データベース {os.path.getsize(source.db_path) / 1024:.0f}KB")
+        last_seq = report('全件', 0)
+
+        rng = random.Random(1)
+        for todo_id in rng.sample(ids, args.changes):
+            version = repository.get(todo_id).version
+            repository.update_if_unchanged(todo_id, version, {'status': '完了済'})
+        for todo_id in rng.sample(ids, args.changes // 10):
+            repository.delete(todo_id)
+        report('差分', last_seq)
+
+        query = 'SELECT uid, title, status, due_date, start_date FROM ToDo ORDER BY uid'
+        if source.execute_query(query) != target.execute_query(query):
+            print("NG: 同期後の内容が一致しません")
+            return 1
+        print("一致")
+
+        # 複製したファイルに拠点IDを付け直し、複製元との間で双方向に同期できることを確認する
+        source.execute_query('PRAGMA wal_checkpoint(TRUNCATE)')
+        copy_path = os.path.join(temp_dir, 'office_c.db')
+        shutil.copyfile(source.db_path, copy_path)
+        copy = DatabaseConnection(copy_path)
+        sync_log.reset_site(copy)
+        copy_repository = TodoRepository(copy)
+        remaining = [row[0] for row in source.execute_query('SELECT id FROM ToDo ORDER BY id')]
+        # 前半は複製元だけ、後半は複製だけで変更し、中央は両方で変更する（後から変更した複製の値が残る）
+        sample = rng.sample(remaining, args.changes)
+        third = len(sample) // 3
+        for edited, todo_ids in ((repository, sample[:2 * third]), (copy_repository, sample[third:])):
+            for todo_id in todo_ids:
+                edited.update_if_unchanged(todo_id, edited.get(todo_id).version, {'title': f'{edited.db.db_path} の変更'})
+        copy_repository.delete(remaining[0])
+
+        for label, sender, receiver in (('複製→複製元', copy, source), ('複製元→複製', source, copy)):
+            path = os.path.join(temp_dir, f'{label}.todosync.gz')
+            since = sync_log.received_seqs(receiver).get(sync_log.site_id(sender), 0)
+            exported = sync_log.export_changes(sender, path, since, sync_log.site_id(receiver))
+            imported = sync_log.import_changes(receiver, path)
+            print(f"{label}: {exported.changes:7d}件 / 反映 {imported.applied}件 / 反映済み・古い変更 {imported.skipped}件")
+        copy_repository.close()
+        repository.close()
+        if source.execute_query(query) != copy.execute_query(query):
+            print("NG: 複製との同期後の内容が一致しません")
+            return 1
+        print("一致")
+        return 0
+
+def run_storage(args):
+    """
+    ファイル・メモリ上（:memory:）・ファイルから読み込んだメモリ上（スナップショット）のデータベースで
+    ToDoの生成・カレンダー1画面分の読み取り・1件ずつの更新の時間を比較する
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_path = os.path.join(temp_dir, 'snapshot.db')
+        seed_todos(DatabaseConnection(snapshot_path), args.todos)
+        page = [(datetime.now() + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(42)]
+        print(f"タスク数: {args.todos}件 / スナップショット {os.path.getsize(snapshot_path) / 1024 / 1024:.1f}MB")
+
+        for label, db_path, snapshot in (('ファイル', os.path.join(temp_dir, 'storage.db'), None),
+                                         ('メモリ', ':memory:', None),
+                                         ('スナップショット', ':memory:', snapshot_path)):
+            start = time.perf_counter()
+            db = DatabaseConnection(db_path, snapshot_path=snapshot)
+            if snapshot is None:
+                seed_todos(db, args.todos)
+            prepare_elapsed = (time.perf_counter() - start) * 1000
+
+            repository = TodoRepository(db)
+            paint_elapsed, _ = _measure(
+                lambda: [repository.top_active_titles_for_date(date_str, 6) for date_str in page], args.repeat
+            )
+
+            todo_ids = [row[0] for row in db.execute_query('SELECT id FROM ToDo ORDER BY id LIMIT ?', (args.changes,))]
+            start = time.perf_counter()
+            for todo_id in todo_ids:
+                repository.update_if_unchanged(todo_id, repository.get(todo_id).version, {'status': '完了済'})
+            update_elapsed = (time.perf_counter() - start) / len(todo_ids) * 1000
+
+            print(f"{label:<8}: 準備 {prepare_elapsed:8.1f}ms / カレンダー1画面 {paint_elapsed:7.3f}ms / "
+                  f"更新1件 {update_elapsed:6.3f}ms")
+            repository.close()
+            db.close()
+        return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='ToDoカレンダーのベンチマーク・負荷試験')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    concurrency_parser = subparsers.add_parser('concurrency', help='複数プロセスによる同時更新の負荷試験')
+    concurrency_parser.add_argument('--processes', type=int, default=8)
+    concurrency_parser.add_argument('--iterations', type=int, default=200)
+    concurrency_parser.add_argument('--todos', type=int, default=5)
+    concurrency_parser.set_defaults(func=run_concurrency)
+
+    analytics_parser = subparsers.add_parser('analytics', help='推移分析の集計時間の計測')
+    analytics_parser.add_argument('--todos', type=int, default=100000)
+    analytics_parser.add_argument('--repeat', type=int, default=20)
+    analytics_parser.set_defaults(func=run_analytics)
+
+    records_parser = subparsers.add_parser('records', help='タプルとTaskRecordの読み取り性能の比較')
+    records_parser.add_argument('--todos', type=int, default=20000)
+    records_parser.add_argument('--repeat', type=int, default=20)
+    records_parser.set_defaults(func=run_records)
+
+    store_parser = subparsers.add_parser('store', help='メモリ上のタスクストアの読み取り性能とメモリ使用量')
+    store_parser.add_argument('--todos', type=int, default=20000)
+    store_parser.add_argument('--repeat', type=int, default=20)
+    store_parser.add_argument('--history-days', type=int, default=90)
+    store_parser.add_argument('--max-tasks', type=int, default=100000)
+    store_parser.set_defaults(func=run_store)
+
+    repaint_parser = subparsers.add_parser('repaint', help='カレンダーの再描画時間の計測（セルのキャッシュの効果）')
+    repaint_parser.add_argument('--todos', type=int, default=20000)
+    repaint_parser.add_argument('--repeat', type=int, default=50)
+    repaint_parser.set_defaults(func=run_repaint)
+
+    backup_parser = subparsers.add_parser('backup', help='バックアップの所要時間と更新への影響の計測')
+    backup_parser.add_argument('--todos', type=int, default=100000)
+    backup_parser.add_argument('--pages', type=int, default=256)
+    backup_parser.add_argument('--sleep', type=float, default=0.005)
+    backup_parser.add_argument('--write-interval', type=float, default=0.05)
+    backup_parser.set_defaults(func=run_backup)
+
+    spans_parser = subparsers.add_parser('spans', help='期間による検索（R*Tree・索引なし・メモリ）の比較')
+    spans_parser.add_argument('--todos', type=int, default=100000)
+    spans_parser.add_argument('--history-days', type=int, default=3650)
+    spans_parser.add_argument('--repeat', type=int, default=20)
+    spans_parser.set_defaults(func=run_spans)
+
+    workload_parser = subparsers.add_parser('workload', help='作業者別の作業量の予測（一括計算と差分更新）の計測')
+    workload_parser.add_argument('--todos', type=int, default=100000)
+    workload_parser.add_argument('--changes', type=int, default=100)
+    workload_parser.set_defaults(func=run_workload)
+
+    projects_parser = subparsers.add_parser('projects', help='1ファイルと複数プロジェクトの読み取り時間の比較')
+    projects_parser.add_argument('--todos', type=int, default=100000)
+    projects_parser.add_argument('--projects', type=int, default=4)
+    projects_parser.add_argument('--history-days', type=int, default=365)
+    projects_parser.add_argument('--repeat', type=int, default=10)
+    projects_parser.set_defaults(func=run_projects)
+
+    completion_parser = subparsers.add_parser('completion', help='入力候補の索引の作成と検索の計測')
+    completion_parser.add_argument('--todos', type=int, default=100000)
+    completion_parser.add_argument('--repeat', type=int, default=20)
+    completion_parser.add_argument('--changes', type=int, default=1000)
+    completion_parser.set_defaults(func=run_completion)
+
+    sync_parser = subparsers.add_parser('sync', help='拠点間の同期ファイルの書き出し・取り込みの計測（全件と差分）')
+    sync_parser.add_argument('--todos', type=int, default=100000)
+    sync_parser.add_argument('--changes', type=int, default=100)
+    sync_parser.set_defaults(func=run_sync)
+
+    storage_parser = subparsers.add_parser('storage', help='ファイル・メモリ上・スナップショットのデータベースの比較')
+    storage_parser.add_argument('--todos', type=int, default=100000)
+    storage_parser.add_argument('--changes', type=int, default=200)
+    storage_parser.add_argument('--repeat', type=int, default=20)
+    storage_parser.set_defaults(func=run_storage)
+
+    timeline_parser = subparsers.add_parser('timeline', help='タイムラインの読み込みとスクロール時の再描画の計測')
+    timeline_parser.add_argument('--todos', type=int, default=100000)
+    timeline_parser.add_argument('--history-days', type=int, default=365)
+    timeline_parser.add_argument('--repeat', type=int, default=10)
+    timeline_parser.add_argument('--scroll-days', type=int, default=120)
+    timeline_parser.set_defaults(func=run_timeline)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
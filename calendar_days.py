@@ -0,0 +1,120 @@
+"""
+カレンダーの日付情報と祝日の判定
+
+Calendarテーブルを事前に生成せず、日番号・曜日・祝日を日付から都度計算する。
+祝日は jpholiday から年ごとのビット列を作成し、直近に参照した年だけをLRUキャッシュに保持する
+"""
+import functools
+from datetime import date, datetime, timedelta
+
+import jpholiday
+
+# SQLiteの julianday() を整数化した値と date.toordinal() の差
+JULIAN_DAY_OFFSET = 1721424
+
+# 祝日のビット列をキャッシュする年数
+HOLIDAY_CACHE_YEARS = 16
+
+def to_date(value):
+    """
+    日付を表す値を date に変換
+
+    :param value: date・datetime、または 'yyyy-MM-dd' で始まる文字列
+    :return: dateオブジェクト
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+def to_day_number(value):
+    """
+    日付を日番号（julianday の整数部）に変換
+
+    :param value: date・datetime、または 'yyyy-MM-dd' で始まる文字列
+    :return: 日番号
+    """
+    return to_date(value).toordinal() + JULIAN_DAY_OFFSET
+
+def from_day_number(day):
+    """
+    日番号を date に変換
+
+    :param day: 日番号
+    :return: dateオブジェクト
+    """
+    return date.fromordinal(int(day) - JULIAN_DAY_OFFSET)
+
+def calendar_id_for_date(value):
+    """
+    ToDo.calendar_id に保存する値（開始日の日番号）を取得
+
+    互換用のCalendarビューの id と同じ値になる
+
+    :param value: date・datetime、または 'yyyy-MM-dd' で始まる文字列
+    :return: 日番号
+    """
+    return to_day_number(value)
+
+def span_dates(start, end, limit=None):
+    """
+    開始日から終了日までの日付文字列（'yyyy-MM-dd'）のリスト
+
+    :param start: 開始日（date・datetime、または 'yyyy-MM-dd' で始まる文字列）
+    :param end: 終了日。開始日より前の場合は開始日のみ
+    :param limit: 日数の上限。超える場合は None を返す
+    :return: 日付文字列のリスト
+    """
+    first = to_date(start)
+    days = max((to_date(end) - first).days, 0) + 1
+    if limit is not None and days > limit:
+        return None
+    return [(first + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+
+def date_runs(date_strs):
+    """
+    日付を連続した期間ごとにまとめる
+
+    :param date_strs: 日付文字列（'yyyy-MM-dd'）の集合
+    :return: (最初の日, 最後の日) のリスト（日付順）
+    """
+    runs = []
+    for date_str in sorted(date_strs):
+        if runs and to_day_number(date_str) == to_day_number(runs[-1][1]) + 1:
+            runs[-1][1] = date_str
+        else:
+            runs.append([date_str, date_str])
+    return [tuple(run) for run in runs]
+
+@functools.lru_cache(maxsize=HOLIDAY_CACHE_YEARS)
+def year_holiday_bits(year):
+    """
+    指定した年の祝日を、元日からの日数の位置にビットを立てた整数で返す
+
+    :param year: 年
+    :return: 祝日のビット列
+    """
+    bits = 0
+    for holiday, _ in jpholiday.year_holidays(year):
+        bits |= 1 << (holiday.timetuple().tm_yday - 1)
+    return bits
+
+def is_holiday(value):
+    """
+    祝日かどうかを判定
+
+    :param value: date・datetime、または 'yyyy-MM-dd' で始まる文字列
+    :return: 祝日の場合はTrue
+    """
+    day = to_date(value)
+    return bool(year_holiday_bits(day.year) >> (day.timetuple().tm_yday - 1) & 1)
+
+def year_holidays(year):
+    """
+    指定した年の祝日の一覧
+
+    :param year: 年
+    :return: (日付文字列, 祝日名) のリスト
+    """
+    return [(holiday.strftime('%Y-%m-%d'), name) for holiday, name in jpholiday.year_holidays(year)]
@@ -1,27 +1,117 @@
 import sqlite3
 from datetime import datetime, timedelta
+import argparse
+import itertools
 import os
 import sys
-import jpholiday
+
+import calendar_days
+
+# データベースの場所を指定する環境変数（引数でパスを指定しない場合に使う）
+DB_PATH_ENV = 'TODO_DB_PATH'
+# メモリ上のデータベースに起動時に読み込むファイルを指定する環境変数
+DB_SNAPSHOT_ENV = 'TODO_DB_SNAPSHOT'
+
+DEFAULT_DB_NAME = 'todo_calendar.db'
+MEMORY_DB_PATH = ':memory:'
+
+def app_data_folder():
+    """アプリケーションのデータを格納するフォルダ（ドキュメントフォルダの TodoCalendarApp）"""
+    return os.path.join(os.path.expanduser('~/Documents'), 'TodoCalendarApp')
+
+def is_memory_path(db_path):
+    """メモリ上のデータベースのパス（':memory:'、mode=memory または vfs=memdb の URI）か"""
+    return db_path == MEMORY_DB_PATH or (
+        db_path.startswith('file:') and ('mode=memory' in db_path or 'vfs=memdb' in db_path))
+
+class ConcurrentUpdateError(Exception):
+    """他の編集者が先にToDoを更新・削除したため、更新できなかったことを表す例外"""
+
+    def __init__(self, todo_id, expected_version, current_version=None):
+        self.todo_id = todo_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+        if current_version is None:
+            message = f"ToDo(id={todo_id})は他のユーザーによって削除されています"
+        else:
+            message = (f"ToDo(id={todo_id})は他のユーザーによって更新されています"
+                       f"（読込時のバージョン {expected_version} / 現在のバージョン {current_version}）")
+        super().__init__(message)
 
 class DatabaseConnection:
-    def __init__(self, db_path='todo_calendar.db'):
+    # 利用者が更新可能なToDoのカラム
+    UPDATABLE_TODO_COLUMNS = (
+        'calendar_id', 'title', 'description', 'status', 'registrant',
+        'assignee', 'priority', 'due_date', 'start_date'
+    )
+
+    # ToDoSpan に登録する期間（開始日〜期限の日番号。期限がない・開始日より前の場合は開始日まで）
+    SPAN_START_DAY = "CAST(julianday(substr({row}.start_date, 1, 10)) AS INTEGER)"
+    SPAN_END_DAY = ("MAX(CAST(julianday(substr({row}.start_date, 1, 10)) AS INTEGER), "
+                    "COALESCE(CAST(julianday(substr({row}.due_date, 1, 10)) AS INTEGER), 0))")
+    SPAN_TRIGGERS = ('trg_todo_span_insert', 'trg_todo_span_update', 'trg_todo_span_delete')
+
+    # 拠点間の同期の変更履歴（ToDoSyncLog）に記録するカラム
+    SYNC_PAYLOAD_COLUMNS = UPDATABLE_TODO_COLUMNS + ('created_at', 'updated_at')
+
+    # 同期の変更履歴の日時と拠点。取り込み中は取り込んだ変更の値（SyncMeta の apply_stamp・apply_site）を使う
+    SYNC_STAMP = ("COALESCE((SELECT value FROM SyncMeta WHERE key = 'apply_stamp'), "
+                  "strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))")
+    SYNC_SITE = ("COALESCE((SELECT value FROM SyncMeta WHERE key = 'apply_site'), "
+                 "(SELECT value FROM SyncMeta WHERE key = 'site'))")
+
+    # DailyTaskStats を ToDo から集計し直すクエリ
+    DAILY_TASK_STATS_SOURCE_QUERY = '''
+    SELECT COALESCE(substr(start_date, 1, 10), '') AS day,
+        COALESCE(substr(due_date, 1, 10), '') AS due_day,
+        COALESCE(assignee, '') AS assignee,
+        COALESCE(status, '') AS status,
+        COUNT(*) AS task_count
+    FROM ToDo
+    GROUP BY 1, 2, 3, 4
+    '''
+
+    # メモリ上のデータベースの名前の通し番号（':memory:' を指定するたびに別のデータベースにする）
+    _memory_numbers = itertools.count(1)
+
+    def __init__(self, db_path=None, snapshot_path=None):
         """
         SQLiteデータベース接続クラス
         
-        :param db_path: データベースファイルのパス
+        :param db_path: データベースファイルのパス。相対パスはドキュメントフォルダの TodoCalendarApp からのパス、
+            ':memory:' はメモリ上のデータベース（'file:' で始まる URI も指定できる）。
+            省略時は環境変数 TODO_DB_PATH、それもない場合は todo_calendar.db
+        :param snapshot_path: メモリ上のデータベースに最初に読み込むデータベースファイル
+            （省略時は環境変数 TODO_DB_SNAPSHOT。ファイルのデータベースの場合は使わない）
         """
-        # ユーザーのドキュメントフォルダにデータベースファイルを格納
-        documents_folder = os.path.expanduser('~/Documents')
+        db_path = db_path or os.environ.get(DB_PATH_ENV) or DEFAULT_DB_NAME
         
-        # アプリケーション専用のサブフォルダを作成
-        app_data_folder = os.path.join(documents_folder, 'TodoCalendarApp')
+        # メモリ上のデータベースを開いている間保持する接続（ファイルの場合はNone）
+        self.memory_connection = None
         
-        # フォルダが存在しない場合は作成
-        os.makedirs(app_data_folder, exist_ok=True)
+        if is_memory_path(db_path):
+            # 接続ごとに別のデータベースにならないよう、プロセス内の接続で共有する名前付きのデータベースにする。
+            # 共有キャッシュ（cache=shared）はテーブル単位のロックで待機時間が効かず、読み込み用のスレッドと
+            # 同時に使うと "database table is locked" になるため、通常のロックで待機できる memdb を使う
+            if db_path == MEMORY_DB_PATH:
+                db_path = f'file:/todo-memory-{os.getpid()}-{next(self._memory_numbers)}?vfs=memdb'
+            self.db_path = db_path
+            
+            # すべての接続が閉じるとデータベースが破棄されるため、1つの接続を開いたままにする
+            self.memory_connection = sqlite3.connect(db_path, uri=True, check_same_thread=False)
+            snapshot_path = snapshot_path or os.environ.get(DB_SNAPSHOT_ENV)
+            if snapshot_path:
+                self.load_snapshot(snapshot_path)
+        elif db_path.startswith('file:'):
+            self.db_path = db_path
+        else:
+            # 相対パスはユーザーのドキュメントフォルダのアプリケーション専用のサブフォルダに格納
+            if not os.path.isabs(db_path):
+                os.makedirs(app_data_folder(), exist_ok=True)
+            self.db_path = os.path.join(app_data_folder(), db_path)
         
-        # データベースファイルのパスを設定
-        self.db_path = os.path.join(app_data_folder, db_path)
+        # R*Tree による期間の索引（ToDoSpan）が使えるか（initialize_database で確認）
+        self.span_index_available = False
         
         # データベース接続とテーブル初期化
         self.initialize_database()
@@ -33,12 +123,46 @@ class DatabaseConnection:
         :return: sqlite3接続オブジェクト
         """
         try:
-            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            # 他の接続が書き込み中でもすぐに失敗しないよう待機時間を設定
+            connection = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, uri=True)
             return connection
         except sqlite3.Error as e:
             print(f"データベース接続エラー: {e}")
             raise
     
+    @property
+    def is_memory(self):
+        """メモリ上のデータベースか"""
+        return self.memory_connection is not None
+    
+    @property
+    def data_folder(self):
+        """バックアップ・プロファイルなどを保存するフォルダ（メモリ上のデータベースの場合はアプリケーションのフォルダ）"""
+        return app_data_folder() if self.db_path.startswith('file:') else os.path.dirname(self.db_path)
+    
+    def load_snapshot(self, snapshot_path):
+        """
+        データベースファイルの内容をメモリ上のデータベースにコピーする
+        
+        backup API はファイルのヘッダー（WALモード）もそのままコピーし、WALを使えないメモリ上のデータベースが
+        他の接続から開けなくなるため、ロールバックジャーナルのデータベースとして書き出す VACUUM INTO を使う
+        
+        :param snapshot_path: コピー元のデータベースファイルのパス
+        """
+        if not os.path.exists(snapshot_path):
+            raise FileNotFoundError(f"スナップショットのファイルがありません: {snapshot_path}")
+        source = sqlite3.connect(snapshot_path, uri=True)
+        try:
+            source.execute('VACUUM INTO ?', (self.db_path,))
+        finally:
+            source.close()
+    
+    def close(self):
+        """メモリ上のデータベースの場合は保持している接続を閉じる（データベースは破棄される）"""
+        if self.memory_connection is not None:
+            self.memory_connection.close()
+            self.memory_connection = None
+    
     def execute_query(self, query, params=None):
         """
         クエリを実行し、結果を返す
@@ -57,8 +181,8 @@ class DatabaseConnection:
                 else:
                     cursor.execute(query)
                 
-                # SELECT文の場合は結果を返す
-                if query.strip().upper().startswith('SELECT'):
+                # 結果の列を持つ文（SELECT・WITH・PRAGMAなど）の場合は結果を返す
+                if cursor.description is not None:
                     return cursor.fetchall()
                 
                 # INSERT, UPDATE, DELETE文の場合はコミット
@@ -68,23 +192,114 @@ class DatabaseConnection:
             print(f"クエリ実行エラー: {e}")
             raise
     
-    def create_calendar_table(self):
+    def create_holiday_table(self):
         """
-        Calendarテーブルを作成
+        互換用のCalendarビューで参照する祝日テーブルを作成
         """
         create_table_query = '''
-        CREATE TABLE IF NOT EXISTS Calendar (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT UNIQUE,
-            year INTEGER,
-            month INTEGER,
-            day INTEGER,
-            day_of_week TEXT,
-            is_holiday INTEGER DEFAULT 0
-        )
+        CREATE TABLE IF NOT EXISTS Holiday (
+            date TEXT PRIMARY KEY,
+            name TEXT
+        ) WITHOUT ROWID
         '''
         self.execute_query(create_table_query)
     
+    def ensure_holiday_years(self, years):
+        """
+        祝日テーブルに登録されていない年の祝日を追加
+        
+        :param years: 対象の年のリスト
+        """
+        registered = {
+            int(row[0]) for row in self.execute_query('SELECT DISTINCT substr(date, 1, 4) FROM Holiday')
+        }
+        rows = [
+            holiday
+            for year in sorted(set(years) - registered)
+            for holiday in calendar_days.year_holidays(year)
+        ]
+        if rows:
+            with self.get_connection() as conn:
+                conn.executemany('INSERT OR IGNORE INTO Holiday (date, name) VALUES (?, ?)', rows)
+    
+    def migrate_calendar_table(self):
+        """
+        以前のバージョンで作成したCalendarテーブルを互換用のビューに置き換えるための移行
+        
+        ToDo.calendar_id はCalendarテーブルの連番から開始日の日番号に変換し、
+        開始日が未設定のToDoにはCalendarテーブルの日付を開始日として設定する
+        """
+        select_query = "SELECT type FROM sqlite_master WHERE name = 'Calendar'"
+        current = self.execute_query(select_query)
+        if not current or current[0][0] != 'table':
+            return
+        
+        # 複数のプロセスが同時に起動しても1回だけ移行するよう、確認と移行を1つのトランザクションで行う
+        connection = self.get_connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            current = connection.execute(select_query).fetchone()
+            if current and current[0] == 'table':
+                connection.execute('''
+                UPDATE ToDo
+                SET start_date = (SELECT date FROM Calendar WHERE Calendar.id = ToDo.calendar_id)
+                WHERE start_date IS NULL
+                ''')
+                connection.execute('''
+                UPDATE ToDo
+                SET calendar_id = CAST(julianday(substr(start_date, 1, 10)) AS INTEGER)
+                WHERE start_date IS NOT NULL
+                ''')
+                connection.execute('DROP TABLE Calendar')
+                connection.execute("DELETE FROM sqlite_sequence WHERE name = 'Calendar'")
+                print("Calendarテーブルを互換用のビューに移行しました。")
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    
+    def create_calendar_view(self):
+        """
+        互換用のCalendarビューを作成
+        
+        今日の前後1年とToDoの開始日・期限を含む範囲の日付を再帰CTEで生成する。
+        id には ToDo.calendar_id と同じ日番号（julianday の整数部）を使用する
+        """
+        create_view_query = '''
+        CREATE VIEW IF NOT EXISTS Calendar AS
+        WITH RECURSIVE
+        bounds (first_day, last_day) AS (
+            SELECT
+                MIN(date('now', 'localtime', '-1 year'),
+                    COALESCE(MIN(substr(start_date, 1, 10)), date('now', 'localtime'))),
+                MAX(date('now', 'localtime', '+1 year'),
+                    COALESCE(MAX(substr(start_date, 1, 10)), ''),
+                    COALESCE(MAX(substr(due_date, 1, 10)), ''))
+            FROM ToDo
+        ),
+        days (date) AS (
+            SELECT first_day FROM bounds
+            UNION ALL
+            SELECT date(days.date, '+1 day') FROM days, bounds WHERE days.date < bounds.last_day
+        )
+        SELECT
+            CAST(julianday(date) AS INTEGER) AS id,
+            date,
+            CAST(strftime('%Y', date) AS INTEGER) AS year,
+            CAST(strftime('%m', date) AS INTEGER) AS month,
+            CAST(strftime('%d', date) AS INTEGER) AS day,
+            CASE strftime('%w', date)
+                WHEN '0' THEN 'Sunday' WHEN '1' THEN 'Monday' WHEN '2' THEN 'Tuesday'
+                WHEN '3' THEN 'Wednesday' WHEN '4' THEN 'Thursday' WHEN '5' THEN 'Friday'
+                ELSE 'Saturday'
+            END AS day_of_week,
+            EXISTS (SELECT 1 FROM Holiday WHERE Holiday.date = days.date) AS is_holiday
+        FROM days
+        '''
+        self.execute_query(create_view_query)
+    
     def create_todo_table(self):
         """
         ToDoテーブルを作成
@@ -101,191 +316,516 @@ class DatabaseConnection:
             priority INTEGER DEFAULT 3,
             due_date TEXT,
             start_date TEXT,
-            FOREIGN KEY (calendar_id) REFERENCES Calendar(id)
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT,
+            created_at TEXT,
+            completed_at TEXT
         )
         '''
         self.execute_query(create_table_query)
+        
+        # 日付ごとのToDoは開始日で検索し、優先度・期限の順に並べる
+        self.execute_query('CREATE INDEX IF NOT EXISTS idx_todo_start_priority ON ToDo (start_date, priority, due_date)')
+        self.execute_query('DROP INDEX IF EXISTS idx_todo_start_date')
+        
+        # 未完了のToDoの上位N件を優先度・期限の順に取得するための部分インデックス
+        self.execute_query('''
+        CREATE INDEX IF NOT EXISTS idx_todo_open_priority ON ToDo (priority, due_date, start_date)
+        WHERE status IN ('未着手', '進行中')
+        ''')
+        
+        # 期限のリマインダーで次に期限を迎える未完了のToDoを求めるための部分インデックス
+        self.execute_query('''
+        CREATE INDEX IF NOT EXISTS idx_todo_open_due ON ToDo (due_date)
+        WHERE status IN ('未着手', '進行中')
+        ''')
+        
+        # 既存のデータベースに不足しているカラムを追加
+        self.ensure_column('ToDo', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        self.ensure_column('ToDo', 'updated_at', 'TEXT')
+        self.ensure_column('ToDo', 'created_at', 'TEXT')
+        self.ensure_column('ToDo', 'completed_at', 'TEXT')
+        
+        self.create_todo_timestamp_triggers()
     
-    def get_last_existing_date(self):
+    def create_todo_timestamp_triggers(self):
         """
-        データベースに保存されている最後の日付を取得
+        ToDoの作成日時・完了日時を記録するトリガーを作成
         
-        :return: 最後の日付（datetime型）または現在の日付
+        どの画面・プロセスから書き込まれても記録されるよう、トリガーで設定する
+        """
+        trigger_queries = [
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_todo_created AFTER INSERT ON ToDo
+            BEGIN
+                UPDATE ToDo
+                SET created_at = COALESCE(NEW.created_at, datetime('now', 'localtime')),
+                    completed_at = CASE WHEN NEW.status = '完了済'
+                                        THEN COALESCE(NEW.completed_at, datetime('now', 'localtime'))
+                                   END
+                WHERE id = NEW.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_todo_completed AFTER UPDATE OF status ON ToDo
+            WHEN NEW.status IS NOT OLD.status
+            BEGIN
+                UPDATE ToDo
+                SET completed_at = CASE WHEN NEW.status = '完了済'
+                                        THEN datetime('now', 'localtime')
+                                   END
+                WHERE id = NEW.id;
+            END
+            '''
+        ]
+        for query in trigger_queries:
+            self.execute_query(query)
+    
+    def create_todo_span_index(self):
         """
-        query = 'SELECT MAX(date) FROM Calendar'
-        result = self.execute_query(query)
+        ToDoの期間（開始日〜期限）の索引 ToDoSpan を R*Tree で作成
         
-        # データベースにまだ日付がない場合は現在の日付を返す
-        if not result or result[0][0] is None:
-            return datetime.now()
+        「指定日に期間中のToDo」「指定した月と期間が重なるToDo」を、履歴が増えても
+        対数時間で検索できるようにする。トリガーがない場合（新規作成時や、R*Tree が
+        使えない環境で更新された後）は索引を作り直す
+        
+        :return: 索引が使える場合はTrue
+        """
+        connection = self.get_connection()
+        try:
+            try:
+                connection.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS ToDoSpan USING rtree_i32(id, start_day, end_day)'
+                )
+                connection.execute('SELECT id FROM ToDoSpan LIMIT 1').fetchall()
+            except sqlite3.OperationalError as e:
+                # R*Tree が組み込まれていない SQLite では索引を使わずに検索する
+                print(f"期間の索引（R*Tree）を使用できません: {e}")
+                for name in self.SPAN_TRIGGERS:
+                    connection.execute(f'DROP TRIGGER IF EXISTS {name}')
+                connection.commit()
+                return False
         
-        # 最後の日付を取得
-        last_date_str = result[0][0]
-        return datetime.strptime(last_date_str, '%Y-%m-%d')
+            select_query = f'''
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE type = 'trigger' AND name IN ({', '.join('?' for _ in self.SPAN_TRIGGERS)})
+            '''
+            if connection.execute(select_query, self.SPAN_TRIGGERS).fetchone()[0] == len(self.SPAN_TRIGGERS):
+                return True
+        
+            # 複数のプロセスが同時に起動しても1回だけ作り直すよう、確認と作成を1つのトランザクションで行う
+            connection.execute('BEGIN IMMEDIATE')
+            if connection.execute(select_query, self.SPAN_TRIGGERS).fetchone()[0] != len(self.SPAN_TRIGGERS):
+                new_span = f"NEW.id, {self.SPAN_START_DAY.format(row='NEW')}, {self.SPAN_END_DAY.format(row='NEW')}"
+                trigger_queries = [
+                    f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_todo_span_insert AFTER INSERT ON ToDo
+                    WHEN NEW.start_date IS NOT NULL
+                    BEGIN
+                        INSERT INTO ToDoSpan (id, start_day, end_day) VALUES ({new_span});
+                    END
+                    ''',
+                    f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_todo_span_update AFTER UPDATE OF start_date, due_date ON ToDo
+                    BEGIN
+                        DELETE FROM ToDoSpan WHERE id = OLD.id;
+                        INSERT INTO ToDoSpan (id, start_day, end_day)
+                        SELECT {new_span} WHERE NEW.start_date IS NOT NULL;
+                    END
+                    ''',
+                    '''
+                    CREATE TRIGGER IF NOT EXISTS trg_todo_span_delete AFTER DELETE ON ToDo
+                    BEGIN
+                        DELETE FROM ToDoSpan WHERE id = OLD.id;
+                    END
+                    '''
+                ]
+                connection.execute('DELETE FROM ToDoSpan')
+                connection.execute(f'''
+                INSERT INTO ToDoSpan (id, start_day, end_day)
+                SELECT id, {self.SPAN_START_DAY.format(row='ToDo')}, {self.SPAN_END_DAY.format(row='ToDo')}
+                FROM ToDo
+                WHERE start_date IS NOT NULL
+                ''')
+                for query in trigger_queries:
+                    connection.execute(query)
+            connection.commit()
+            return True
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def ensure_column(self, table, column, definition):
+        """
+        テーブルにカラムが存在しない場合は追加する
+        
+        :param table: テーブル名
+        :param column: カラム名
+        :param definition: カラムの型と制約
+        """
+        with self.get_connection() as conn:
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+            if column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
     
-    def get_first_existing_date(self):
+    def create_change_log_table(self):
         """
-        データベースに保存されている最初の日付を取得
+        ToDoの変更履歴テーブルとトリガーを作成
         
-        :return: 最初の日付（datetime型）または現在の日付
+        外部プロセスによる変更を検知した際に、変更された行だけを取得するために使用する
         """
-        query = 'SELECT MIN(date) FROM Calendar'
-        result = self.execute_query(query)
+        create_table_query = '''
+        CREATE TABLE IF NOT EXISTS ToDoChangeLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            todo_id INTEGER,
+            op TEXT,
+            old_start_date TEXT,
+            new_start_date TEXT,
+            old_status TEXT,
+            new_status TEXT,
+            old_due_date TEXT,
+            new_due_date TEXT
+        )
+        '''
+        self.execute_query(create_table_query)
+        
+        # 期間（開始日〜期限）にまたがる表示を更新できるよう期限も記録する
+        self.ensure_column('ToDoChangeLog', 'old_due_date', 'TEXT')
+        self.ensure_column('ToDoChangeLog', 'new_due_date', 'TEXT')
         
-        # データベースにまだ日付がない場合は現在の日付を返す
-        if not result or result[0][0] is None:
-            return datetime.now()
+        # 挿入・更新・削除のたびに変更履歴を記録するトリガー
+        self.replace_trigger('trg_todo_change_insert', '''
+            CREATE TRIGGER trg_todo_change_insert AFTER INSERT ON ToDo
+            BEGIN
+                INSERT INTO ToDoChangeLog (todo_id, op, new_start_date, new_status, new_due_date)
+                VALUES (NEW.id, 'I', NEW.start_date, NEW.status, NEW.due_date);
+            END
+        ''')
+        self.replace_trigger('trg_todo_change_delete', '''
+            CREATE TRIGGER trg_todo_change_delete AFTER DELETE ON ToDo
+            BEGIN
+                INSERT INTO ToDoChangeLog (todo_id, op, old_start_date, old_status, old_due_date)
+                VALUES (OLD.id, 'D', OLD.start_date, OLD.status, OLD.due_date);
+            END
+        ''')
         
-        # 最初の日付を取得
-        first_date_str = result[0][0]
-        return datetime.strptime(first_date_str, '%Y-%m-%d')
+        # 作成日時・完了日時などの記録用カラムのみの更新は変更として扱わない
+        self.replace_trigger('trg_todo_change_update', f'''
+            CREATE TRIGGER trg_todo_change_update
+            AFTER UPDATE OF {', '.join(self.UPDATABLE_TODO_COLUMNS)} ON ToDo
+            BEGIN
+                INSERT INTO ToDoChangeLog (todo_id, op, old_start_date, new_start_date, old_status, new_status,
+                                           old_due_date, new_due_date)
+                VALUES (NEW.id, 'U', OLD.start_date, NEW.start_date, OLD.status, NEW.status,
+                        OLD.due_date, NEW.due_date);
+            END
+        ''')
     
-    def generate_calendar_data(self):
+    def sync_payload(self, row):
+        """
+        同期の変更履歴に記録するToDoの値（JSON）を作成する式
+
+        :param row: 行の参照（NEW・ToDo など）
         """
-        不足している日付範囲のカレンダーデータを追加生成
+        values = ', '.join(
+            f"'{column}', {row}.{column}" if column != 'created_at'
+            else f"'{column}', COALESCE({row}.{column}, datetime('now', 'localtime'))"
+            for column in self.SYNC_PAYLOAD_COLUMNS
+        )
+        return f'json_object({values})'
+    
+    def create_sync_log_table(self):
         """
-        # 現在の日付を取得
-        current_date = datetime.now()
+        拠点間の同期用の変更履歴テーブルとトリガーを作成
+        
+        ToDoごとに拠点をまたいで一意な uid を付け、追加・更新は変更後の値を、削除は削除の記録（tombstone）を
+        追記する。各変更には日時と記録した拠点を持たせ、取り込み時は新しい方の変更を採用する（sync_log.py）
+        """
+        self.execute_query('CREATE TABLE IF NOT EXISTS SyncMeta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+        self.execute_query("INSERT OR IGNORE INTO SyncMeta (key, value) VALUES ('site', lower(hex(randomblob(8))))")
+        
+        create_table_query = '''
+        CREATE TABLE IF NOT EXISTS ToDoSyncLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL,
+            op TEXT NOT NULL,
+            stamp TEXT NOT NULL,
+            site TEXT NOT NULL,
+            payload TEXT
+        )
+        '''
+        self.execute_query(create_table_query)
         
-        # 既存の最後の日付を取得
-        last_date = self.get_last_existing_date()
+        # ToDoごとの最新の変更を取得するための索引
+        self.execute_query('CREATE INDEX IF NOT EXISTS idx_sync_log_uid ON ToDoSyncLog (uid, seq)')
         
-        # 1年後の日付を計算
-        one_year_after = last_date.replace(year=last_date.year + 1)
+        self.ensure_column('ToDo', 'uid', 'TEXT')
+        self.execute_query('CREATE UNIQUE INDEX IF NOT EXISTS idx_todo_uid ON ToDo (uid)')
         
-        # 追加する開始日と終了日を決定
-        start_date = last_date + timedelta(days=1)
-        end_date = min(one_year_after, current_date.replace(year=current_date.year + 1))
+        # 追加時に uid を付けてから記録する（uid のみの更新は変更として扱わない）
+        self.replace_trigger('trg_todo_sync_insert', f'''
+            CREATE TRIGGER trg_todo_sync_insert AFTER INSERT ON ToDo
+            BEGIN
+                UPDATE ToDo SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id AND uid IS NULL;
+                INSERT INTO ToDoSyncLog (uid, op, stamp, site, payload)
+                SELECT uid, 'U', {self.SYNC_STAMP}, {self.SYNC_SITE}, {self.sync_payload('NEW')}
+                FROM ToDo WHERE id = NEW.id;
+            END
+        ''')
+        self.replace_trigger('trg_todo_sync_update', f'''
+            CREATE TRIGGER trg_todo_sync_update
+            AFTER UPDATE OF {', '.join(self.UPDATABLE_TODO_COLUMNS)} ON ToDo
+            WHEN NEW.uid IS NOT NULL
+            BEGIN
+                INSERT INTO ToDoSyncLog (uid, op, stamp, site, payload)
+                VALUES (NEW.uid, 'U', {self.SYNC_STAMP}, {self.SYNC_SITE}, {self.sync_payload('NEW')});
+            END
+        ''')
+        self.replace_trigger('trg_todo_sync_delete', f'''
+            CREATE TRIGGER trg_todo_sync_delete AFTER DELETE ON ToDo
+            WHEN OLD.uid IS NOT NULL
+            BEGIN
+                INSERT INTO ToDoSyncLog (uid, op, stamp, site, payload)
+                VALUES (OLD.uid, 'D', {self.SYNC_STAMP}, {self.SYNC_SITE}, NULL);
+            END
+        ''')
         
-        # データを追加する必要があるかチェック
-        if start_date > end_date:
-            print("カレンダーデータは最新です")
+        # uid のない既存のToDoに uid を付け、現在の値を最初の変更として記録する
+        if not self.execute_query('SELECT EXISTS (SELECT 1 FROM ToDo WHERE uid IS NULL)')[0][0]:
             return
+        connection = self.get_connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DROP TABLE IF EXISTS temp.SyncBackfill')
+            connection.execute('CREATE TEMP TABLE SyncBackfill AS SELECT id FROM ToDo WHERE uid IS NULL')
+            connection.execute(
+                'UPDATE ToDo SET uid = lower(hex(randomblob(16))) WHERE id IN (SELECT id FROM temp.SyncBackfill)'
+            )
+            connection.execute(f'''
+                INSERT INTO ToDoSyncLog (uid, op, stamp, site, payload)
+                SELECT uid, 'U', {self.SYNC_STAMP}, {self.SYNC_SITE}, {self.sync_payload('ToDo')}
+                FROM ToDo WHERE id IN (SELECT id FROM temp.SyncBackfill)
+                ORDER BY id
+            ''')
+            connection.execute('DROP TABLE temp.SyncBackfill')
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    
+    def replace_trigger(self, name, create_query):
+        """
+        トリガーの定義が異なる場合のみ作り直す
         
-        insert_query = '''
-        INSERT OR IGNORE INTO Calendar (date, year, month, day, day_of_week)
-        VALUES (?, ?, ?, ?, ?)
-        '''
+        複数のプロセスが同時に起動しても競合しないよう、確認と作り直しを1つのトランザクションで行う
         
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            current = start_date
-            while current <= end_date:
-                cursor.execute(insert_query, (
-                    current.strftime('%Y-%m-%d'),
-                    current.year,
-                    current.month,
-                    current.day,
-                    current.strftime('%A')
-                ))
-                current += timedelta(days=1)
-            
-            # 実際に追加されたデータの数をチェック
-            rows_added = conn.total_changes
-            
-            conn.commit()
-            
-            if rows_added > 0:
-                print(f"カレンダーデータを {start_date.strftime('%Y-%m-%d')} から {end_date.strftime('%Y-%m-%d')} まで追加生成しました。")
-            else:
-                print("カレンダーデータは最新です")
-            
-    def initialize_database(self):
+        :param name: トリガー名
+        :param create_query: CREATE TRIGGER 文
         """
-        データベースの初期化（テーブル作成とカレンダーデータ生成）
+        select_query = "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?"
+        normalized = ' '.join(create_query.split())
+        
+        current = self.execute_query(select_query, (name,))
+        if current and ' '.join(current[0][0].split()) == normalized:
+            return
+        
+        connection = self.get_connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            current = connection.execute(select_query, (name,)).fetchone()
+            if not current or ' '.join(current[0].split()) != normalized:
+                connection.execute(f'DROP TRIGGER IF EXISTS {name}')
+                connection.execute(create_query)
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    
+    def get_latest_change_seq(self):
         """
-        # テーブル作成
-        self.create_calendar_table()
-        self.create_todo_table()
+        変更履歴の最新シーケンス番号を取得
         
-        # カレンダーデータが空の場合のみ初期データを生成
-        check_calendar_query = 'SELECT COUNT(*) FROM Calendar'
-        result = self.execute_query(check_calendar_query)[0][0]
+        :return: 最新のシーケンス番号（履歴がない場合は0）
+        """
+        result = self.execute_query('SELECT MAX(seq) FROM ToDoChangeLog')
+        return result[0][0] or 0
+    
+    def prune_change_log(self, keep=10000):
+        """
+        古い変更履歴を削除し、最新の keep 件だけを残す
         
-        # 1年以上前の古いデータを削除
-        # self.delete_old_calendar_data()
+        :param keep: 残す履歴の件数
+        """
+        query = 'DELETE FROM ToDoChangeLog WHERE seq <= ?'
+        self.execute_query(query, (self.get_latest_change_seq() - keep,))
+    
+    def create_daily_task_stats_table(self):
+        """
+        日別・作業者別・ステータス別のタスク件数を集計したテーブルとトリガーを作成
         
-        if result == 0:
-            # 初回実行時は現在の日付から1年分を生成
-            start_date = datetime.now()
-            end_date = start_date + timedelta(days=364)
-            
-            insert_query = '''
-            INSERT OR IGNORE INTO Calendar (date, year, month, day, day_of_week)
-            VALUES (?, ?, ?, ?, ?)
+        統計画面とカレンダーの注釈は ToDo を毎回集計せず、このテーブルを参照する
+        """
+        table_exists = self.execute_query(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'DailyTaskStats'"
+        )[0][0]
+        
+        create_table_query = '''
+        CREATE TABLE IF NOT EXISTS DailyTaskStats (
+            day TEXT NOT NULL,
+            due_day TEXT NOT NULL,
+            assignee TEXT NOT NULL,
+            status TEXT NOT NULL,
+            task_count INTEGER NOT NULL,
+            PRIMARY KEY (day, due_day, assignee, status)
+        ) WITHOUT ROWID
+        '''
+        self.execute_query(create_table_query)
+        
+        # 集計キーとなる値（NULLは空文字として集計）
+        def key(row):
+            return (f"COALESCE(substr({row}.start_date, 1, 10), ''), "
+                    f"COALESCE(substr({row}.due_date, 1, 10), ''), "
+                    f"COALESCE({row}.assignee, ''), "
+                    f"COALESCE({row}.status, '')")
+        
+        def increment(row):
+            return f'''
+                INSERT INTO DailyTaskStats (day, due_day, assignee, status, task_count)
+                VALUES ({key(row)}, 1)
+                ON CONFLICT (day, due_day, assignee, status) DO UPDATE SET task_count = task_count + 1;
             '''
-            
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                current = start_date
-                while current <= end_date:
-                    cursor.execute(insert_query, (
-                        current.strftime('%Y-%m-%d'),
-                        current.year,
-                        current.month,
-                        current.day,
-                        current.strftime('%A')
-                    ))
-                    current += timedelta(days=1)
-                
-                conn.commit()
-                print(f"初期カレンダーデータを {start_date.strftime('%Y-%m-%d')} から {end_date.strftime('%Y-%m-%d')} まで生成しました。")
         
-        # 不足している日付を追加
-        self.generate_calendar_data()
+        def decrement(row):
+            return f'''
+                UPDATE DailyTaskStats SET task_count = task_count - 1
+                WHERE (day, due_day, assignee, status) = ({key(row)});
+                DELETE FROM DailyTaskStats
+                WHERE (day, due_day, assignee, status) = ({key(row)}) AND task_count <= 0;
+            '''
         
-        # 祝日情報を更新
-        self.update_holiday_information()
-
-    def update_holiday_information(self):
+        trigger_queries = [
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_todo_stats_insert AFTER INSERT ON ToDo
+            BEGIN
+                {increment('NEW')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_todo_stats_update
+            AFTER UPDATE OF start_date, due_date, assignee, status ON ToDo
+            BEGIN
+                {decrement('OLD')}
+                {increment('NEW')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_todo_stats_delete AFTER DELETE ON ToDo
+            BEGIN
+                {decrement('OLD')}
+            END
+            '''
+        ]
+        for query in trigger_queries:
+            self.execute_query(query)
+        
+        # 新しく作成した場合は既存のToDoから集計する
+        if not table_exists:
+            self.rebuild_daily_task_stats()
+    
+    def rebuild_daily_task_stats(self):
+        """
+        DailyTaskStats を ToDo から集計し直す
+        
+        :return: 集計後の行数
+        """
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM DailyTaskStats')
+            conn.execute(
+                'INSERT INTO DailyTaskStats (day, due_day, assignee, status, task_count) '
+                + self.DAILY_TASK_STATS_SOURCE_QUERY
+            )
+            return conn.execute('SELECT COUNT(*) FROM DailyTaskStats').fetchone()[0]
+    
+    def verify_daily_task_stats(self):
         """
-        Calendarテーブルの祝日情報を更新
+        DailyTaskStats と ToDo の集計結果を比較する
+        
+        :return: 差異のある (day, due_day, assignee, status, 集計テーブルの件数, ToDoの件数) のリスト
         """
-        update_query = '''
-        UPDATE Calendar
-        SET is_holiday = ?
-        WHERE date = ?
+        query = f'''
+        WITH expected AS ({self.DAILY_TASK_STATS_SOURCE_QUERY})
+        SELECT s.day, s.due_day, s.assignee, s.status, s.task_count, COALESCE(e.task_count, 0)
+        FROM DailyTaskStats s
+        LEFT JOIN expected e USING (day, due_day, assignee, status)
+        WHERE e.task_count IS NOT s.task_count
+        UNION ALL
+        SELECT e.day, e.due_day, e.assignee, e.status, 0, e.task_count
+        FROM expected e
+        LEFT JOIN DailyTaskStats s USING (day, due_day, assignee, status)
+        WHERE s.task_count IS NULL
         '''
+        return self.execute_query(query)
+    
+    def initialize_database(self):
+        """
+        データベースの初期化（テーブル作成と以前のバージョンからの移行）
         
-        select_query = 'SELECT date FROM Calendar'
-        dates = self.execute_query(select_query)
-
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            for date_tuple in dates:
-                date_str = date_tuple[0]
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-
-                # `jpholiday`を使って祝日判定
-                is_holiday = 1 if jpholiday.is_holiday(date_obj) else 0
-
-                cursor.execute(update_query, (is_holiday, date_str))
-            conn.commit()
-        print("祝日情報を更新しました。")
+        日付と祝日は calendar_days で都度計算するため、起動時にカレンダーデータは生成しない
+        """
+        # 複数の編集者が同時に読み書きできるようWALモードを使用（メモリ上のデータベースはWALを使えない）
+        if not self.is_memory:
+            self.execute_query('PRAGMA journal_mode=WAL')
+        
+        # テーブル作成
+        self.create_todo_table()
+        
+        # Calendarテーブルを互換用のビューに置き換え
+        # （calendar_id の書き換えが変更履歴・同期の履歴に記録されないよう、履歴のトリガーより先に行う）
+        self.migrate_calendar_table()
+        
+        self.create_change_log_table()
+        self.prune_change_log()
+        self.create_sync_log_table()
+        self.create_daily_task_stats_table()
+        self.span_index_available = self.create_todo_span_index()
+        self.create_holiday_table()
+        self.create_calendar_view()
+        
+        # 互換用ビューの範囲（ToDoの開始日・期限と今日の前後1年）の祝日を登録
+        first_year, last_year = self.execute_query(
+            '''
+            SELECT MIN(substr(start_date, 1, 4)),
+                   MAX(COALESCE(MAX(substr(start_date, 1, 4)), ''), COALESCE(MAX(substr(due_date, 1, 4)), ''))
+            FROM ToDo
+            '''
+        )[0]
+        this_year = datetime.now().year
+        first_year = min(int(first_year), this_year - 1) if first_year else this_year - 1
+        last_year = max(int(last_year), this_year + 1) if last_year else this_year + 1
+        self.ensure_holiday_years(range(first_year, last_year + 1))
+        
+        # 1年以上前の古いデータを削除
+        # self.delete_old_calendar_data()
 
     def delete_old_calendar_data(self):
         """
-        1年以上前のCalendarデータと関連するToDoデータを削除
+        開始日が1年以上前のToDoデータを削除
         """
         try:
             # 現在の日付から1年以上前の日付を取得
             one_year_ago = datetime.now() - timedelta(days=365)
             one_year_ago_str = one_year_ago.strftime('%Y-%m-%d')
 
-            # 古いToDoデータと関連するCalendarデータを削除するクエリ
+            # 古いToDoデータを削除するクエリ
             delete_todos_query = '''
             DELETE FROM ToDo 
-            WHERE calendar_id IN (
-                SELECT id FROM Calendar 
-                WHERE date < ?
-            )
-            '''
-
-            delete_calendar_query = '''
-            DELETE FROM Calendar 
-            WHERE date < ?
+            WHERE start_date < ?
             '''
 
             with self.get_connection() as conn:
@@ -295,21 +835,99 @@ class DatabaseConnection:
                 cursor.execute(delete_todos_query, (one_year_ago_str,))
                 todo_deleted_count = cursor.rowcount
                 
-                # 古いCalendarデータを削除
-                cursor.execute(delete_calendar_query, (one_year_ago_str,))
-                calendar_deleted_count = cursor.rowcount
-                
                 conn.commit()
                 
                 print(f"1年以上前の古いToDoデータ {todo_deleted_count} 件を削除しました。")
-                print(f"1年以上前の古いCalendarデータ {calendar_deleted_count} 件を削除しました。")
                 
         except sqlite3.Error as e:
             print(f"古いデータ削除中にエラーが発生しました: {e}")
             raise
 
+class ChangeWatcher:
+    def __init__(self, db, local_seqs=None):
+        """
+        PRAGMA data_version を利用した外部変更検知クラス
+        
+        長期間保持する専用の接続で data_version を監視し、値が変わった場合のみ
+        前回確認以降の変更履歴を取得する
+        
+        :param db: DatabaseConnectionオブジェクト
+        :param local_seqs: 自身の書き込みによる変更履歴のシーケンス番号の集合（TodoRepository.written_seqs）。
+                           書き込んだ側で画面に反映済みのため、取得した変更履歴から除く
+        """
+        self.db = db
+        self.local_seqs = local_seqs if local_seqs is not None else set()
+        self.connection = sqlite3.connect(db.db_path, check_same_thread=False, uri=True)
+        self.last_data_version = self.get_data_version()
+        self.last_seq = db.get_latest_change_seq()
+    
+    def get_data_version(self):
+        """
+        現在の data_version を取得
+        
+        :return: data_version の値
+        """
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+    
+    def poll(self):
+        """
+        前回確認以降の変更履歴を取得
+        
+        :return: (seq, todo_id, op, old_start_date, new_start_date, old_status, new_status,
+                 old_due_date, new_due_date) のリスト
+                 変更がない場合は空のリスト
+        """
+        try:
+            data_version = self.get_data_version()
+            if data_version == self.last_data_version:
+                return []
+            self.last_data_version = data_version
+            
+            changes = self.connection.execute(
+                '''
+                SELECT seq, todo_id, op, old_start_date, new_start_date, old_status, new_status,
+                       old_due_date, new_due_date
+                FROM ToDoChangeLog
+                WHERE seq > ?
+                ORDER BY seq
+                ''',
+                (self.last_seq,)
+            ).fetchall()
+            
+            if changes:
+                self.last_seq = changes[-1][0]
+                changes = [change for change in changes if change[0] not in self.local_seqs]
+            # 読み終えたシーケンス番号は以降の変更履歴に現れないため破棄する
+            self.local_seqs.difference_update([seq for seq in self.local_seqs if seq <= self.last_seq])
+            return changes
+        except sqlite3.Error as e:
+            print(f"変更検知エラー: {e}")
+            return []
+    
+    def close(self):
+        """監視用の接続を閉じる"""
+        self.connection.close()
+
 def main():
+    parser = argparse.ArgumentParser(description='ToDoカレンダーのデータベース管理')
+    parser.add_argument('--verify-stats', action='store_true', help='集計テーブルとToDoの差異を確認')
+    parser.add_argument('--rebuild-stats', action='store_true', help='集計テーブルをToDoから再作成')
+    args = parser.parse_args()
+    
     db = DatabaseConnection()
+    
+    if args.verify_stats:
+        drift = db.verify_daily_task_stats()
+        if drift:
+            print(f"集計テーブルに {len(drift)} 件の差異があります。")
+            for day, due_day, assignee, status, stored, expected in drift:
+                print(f"  {day} 期限{due_day} {assignee} {status}: 集計 {stored}件 / 実際 {expected}件")
+        else:
+            print("集計テーブルに差異はありません。")
+    
+    if args.rebuild_stats:
+        rows = db.rebuild_daily_task_stats()
+        print(f"集計テーブルを再作成しました（{rows} 行）。")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,363 @@
+"""
+操作の記録と再生（操作ごとの応答時間の計測）
+
+コマンドライン引数 --record-trace <ファイル> または環境変数 TODO_TRACE_RECORD=<ファイル> で起動すると、
+カレンダーの日付のクリック・月の切り替え・ToDoの追加／変更ダイアログの保存・右クリックによる
+進捗状況の進行を JSON Lines で記録する。日付は記録した日からの日数（月は月数）で保存するため、
+別の日に再生しても同じ位置関係の日付を操作する。
+
+再生は offscreen の Qt プラットフォームで、ベンチマーク用のToDoを生成した一時データベースに対して
+記録した操作を順に実行し、操作の種類ごとの応答時間（操作の開始からイベントの処理が終わるまで）の
+パーセンタイルを表示する。結果を保存して次回の再生と比較すると、遅くなった操作を検出できる。
+
+使い方:
+    python ToDo_Calendar_GUI.py --record-trace trace.jsonl
+    python interaction_trace.py trace.jsonl --todos 20000 --repeat 3
+    python interaction_trace.py trace.jsonl --memory          メモリ上のデータベースに対して再生
+    python interaction_trace.py trace.jsonl --save baseline.json
+    python interaction_trace.py trace.jsonl --compare baseline.json --tolerance 1.5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+FORMAT_VERSION = 1
+RECORD_ENV = 'TODO_TRACE_RECORD'
+
+# 記録した日からの日数に変換して保存する項目
+DATE_FIELDS = ('date', 'start_date', 'due_date')
+
+# 表示するパーセンタイル
+PERCENTILES = (50, 90, 99)
+
+# 起動してから操作可能になるまで待つ最大時間（秒）
+STARTUP_TIMEOUT = 120
+
+def parse_options(argv):
+    """
+    コマンドライン引数と環境変数 TODO_TRACE_RECORD から操作の記録先を取得
+
+    :param argv: コマンドライン引数のリスト（sys.argv）
+    :return: (記録先のパス（記録しない場合はNone）, 記録の引数を除いた引数のリスト)
+    """
+    path = os.environ.get(RECORD_ENV) or None
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--record-trace':
+            path = next(args, None)
+        elif arg.startswith('--record-trace='):
+            path = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+    return path, remaining
+
+class TraceRecorder:
+    """操作を1行ずつファイルに追記する（異常終了しても記録済みの操作は残る）"""
+
+    def __init__(self, path):
+        """
+        :param path: 記録するファイルのパス
+        """
+        self.path = path
+        self.today = date.today()
+        self.started_at = time.perf_counter()
+        self.file = open(path, 'w', encoding='utf-8')
+        self._write({'format': FORMAT_VERSION, 'recorded_at': datetime.now().isoformat(timespec='seconds')})
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def _relative(self, fields):
+        """日付（'yyyy-MM-dd'）を記録した日からの日数に変換"""
+        converted = {}
+        for key, value in fields.items():
+            if isinstance(value, dict):
+                value = self._relative(value)
+            elif key in DATE_FIELDS and value:
+                value = (datetime.strptime(str(value)[:10], '%Y-%m-%d').date() - self.today).days
+            converted[key] = value
+        return converted
+
+    def record(self, action, **fields):
+        """
+        操作を記録
+
+        :param action: 操作の種類（date_click・page_change・add_todo・edit_todo・advance_status）
+        :param fields: 操作の内容（日付は 'yyyy-MM-dd' の文字列で渡す）
+        """
+        if self.file.closed:
+            return
+        entry = {'t': round(time.perf_counter() - self.started_at, 3), 'action': action}
+        entry.update(self._relative(fields))
+        self._write(entry)
+
+    def record_page(self, year, month):
+        """月の切り替えを記録した月からの月数で記録"""
+        self.record('page_change', months=(year - self.today.year) * 12 + month - self.today.month)
+
+    def close(self):
+        self.file.close()
+
+def read_trace(path):
+    """
+    記録したファイルを読み込む
+
+    :return: (ヘッダーの辞書, 操作の辞書のリスト)
+    :raises ValueError: 対応していない形式の場合
+    """
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != FORMAT_VERSION:
+            raise ValueError(f"対応していない形式です: {path}")
+        # 最後の行は書き込み途中で終了した可能性があるため、読めない行は無視する
+        actions = []
+        for line in f:
+            try:
+                actions.append(json.loads(line))
+            except ValueError:
+                continue
+    return header, actions
+
+def summarize(latencies):
+    """
+    操作の種類ごとの応答時間を集計
+
+    :param latencies: 操作の種類と応答時間（ms）のリストの辞書
+    :return: 操作の種類と {'count', 'p50', 'p90', 'p99', 'max'} の辞書
+    """
+    summary = {}
+    for action, values in latencies.items():
+        values = np.asarray(values, dtype=float)
+        stats = {'count': int(values.size)}
+        for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            stats[f'p{percentile}'] = round(float(value), 3)
+        stats['max'] = round(float(values.max()), 3)
+        summary[action] = stats
+    return summary
+
+def compare(summary, baseline, tolerance):
+    """
+    基準の結果より p90 が tolerance 倍を超えて遅くなった操作を取得
+
+    :return: (操作の種類, 基準の p90, 今回の p90) のリスト
+    """
+    regressions = []
+    for action, stats in summary.items():
+        base = baseline.get(action)
+        if base and stats['p90'] > base['p90'] * tolerance:
+            regressions.append((action, base['p90'], stats['p90']))
+    return regressions
+
+class TraceReplayer:
+    """記録した操作を ToDoCalendarApp に対して再生し、応答時間を計測する"""
+
+    def __init__(self, app, window, realtime=False):
+        """
+        :param app: QApplication
+        :param window: 操作可能になった ToDoCalendarApp
+        :param realtime: 記録時の操作の間隔を空けて再生する（タイマーによる処理も記録時と同じように動く）
+        """
+        self.app = app
+        self.window = window
+        self.realtime = realtime
+        self.today = date.today()
+        self.latencies = {}
+        self.skipped = 0
+
+    def qdate(self, offset):
+        from PyQt5.QtCore import QDate
+        day = self.today + timedelta(days=offset)
+        return QDate(day.year, day.month, day.day)
+
+    def fill_dialog(self, dialog, values):
+        """ToDoの追加・変更ダイアログに記録した値を入力"""
+        if 'title' in values:
+            dialog.title_combo.setCurrentText(values['title'])
+        if 'description' in values:
+            if hasattr(dialog.description_input, 'setPlainText'):
+                dialog.description_input.setPlainText(values['description'])
+            else:
+                dialog.description_input.setText(values['description'])
+        if 'status' in values:
+            dialog.status_combo.setCurrentText(values['status'])
+        if 'priority' in values:
+            dialog.set_priority(dialog.priority_combo, values['priority'])
+        if 'start_date' in values:
+            dialog.start_date_input.setSelectedDate(self.qdate(values['start_date']))
+        if 'due_date' in values:
+            dialog.due_date_input.setSelectedDate(self.qdate(values['due_date']))
+        if 'registrant' in values:
+            dialog.registrant_combo.setCurrentText(values['registrant'])
+        if 'assignee' in values:
+            dialog.assignee_combo.setCurrentText(values['assignee'])
+
+    def perform(self, entry):
+        """
+        1件の操作を実行
+
+        :return: 実行した場合はTrue（対象の行がないなどで実行できない場合はFalse）
+        """
+        import ToDo_Calendar_GUI as gui
+        window = self.window
+        action = entry['action']
+
+        if action == 'date_click':
+            day = self.qdate(entry['date'])
+            window.calendar_widget.setSelectedDate(day)
+            window.calendar_widget.clicked.emit(day)
+        elif action == 'page_change':
+            month = self.today.month - 1 + entry['months']
+            window.calendar_widget.setCurrentPage(self.today.year + month // 12, month % 12 + 1)
+        elif action == 'add_todo':
+            dialog = gui.AddToDoDialog(window)
+            self.fill_dialog(dialog, entry['values'])
+            dialog.save_todo()
+            window.show_delayed_todos()
+            dialog.deleteLater()
+        elif action == 'edit_todo':
+            if entry['row'] >= window.todo_table.rowCount():
+                return False
+            dialog = gui.EditToDoDialog(window, window.todo_table.item(entry['row'], 0).text())
+            self.fill_dialog(dialog, entry['values'])
+            dialog.update_todo()
+            dialog.deleteLater()
+        elif action == 'advance_status':
+            if entry['row'] >= window.todo_table.rowCount():
+                return False
+            window.advance_todo_status(entry['row'])
+        else:
+            return False
+        return True
+
+    def replay(self, actions):
+        """操作を順に実行し、操作の種類ごとの応答時間を記録"""
+        previous_t = None
+        for entry in actions:
+            if self.realtime and previous_t is not None:
+                # 記録時の間隔の間はイベントを処理し続ける（タイマー・描画）
+                wait_until = time.perf_counter() + max(entry['t'] - previous_t, 0)
+                while time.perf_counter() < wait_until:
+                    self.app.processEvents()
+                    time.sleep(0.005)
+            previous_t = entry.get('t', previous_t)
+
+            start = time.perf_counter()
+            if not self.perform(entry):
+                self.skipped += 1
+                continue
+            # 操作によって発生したイベント（再描画・遅延実行の処理）を処理し終えるまでを計測する
+            self.app.sendPostedEvents()
+            self.app.processEvents()
+            elapsed = (time.perf_counter() - start) * 1000
+            self.latencies.setdefault(entry['action'], []).append(elapsed)
+
+def replay_trace(trace_path, todos=20000, history_days=90, repeat=1, realtime=False, db_folder=None, memory=False):
+    """
+    記録した操作を一時データベースに対して再生
+
+    :param trace_path: 記録したファイルのパス
+    :param todos: 生成するToDoの件数
+    :param history_days: 今日より前に遡って開始日を分布させる日数
+    :param repeat: 再生する回数
+    :param realtime: 記録時の操作の間隔を空けて再生する
+    :param db_folder: データベースを作成するフォルダ（省略時は一時フォルダ）
+    :param memory: メモリ上のデータベースに対して再生する（ディスクの速度の影響を除いて比べる場合）
+    :return: (集計結果の辞書, 実行できなかった操作の数, 表示されたメッセージのリスト)
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    import ToDo_Calendar_GUI as gui
+    from database_connection import DatabaseConnection
+    from benchmarks import seed_todos
+
+    _, actions = read_trace(trace_path)
+    with tempfile.TemporaryDirectory(dir=db_folder) as temp_dir:
+        # メモリ上のデータベースは再生が終わるまで seed_db の接続で保持する
+        seed_db = DatabaseConnection(':memory:' if memory else os.path.join(temp_dir, 'replay.db'))
+        seed_todos(seed_db, todos, history_days=history_days)
+        db_path = seed_db.db_path
+
+        app = QApplication.instance() or QApplication([])
+
+        # 確認・エラーのメッセージボックスは表示せずに記録し、確認は「はい」として続ける
+        messages = []
+        originals = {name: getattr(QMessageBox, name) for name in ('question', 'warning', 'critical', 'information')}
+
+        def message_box(name):
+            def show(parent, title, text, *args, **kwargs):
+                messages.append((name, title, text))
+                return QMessageBox.Yes if name == 'question' else QMessageBox.Ok
+            return staticmethod(show)
+
+        for name in originals:
+            setattr(QMessageBox, name, message_box(name))
+        try:
+            window = gui.ToDoCalendarApp(db_path=db_path)
+            window.show()
+            deadline = time.perf_counter() + STARTUP_TIMEOUT
+            while 'time_to_interactive' not in window.startup_metrics:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("再生用のウィンドウが操作可能になりませんでした")
+                app.processEvents()
+                time.sleep(0.005)
+
+            replayer = TraceReplayer(app, window, realtime)
+            replayer.latencies['startup'] = [window.startup_metrics['time_to_interactive']]
+            for _ in range(repeat):
+                replayer.replay(actions)
+            window.close()
+        finally:
+            for name, method in originals.items():
+                setattr(QMessageBox, name, method)
+            seed_db.close()
+
+    return summarize(replayer.latencies), replayer.skipped, messages
+
+def main():
+    parser = argparse.ArgumentParser(description='記録した操作の再生と応答時間の計測')
+    parser.add_argument('trace', help='--record-trace で記録したファイル')
+    parser.add_argument('--todos', type=int, default=20000, help='生成するToDoの件数')
+    parser.add_argument('--history-days', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=1, help='再生する回数')
+    parser.add_argument('--realtime', action='store_true', help='記録時の操作の間隔を空けて再生する')
+    parser.add_argument('--memory', action='store_true', help='メモリ上のデータベースに対して再生する')
+    parser.add_argument('--save', help='集計結果を保存するファイル（JSON）')
+    parser.add_argument('--compare', help='比較する基準の集計結果（--save で保存したファイル）')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='p90 がこの倍率を超えたら遅くなったとみなす')
+    args = parser.parse_args()
+
+    summary, skipped, messages = replay_trace(args.trace, args.todos, args.history_days, args.repeat, args.realtime,
+                                              memory=args.memory)
+
+    print(f"{'操作':16} {'回数':>6} " + ' '.join(f"{f'p{p}':>9}" for p in PERCENTILES) + f" {'最大':>9}（ms）")
+    for action, stats in summary.items():
+        print(f"{action:16} {stats['count']:6d} " + ' '.join(f"{stats[f'p{p}']:9.1f}" for p in PERCENTILES)
+              + f" {stats['max']:9.1f}")
+    if skipped:
+        print(f"対象の行がないため実行しなかった操作: {skipped}件")
+    for name, title, text in messages:
+        print(f"メッセージ（{name}）: {title}: {text}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        for action, before, after in regressions:
+            print(f"遅くなった操作: {action} p90 {before:.1f}ms → {after:.1f}ms")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+期間（開始日〜終了日の日番号）のメモリ上の索引
+
+期間を、その期間が収まる最小の 2^k 日単位の区画（ビン）に登録する階層型のビン分割を使う。
+検索では各階層で対象の範囲にかかる区画だけを調べるため、登録件数が増えても
+調べる区画の数は範囲の長さと階層数（日番号のビット数）で決まる
+"""
+
+# 階層の数（日番号は 2^23 未満）
+MAX_LEVEL = 23
+
+class IntervalIndex:
+    def __init__(self):
+        # キーと (開始, 終了) の対応
+        self.spans = {}
+        # (階層, 区画番号) とキーの集合の対応
+        self.bins = {}
+        # 階層ごとの登録件数（空の階層は検索しない）
+        self.level_counts = [0] * (MAX_LEVEL + 1)
+
+    @staticmethod
+    def _level(start, end):
+        """期間が1つの区画に収まる最小の階層"""
+        return min((start ^ end).bit_length(), MAX_LEVEL)
+
+    def add(self, key, start, end):
+        """
+        期間を登録（同じキーが登録済みの場合は置き換える）
+
+        :param key: キー（ToDoのIDなど）
+        :param start: 開始の日番号
+        :param end: 終了の日番号（開始より前の場合は開始と同じとみなす）
+        """
+        self.remove(key)
+        end = max(start, end)
+        level = self._level(start, end)
+        self.spans[key] = (start, end)
+        self.bins.setdefault((level, start >> level), set()).add(key)
+        self.level_counts[level] += 1
+
+    def remove(self, key):
+        """期間の登録を削除"""
+        span = self.spans.pop(key, None)
+        if span is None:
+            return
+        level = self._level(*span)
+        bin_key = (level, span[0] >> level)
+        keys = self.bins[bin_key]
+        keys.discard(key)
+        if not keys:
+            del self.bins[bin_key]
+        self.level_counts[level] -= 1
+
+    def overlapping(self, first, last):
+        """
+        指定した範囲と期間が重なるキーを取得
+
+        :param first: 範囲の最初の日番号
+        :param last: 範囲の最後の日番号
+        :return: キーのリスト
+        """
+        found = []
+        spans = self.spans
+        for level, count in enumerate(self.level_counts):
+            if not count:
+                continue
+            for bin_number in range(first >> level, (last >> level) + 1):
+                for key in self.bins.get((level, bin_number), ()):
+                    start, end = spans[key]
+                    if start <= last and end >= first:
+                        found.append(key)
+        return found
+
+    def clear(self):
+        self.spans.clear()
+        self.bins.clear()
+        self.level_counts = [0] * (MAX_LEVEL + 1)
+
+    def __len__(self):
+        return len(self.spans)
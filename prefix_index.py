@@ -0,0 +1,150 @@
+"""
+入力候補（タイトル・承認者・作業者）のメモリ上の索引
+
+値を正規化（全角・半角の統一、大文字・小文字の区別なし、カタカナをひらがなに変換）した文字列の
+ソート済みリストで前方一致を二分探索する。部分一致は正規化した文字列を区切り文字でつないだ
+1つの文字列を str.find で検索し、見つかった位置から値を二分探索で求めるため、値ごとの索引を
+作らずに C の文字列検索の速度で調べられる。候補は前方一致を先に、同じ値を使ったToDoの件数の多い順に返す
+"""
+import bisect
+import heapq
+import unicodedata
+
+# カタカナ（ァ〜ヶ）をひらがなに変換する表
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+# 1回の検索で前方一致・部分一致それぞれで集める値の最大数（入力1文字ごとの処理時間の上限）。
+# 一致する値がこれより多い場合は、集めた範囲の中で件数の多い順に並べる
+MAX_SCANNED = 2000
+
+def normalize(text):
+    """
+    比較用に文字列を正規化
+
+    :param text: 文字列
+    :return: NFKC正規化・casefold・カタカナをひらがなに変換した文字列
+    """
+    return unicodedata.normalize('NFKC', str(text)).casefold().translate(_KATAKANA_TO_HIRAGANA)
+
+# 部分一致の検索用に正規化した文字列をつなぐ区切り文字
+SEPARATOR = '\0'
+
+class PrefixIndex:
+    def __init__(self, counts=None):
+        """
+        :param counts: 値と件数の対応（または (値, 件数) のリスト）
+        """
+        # 値と件数の対応
+        self.counts = {}
+        # 値と正規化した文字列の対応
+        self.keys = {}
+        # (正規化した文字列, 値) のソート済みリスト（前方一致用）
+        self.sorted_keys = []
+        # 部分一致用のつないだ文字列・各値の開始位置・値のリスト（値の追加後の最初の検索で作り直す）
+        self.text = None
+        self.offsets = []
+        self.values = []
+        if counts:
+            self.load(counts)
+
+    def load(self, counts):
+        """
+        値をまとめて登録（既存の登録は破棄する）
+
+        :param counts: 値と件数の対応（または (値, 件数) のリスト）
+        """
+        self.clear()
+        for value, count in dict(counts).items():
+            if value:
+                self.counts[value] = count
+                self.keys[value] = normalize(value)
+        self.sorted_keys = sorted((key, value) for value, key in self.keys.items())
+
+    def add(self, value, count=1):
+        """
+        値を登録（登録済みの場合は件数を加算する）
+
+        :param value: 値
+        :param count: 加算する件数
+        """
+        if not value:
+            return
+        if value in self.counts:
+            self.counts[value] += count
+            return
+        key = normalize(value)
+        self.counts[value] = count
+        self.keys[value] = key
+        bisect.insort(self.sorted_keys, (key, value))
+        self.text = None
+
+    def top(self, limit):
+        """件数の多い値を取得"""
+        return [value for value, _ in heapq.nsmallest(limit, self.counts.items(), key=lambda item: (-item[1], item[0]))]
+
+    def search(self, text, limit=20):
+        """
+        入力に一致する値を取得
+
+        :param text: 入力中の文字列
+        :param limit: 取得する最大件数
+        :return: 前方一致・部分一致の順に、それぞれ件数の多い順の値のリスト
+        """
+        query = normalize(text).strip()
+        if not query:
+            return self.top(limit)
+
+        # 前方一致（正規化した文字列の範囲）
+        first = bisect.bisect_left(self.sorted_keys, (query,))
+        last = bisect.bisect_left(self.sorted_keys, (query + '\U0010ffff',), first)
+        prefix_matches = [value for _, value in self.sorted_keys[first:min(last, first + MAX_SCANNED)]]
+        counts = self.counts
+        found = heapq.nsmallest(limit, prefix_matches, key=lambda value: (-counts[value], value))
+        if len(found) >= limit:
+            return found
+
+        # 部分一致（前方一致した値を除く）
+        prefix_set = set(prefix_matches)
+        substring_matches = [value for value in self._find_substring(query) if value not in prefix_set]
+        return found + heapq.nsmallest(limit - len(found), substring_matches,
+                                       key=lambda value: (-counts[value], value))
+
+    def _find_substring(self, query):
+        """
+        正規化した文字列に query を含む値を取得（最大 MAX_SCANNED 件）
+        """
+        if self.text is None:
+            self.values = list(self.keys)
+            self.offsets = []
+            position = 0
+            for value in self.values:
+                self.offsets.append(position)
+                position += len(self.keys[value]) + len(SEPARATOR)
+            self.text = SEPARATOR.join(self.keys[value] for value in self.values)
+
+        text, offsets, values = self.text, self.offsets, self.values
+        matches = []
+        position = text.find(query)
+        while position >= 0 and len(matches) < MAX_SCANNED:
+            number = bisect.bisect_right(offsets, position) - 1
+            matches.append(values[number])
+            # 同じ値の中の2つ目以降の一致は飛ばす
+            next_number = number + 1
+            if next_number >= len(offsets):
+                break
+            position = text.find(query, offsets[next_number])
+        return matches
+
+    def clear(self):
+        self.counts.clear()
+        self.keys.clear()
+        self.sorted_keys = []
+        self.text = None
+        self.offsets = []
+        self.values = []
+
+    def __contains__(self, value):
+        return value in self.counts
+
+    def __len__(self):
+        return len(self.counts)
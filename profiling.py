@@ -0,0 +1,175 @@
+"""
+起動時と操作中の処理のプロファイル（cProfile）とメモリ割り当て（tracemalloc）の記録
+
+コマンドライン引数 --profile または環境変数 TODO_PROFILE=1 で有効にすると、
+起動（ウィンドウの作成とデータベースの準備から操作可能になるまで）を記録し、以降は Ctrl+Shift+P で
+任意の操作の間を記録できる。--profile-memory または TODO_PROFILE=memory の場合は
+メモリ割り当ても記録する。
+
+結果はデータベースと同じ場所（メモリ上のデータベースの場合はアプリケーションのフォルダ）の profiles フォルダに保存する:
+    <名前>-<日時>.pstats        cProfile の結果（python -m pstats、snakeviz、flameprof などで表示）
+    <名前>-<日時>.txt           累積時間の上位の関数の一覧
+    <名前>-<日時>.tracemalloc   tracemalloc のスナップショット（tracemalloc.Snapshot.load で読み込む）
+    <名前>-<日時>.memory.txt    割り当ての多い行の一覧
+"""
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+PROFILE_FOLDER_NAME = 'profiles'
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+# tracemalloc が記録する呼び出し履歴の深さ
+TRACEMALLOC_FRAMES = int(os.environ.get('TODO_PROFILE_FRAMES', '25'))
+
+# テキストの一覧に出力する件数
+SUMMARY_LIMIT = 40
+
+def parse_options(argv):
+    """
+    コマンドライン引数と環境変数 TODO_PROFILE からプロファイルの設定を取得
+
+    :param argv: コマンドライン引数のリスト（sys.argv）
+    :return: (プロファイルするか, メモリ割り当ても記録するか, プロファイルの引数を除いた引数のリスト)
+    """
+    mode = os.environ.get('TODO_PROFILE', '')
+    enabled = mode not in ('', '0')
+    memory = mode == 'memory'
+
+    remaining = []
+    for arg in argv:
+        if arg == '--profile':
+            enabled = True
+        elif arg == '--profile-memory':
+            enabled = memory = True
+        else:
+            remaining.append(arg)
+    return enabled, memory, remaining
+
+class ProfileSession:
+    """
+    1回分のプロファイル（開始から終了まで）
+
+    メインスレッドは start() から stop() までを記録する。別スレッドの処理は
+    profile_thread() の範囲を記録し、終了したものを結果にまとめる
+    """
+
+    def __init__(self, name, memory=False):
+        """
+        :param name: 出力ファイル名の先頭に付ける名前（startup など）
+        :param memory: メモリ割り当ても記録する場合はTrue
+        """
+        self.name = name
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.profiler = None
+        # 記録を終えたスレッドのプロファイル
+        self.thread_profilers = []
+        self.started_at = None
+        self.started_tracemalloc = False
+
+    @property
+    def running(self):
+        return self.profiler is not None
+
+    def start(self):
+        """メインスレッドの記録を開始"""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.started_tracemalloc = True
+        self.started_at = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    @contextlib.contextmanager
+    def profile_thread(self):
+        """別スレッドの処理を記録する（記録中でない場合は何もしない）"""
+        if not self.running:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # 同時に1つしか有効にできない実装の場合はこのスレッドを記録しない
+            print(f"スレッドのプロファイルを開始できませんでした: {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.thread_profilers.append(profiler)
+
+    def stop(self, output_folder):
+        """
+        記録を終了して結果をファイルに保存
+
+        :param output_folder: 保存先のフォルダ
+        :return: 保存したファイルのパスのリスト
+        """
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started_at
+        snapshot = tracemalloc.take_snapshot() if self.memory and tracemalloc.is_tracing() else None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+        os.makedirs(output_folder, exist_ok=True)
+        base_path = os.path.join(output_folder, f"{self.name}-{datetime.now().strftime(TIMESTAMP_FORMAT)}")
+        # 同じ秒に保存した結果を上書きしないようにする
+        suffix = 1
+        while os.path.exists(base_path + '.pstats'):
+            suffix += 1
+            base_path = base_path.rsplit('~', 1)[0] + f'~{suffix}'
+        with self.lock:
+            profilers = [self.profiler] + self.thread_profilers
+        self.profiler = None
+
+        stats = pstats.Stats(*profilers)
+        stats.dump_stats(base_path + '.pstats')
+        paths = [base_path + '.pstats']
+
+        summary = io.StringIO()
+        summary.write(f"{self.name}: {elapsed * 1000:.0f}ms（スレッド {len(profilers)}本）\n")
+        pstats.Stats(*profilers, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LIMIT)
+        with open(base_path + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        paths.append(base_path + '.txt')
+
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__)
+            ])
+            snapshot.dump(base_path + '.tracemalloc')
+            paths.append(base_path + '.tracemalloc')
+
+            top_stats = snapshot.statistics('lineno')
+            with open(base_path + '.memory.txt', 'w', encoding='utf-8') as f:
+                f.write(f"{self.name}: 割り当て中 {sum(stat.size for stat in top_stats) / 1024:.1f}KB\n")
+                for stat in top_stats[:SUMMARY_LIMIT]:
+                    f.write(f"{stat}\n")
+            paths.append(base_path + '.memory.txt')
+
+        return paths
+
+def output_folder_for(db):
+    """データベース（DatabaseConnection）に対応するプロファイルの保存先"""
+    return os.path.join(db.data_folder, PROFILE_FOLDER_NAME)
+
+def profile_thread(session):
+    """
+    別スレッドの処理を記録するコンテキストマネージャ
+
+    :param session: ProfileSession（None の場合は何もしない）
+    """
+    return session.profile_thread() if session is not None else contextlib.nullcontext()
@@ -0,0 +1,352 @@
+"""
+複数のプロジェクトのデータベースをまとめて読み取る
+
+チームごとのデータベースファイルを、メインのデータベースの接続に ATTACH して1つの接続で検索する。
+集計（DailyTaskStats）は UNION ALL でまとめた一時ビュー AllDailyTaskStats から読み、
+プロジェクトの絞り込みは project 列の条件で行う（ToDo 全体のビュー AllToDo も作成する）。
+期間（開始日〜期限）の検索と遅延タスク・本日のタスクの一覧は、ファイルごとの R*Tree（ToDoSpan）や
+部分インデックスを使うよう、選択中のプロジェクトのファイルごとのクエリを UNION ALL でつないで実行する。
+対象外のファイルは読まないため、各ファイルの件数が少ないほどそれぞれの検索は速い。
+
+追加するプロジェクトは環境変数 TODO_PROJECTS に、メインのデータベースと同じフォルダからの
+ファイル名（または絶対パス）を os.pathsep 区切りで指定する。ToDoの追加・変更はメインのデータベースに対して行う
+"""
+import os
+import sqlite3
+import threading
+
+from database_connection import DatabaseConnection
+from todo_repository import (TaskRecord, PRIORITY_ORDER, OPEN_STATUS_CONDITION, OPEN_TASK_PANEL_CONDITIONS,
+                             SPAN_OVERLAP_CONDITIONS, SPAN_STATUS_COLUMNS, ASSIGNEE_COUNT_CONDITIONS,
+                             count_statuses_by_day)
+import calendar_days
+
+PROJECTS_ENV = 'TODO_PROJECTS'
+
+# 1つの接続に ATTACH できるデータベースの数（SQLiteの既定の上限）
+MAX_ATTACHED = 10
+
+# ビューと TaskRecord で使うToDoのカラム（TaskRecord.__slots__ と同じ順序）
+TASK_COLUMN_NAMES = TaskRecord.__slots__
+
+def project_paths_from_env():
+    """環境変数 TODO_PROJECTS に指定された追加のプロジェクトのデータベースのリスト"""
+    return [path for path in os.environ.get(PROJECTS_ENV, '').split(os.pathsep) if path.strip()]
+
+def project_name(db_path):
+    """データベースファイルのパスからプロジェクト名（拡張子を除いたファイル名）を取得"""
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+def _quote(value):
+    """SQLの文字列リテラル（ビューの定義はパラメータを使えないため）"""
+    return "'" + value.replace("'", "''") + "'"
+
+class ProjectTaskRecord(TaskRecord):
+    """プロジェクト名を持つ ToDo1件分のレコード"""
+    __slots__ = ('project',)
+
+    def __init__(self, project, *values):
+        super().__init__(*values)
+        self.project = project
+
+    @property
+    def key(self):
+        """プロジェクトをまたいで一意なキー"""
+        return (self.project, self.id)
+
+    def __repr__(self):
+        return (f"ProjectTaskRecord(project={self.project!r}, id={self.id}, title={self.title!r}, "
+                f"status={self.status!r}, version={self.version})")
+
+def project_task_record_factory(cursor, row):
+    """(プロジェクト名, TASK_COLUMNS...) の順で取得した行を ProjectTaskRecord に変換する行ファクトリ"""
+    return ProjectTaskRecord(*row)
+
+class ProjectSet:
+    def __init__(self, main_db, project_paths):
+        """
+        複数のプロジェクトのデータベースをまとめて読み取るクラス
+
+        :param main_db: メインのデータベースの DatabaseConnection オブジェクト
+        :param project_paths: 追加するプロジェクトのデータベースファイルのパスのリスト
+            （相対パスはメインのデータベースと同じフォルダからのパス）
+        :raises ValueError: プロジェクトが多すぎる・名前が重複している場合
+        :raises FileNotFoundError: プロジェクトのデータベースファイルがない場合
+        """
+        if len(project_paths) > MAX_ATTACHED:
+            raise ValueError(f"プロジェクトは{MAX_ATTACHED}件まで追加できます")
+
+        # (スキーマ名, プロジェクト名, DatabaseConnection) のリスト（先頭がメイン）
+        self.projects = [('main', project_name(main_db.db_path), main_db)]
+        for number, path in enumerate(project_paths, start=1):
+            path = os.path.join(main_db.data_folder, path.strip())
+            # 指定の誤りで空のデータベースを作成しないよう、既存のファイルのみ開く
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"プロジェクトのデータベースがありません: {path}")
+            # 各ファイルのテーブル・索引・集計テーブルを作成・移行しておく
+            db = DatabaseConnection(path)
+            self.projects.append((f'project{number}', project_name(db.db_path), db))
+
+        names = [name for _, name, _ in self.projects]
+        if len(set(names)) != len(names):
+            raise ValueError(f"プロジェクト名が重複しています: {', '.join(names)}")
+        self.schemas = {name: schema for schema, name, _ in self.projects}
+
+        self.connection = sqlite3.connect(main_db.db_path, timeout=10, check_same_thread=False,
+                                          cached_statements=256, uri=True)
+        self.lock = threading.RLock()
+        for schema, _, db in self.projects[1:]:
+            self.connection.execute(f'ATTACH DATABASE ? AS {schema}', (db.db_path,))
+        self._create_views()
+
+        # 期間の検索には、すべてのファイルで R*Tree が使える場合のみ使う
+        self.span_condition = SPAN_OVERLAP_CONDITIONS[all(db.span_index_available for _, _, db in self.projects)]
+
+        # 表示するプロジェクト名（Noneの場合はすべて）
+        self.selected = None
+        # 追加のプロジェクトの data_version（外部からの変更の検知用）
+        self.last_data_versions = self.data_versions()
+
+    def _create_views(self):
+        """プロジェクトごとのテーブルを UNION ALL でまとめた一時ビューを作成"""
+        task_columns = ', '.join(TASK_COLUMN_NAMES)
+        views = {
+            'AllToDo': f'{task_columns} FROM {{schema}}.ToDo',
+            'AllDailyTaskStats': 'day, due_day, assignee, status, task_count FROM {schema}.DailyTaskStats'
+        }
+        for view, select in views.items():
+            union = '\nUNION ALL\n'.join(
+                f'SELECT {_quote(name)} AS project, {select.format(schema=schema)}'
+                for schema, name, _ in self.projects
+            )
+            self.connection.execute(f'CREATE TEMP VIEW {view} AS {union}')
+
+    def close(self):
+        """接続を閉じる"""
+        with self.lock:
+            self.connection.close()
+
+    # ---- プロジェクトの選択 ----
+
+    @property
+    def names(self):
+        """プロジェクト名のリスト（先頭がメイン）"""
+        return [name for _, name, _ in self.projects]
+
+    def select(self, names=None):
+        """
+        表示するプロジェクトを設定
+
+        :param names: プロジェクト名のリスト。Noneの場合はすべて
+        """
+        if names is not None:
+            unknown = set(names) - set(self.schemas)
+            if unknown:
+                raise ValueError(f"存在しないプロジェクトです: {', '.join(sorted(unknown))}")
+            names = [name for name in self.names if name in names]
+        self.selected = names
+
+    def only_main(self):
+        """メインのプロジェクトのみを表示しているか"""
+        return self.selected == [self.projects[0][1]]
+
+    def _selected_projects(self):
+        return [project for project in self.projects if self.selected is None or project[1] in self.selected]
+
+    def _project_condition(self, params):
+        """
+        選択中のプロジェクトに絞り込む条件
+
+        :param params: クエリのパラメータの辞書（プロジェクト名を追加する）
+        :return: 条件式
+        """
+        if self.selected is None:
+            return '1'
+        for number, name in enumerate(self.selected):
+            params[f'project{number}'] = name
+        return 'project IN (' + ', '.join(f':project{number}' for number in range(len(self.selected))) + ')'
+
+    # ---- 読み取り ----
+
+    def _fetch_records(self, query, params=()):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.row_factory = project_task_record_factory
+            return cursor.execute(query, params).fetchall()
+
+    def _fetch_all(self, query, params=()):
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def _per_project(self, build, columns):
+        """
+        選択中のプロジェクトのファイルごとのクエリを UNION ALL でつなぐ
+
+        :param build: (スキーマ名, プロジェクト名の文字列リテラル) を受け取り、1ファイル分の SELECT 文を返す関数
+        :param columns: 取得するカラム（プロジェクトが選択されていない場合の空の結果に使う）
+        :return: クエリ
+        """
+        selects = [build(schema, _quote(name)) for schema, name, _ in self._selected_projects()]
+        return '\nUNION ALL\n'.join(selects) or f'SELECT NULL AS project, {columns} FROM main.ToDo WHERE 0'
+
+    def _span_union(self, columns):
+        """
+        選択中のプロジェクトごとに期間の条件で検索するクエリを UNION ALL でつなぐ
+
+        :param columns: 取得するカラム
+        :return: クエリ
+        """
+        # 各ファイルの ToDoSpan を使うよう、テーブル名をスキーマ付きにする
+        return self._per_project(
+            lambda schema, name: (
+                f'SELECT {name} AS project, {columns} FROM {schema}.ToDo AS ToDo '
+                f'WHERE {self.span_condition.replace("ToDoSpan", f"{schema}.ToDoSpan")}'
+            ),
+            columns
+        )
+
+    def _span_params(self, first_date, last_date):
+        return {
+            'first': first_date,
+            'last': last_date,
+            'first_day': calendar_days.to_day_number(first_date),
+            'last_day': calendar_days.to_day_number(last_date)
+        }
+
+    def get(self, key):
+        """
+        プロジェクトとIDを指定してToDoを取得
+
+        :param key: (プロジェクト名, ToDoのID)
+        :return: ProjectTaskRecord。見つからない場合はNone
+        """
+        name, todo_id = key
+        schema = self.schemas.get(name)
+        if schema is None:
+            return None
+        records = self._fetch_records(
+            f'SELECT ? AS project, {", ".join(TASK_COLUMN_NAMES)} FROM {schema}.ToDo WHERE id = ?',
+            (name, todo_id)
+        )
+        return records[0] if records else None
+
+    def top_active_titles_for_date(self, date_str, limit):
+        """
+        選択中のプロジェクトで指定日が期間に含まれるToDoのうち、優先度・期限の順に上位のものを取得
+
+        :param date_str: 日付（'yyyy-MM-dd'）
+        :param limit: 取得する件数
+        :return: ((タイトル, ステータス, 優先度) のリスト, その日のToDoの総数)
+        """
+        params = self._span_params(date_str, date_str)
+        params['limit'] = limit
+        union = self._span_union('title, status, priority, due_date, start_date, id')
+        rows = self._fetch_all(
+            f'SELECT title, status, priority FROM ({union}) {PRIORITY_ORDER} LIMIT :limit', params
+        )
+        if len(rows) < limit:
+            return rows, len(rows)
+        return rows, self._fetch_all(f'SELECT COUNT(*) FROM ({self._span_union("id")})', params)[0][0]
+
+    def list_overlapping(self, first_date, last_date):
+        """
+        選択中のプロジェクトで期間が指定した範囲と重なるToDoを取得
+
+        :return: ProjectTaskRecord のリスト（開始日順）
+        """
+        params = self._span_params(first_date, last_date)
+        union = self._span_union(', '.join(f'ToDo.{column}' for column in TASK_COLUMN_NAMES))
+        return self._fetch_records(f'SELECT * FROM ({union}) ORDER BY start_date, project, id', params)
+
+    def top_open_tasks(self, panel, date_str, limit):
+        """
+        選択中のプロジェクトの遅延タスク・本日のタスクの一覧を優先度・期限の順に上位から取得
+
+        :param panel: 'delayed'（遅延タスク）または 'today'（本日のタスク）
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        :param limit: 取得する件数
+        :return: (ProjectTaskRecord のリスト, 条件に合うToDoの総数)
+        """
+        params = {'day': date_str, 'limit': limit}
+        condition = f'{OPEN_STATUS_CONDITION} AND {OPEN_TASK_PANEL_CONDITIONS[panel]}'
+        columns = ', '.join(TASK_COLUMN_NAMES)
+
+        # ファイルごとに上位の件数だけ読み、まとめて並べ直す
+        union = self._per_project(
+            lambda schema, name: (
+                f'SELECT * FROM (SELECT {name} AS project, {columns} FROM {schema}.ToDo '
+                f'WHERE {condition} {PRIORITY_ORDER} LIMIT :limit)'
+            ),
+            columns
+        )
+        records = self._fetch_records(f'SELECT * FROM ({union}) {PRIORITY_ORDER}, project LIMIT :limit', params)
+        if len(records) < limit:
+            return records, len(records)
+
+        # 総数はファイルごとに未完了のToDoのみの部分インデックスで数えて合計する
+        counts = self._per_project(
+            lambda schema, name: (
+                f'SELECT COUNT(*) AS task_count FROM {schema}.ToDo INDEXED BY idx_todo_open_priority WHERE {condition}'
+            ),
+            'id'
+        )
+        return records, self._fetch_all(f'SELECT SUM(task_count) FROM ({counts})', params)[0][0]
+
+    def day_status_counts(self, date_strs):
+        """
+        選択中のプロジェクトで、指定日ごとに期間（開始日〜期限）にその日が含まれるToDoのステータス別の件数を取得
+
+        :param date_strs: 対象の日付文字列（'yyyy-MM-dd'）の集合
+        :return: (日付, ステータス, 件数) のリスト
+        """
+        counts = {}
+        query = f'SELECT start_day, end_day, status FROM ({self._span_union(SPAN_STATUS_COLUMNS)})'
+        for first_date, last_date in calendar_days.date_runs(date_strs):
+            spans = self._fetch_all(query, self._span_params(first_date, last_date))
+            count_statuses_by_day(spans, first_date, last_date, counts)
+        return [(date_str, status, count) for (date_str, status), count in counts.items()]
+
+    def assignee_counts(self, category, start_date, end_date):
+        """
+        選択中のプロジェクトの作業者別のToDo件数を集計テーブルから取得
+
+        :param category: 'completed'・'uncompleted'・'delayed' のいずれか
+        :param start_date: 開始日（'yyyy-MM-dd'）
+        :param end_date: 終了日（'yyyy-MM-dd'）。遅延の判定にも使用する
+        :return: (作業者, 件数) のリスト（件数の多い順）
+        """
+        params = {'start': start_date, 'end': end_date}
+        if category == 'delayed':
+            params['today'] = end_date
+        query = f'''
+        SELECT assignee, SUM(task_count) as task_count
+        FROM AllDailyTaskStats
+        WHERE {self._project_condition(params)} AND {ASSIGNEE_COUNT_CONDITIONS[category]}
+        AND day BETWEEN :start AND :end
+        GROUP BY assignee
+        ORDER BY task_count DESC
+        '''
+        return self._fetch_all(query, params)
+
+    # ---- 変更の検知 ----
+
+    def data_versions(self):
+        """追加のプロジェクトごとの data_version"""
+        with self.lock:
+            return [
+                self.connection.execute(f'PRAGMA {schema}.data_version').fetchone()[0]
+                for schema, _, _ in self.projects[1:]
+            ]
+
+    def poll_changed(self):
+        """
+        前回確認以降に追加のプロジェクトが他の接続から変更されたか
+
+        メインのデータベースの変更は ChangeWatcher で検知する
+
+        :return: 変更があった場合はTrue
+        """
+        versions = self.data_versions()
+        changed = versions != self.last_data_versions
+        self.last_data_versions = versions
+        return changed
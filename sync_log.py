@@ -0,0 +1,302 @@
+"""
+拠点間のToDoの差分同期
+
+ToDoの追加・更新・削除はトリガーで ToDoSyncLog に追記される（database_connection.create_sync_log_table）。
+書き出しは指定した番号より後の変更を ToDo ごとに最新の1件にまとめて gzip 圧縮した JSON Lines で保存し、
+取り込みは各変更の日時と拠点を ToDo ごとの最新の記録と比べて新しい場合のみ反映する。
+同じファイルを何度取り込んでも結果は変わらず、データベースの大きさではなく変更の件数に比例した時間で同期できる。
+
+拠点ごとのデータベースは、同期を始める前に1つのファイルを移行（uid の付与）してから複製し、
+複製したファイルで init-site を実行して別の拠点IDを付けておくこと
+（別々に移行すると同じToDoに別の uid が付き、重複して取り込まれる。拠点IDが同じままでは互いのファイルを
+自分の書き出したファイルとみなして取り込めない）。
+
+使い方:
+    python sync_log.py status                              拠点IDと変更履歴の番号・取り込み済みの番号を表示
+    python sync_log.py init-site                           複製したデータベースに新しい拠点IDを付ける
+    python sync_log.py export changes.todosync.gz --since 1200 --for 3f2a9c0d1e4b5a67
+    python sync_log.py import changes.todosync.gz
+    python sync_log.py compact                             ToDoごとに最新の変更以外を削除
+"""
+import argparse
+import gzip
+import json
+import secrets
+import sqlite3
+import time
+
+FORMAT_VERSION = 1
+
+# 取り込み済みの番号を SyncMeta に記録するキーの接頭辞（拠点IDごと）
+RECEIVED_KEY_PREFIX = 'received:'
+
+# 書き出す変更（ToDoごとに指定した番号より後の最新の1件）。
+# 指定した番号より後の範囲だけを読み、それぞれ後の変更がないかを索引で確かめる
+SELECT_CHANGES_SINCE = '''
+SELECT seq, uid, op, stamp, site, payload
+FROM ToDoSyncLog AS change
+WHERE seq > ?
+  AND NOT EXISTS (SELECT 1 FROM ToDoSyncLog AS later WHERE later.uid = change.uid AND later.seq > change.seq)
+ORDER BY seq
+'''
+
+# 同期ファイルの圧縮レベル（書き出しの時間とサイズの兼ね合い）
+COMPRESS_LEVEL = 6
+
+SELECT_LATEST_CHANGE = 'SELECT stamp, site, op, payload FROM ToDoSyncLog WHERE uid = ? ORDER BY seq DESC LIMIT 1'
+
+class SyncError(Exception):
+    """同期ファイルの書き出し・取り込みに失敗したことを表す例外"""
+
+class SyncResult:
+    """書き出し・取り込みの結果"""
+    __slots__ = ('path', 'site', 'last_seq', 'changes', 'applied', 'skipped', 'seconds')
+
+    def __init__(self, path, site, last_seq, changes, applied=0, skipped=0, seconds=0.0):
+        self.path = path
+        self.site = site
+        self.last_seq = last_seq
+        self.changes = changes
+        self.applied = applied
+        self.skipped = skipped
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (f"SyncResult(path={self.path!r}, site={self.site!r}, last_seq={self.last_seq}, "
+                f"changes={self.changes}, applied={self.applied}, skipped={self.skipped})")
+
+def site_id(db):
+    """このデータベースの拠点ID"""
+    return db.execute_query("SELECT value FROM SyncMeta WHERE key = 'site'")[0][0]
+
+def latest_seq(db):
+    """同期の変更履歴の最新の番号（履歴がない場合は0）"""
+    return db.execute_query('SELECT MAX(seq) FROM ToDoSyncLog')[0][0] or 0
+
+def received_seqs(db):
+    """拠点IDと、その拠点から取り込み済みの変更履歴の番号の辞書"""
+    rows = db.execute_query(
+        'SELECT key, value FROM SyncMeta WHERE key LIKE ?', (RECEIVED_KEY_PREFIX + '%',)
+    )
+    return {key[len(RECEIVED_KEY_PREFIX):]: int(value) for key, value in rows}
+
+def reset_site(db):
+    """
+    複製したデータベースに新しい拠点IDを付ける
+
+    複製元の拠点から取り込み済みの番号は複製した時点の変更履歴の最新の番号とし（変更履歴は複製元と同じため）、
+    他の拠点から取り込み済みの番号は消去する（次回の取り込みで反映済みの変更は読み飛ばされる）
+
+    :param db: DatabaseConnectionオブジェクト
+    :return: (複製元の拠点ID, 新しい拠点ID)
+    """
+    new_site = secrets.token_hex(8)
+    connection = db.get_connection()
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        old_site = connection.execute("SELECT value FROM SyncMeta WHERE key = 'site'").fetchone()[0]
+        last_seq = connection.execute('SELECT MAX(seq) FROM ToDoSyncLog').fetchone()[0] or 0
+        connection.execute("UPDATE SyncMeta SET value = ? WHERE key = 'site'", (new_site,))
+        connection.execute('DELETE FROM SyncMeta WHERE key LIKE ?', (RECEIVED_KEY_PREFIX + '%',))
+        connection.execute(
+            'INSERT INTO SyncMeta (key, value) VALUES (?, ?)', (RECEIVED_KEY_PREFIX + old_site, last_seq)
+        )
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return old_site, new_site
+
+def export_changes(db, path, since_seq=0, exclude_site=None):
+    """
+    指定した番号より後の変更をファイルに書き出す
+
+    :param db: DatabaseConnectionオブジェクト
+    :param path: 書き出すファイルのパス
+    :param since_seq: 相手が取り込み済みの番号（この番号より後の変更を書き出す）
+    :param exclude_site: 相手の拠点ID（相手の拠点で記録された変更は相手が持っているため書き出さない）
+    :return: SyncResult
+    """
+    start = time.perf_counter()
+    connection = db.get_connection()
+    try:
+        # 読み取りを1つのトランザクションにして、書き出し中の変更が混ざらないようにする
+        connection.execute('BEGIN')
+        site = connection.execute("SELECT value FROM SyncMeta WHERE key = 'site'").fetchone()[0]
+        rows = [row for row in connection.execute(SELECT_CHANGES_SINCE, (since_seq,)) if row[4] != exclude_site]
+        last_seq = connection.execute('SELECT MAX(seq) FROM ToDoSyncLog').fetchone()[0] or 0
+    finally:
+        connection.close()
+
+    header = {'format': FORMAT_VERSION, 'site': site, 'since': since_seq, 'last_seq': last_seq, 'changes': len(rows)}
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for _, uid, op, stamp, change_site, payload in rows:
+            # 値は記録済みの JSON をそのまま埋め込む
+            f.write(f"[{json.dumps(uid)}, {json.dumps(op)}, {json.dumps(stamp)}, {json.dumps(change_site)}, "
+                    f"{payload or 'null'}]\n")
+    return SyncResult(path, site, last_seq, len(rows), seconds=time.perf_counter() - start)
+
+def read_changes(path):
+    """
+    同期ファイルを読み込む
+
+    :param path: ファイルのパス
+    :return: (ヘッダーの辞書, (uid, 操作, 日時, 拠点ID, 値の辞書) のリスト)
+    :raises SyncError: ファイルの形式が正しくない場合
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != FORMAT_VERSION:
+                raise SyncError(f"対応していない形式です: {path}")
+            changes = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        raise SyncError(f"同期ファイルを読み込めません: {path}: {e}") from e
+    if len(changes) != header.get('changes'):
+        raise SyncError(f"同期ファイルが途中で切れています: {path}")
+    return header, changes
+
+def import_changes(db, path):
+    """
+    同期ファイルの変更を取り込む
+
+    ToDoごとの最新の記録より新しい変更（日時・拠点IDの順で比較）のみを1つのトランザクションで反映する。
+    反映した変更はトリガーにより元の日時・拠点IDのまま ToDoSyncLog に記録され、さらに別の拠点へ書き出せる
+
+    :param db: DatabaseConnectionオブジェクト
+    :param path: 同期ファイルのパス
+    :return: SyncResult
+    :raises SyncError: ファイルの形式が正しくない・自分の拠点の変更の場合
+    """
+    start = time.perf_counter()
+    header, changes = read_changes(path)
+    columns = db.SYNC_PAYLOAD_COLUMNS
+    update_query = (f"UPDATE ToDo SET {', '.join(f'{column} = ?' for column in columns)}, version = version + 1 "
+                    f"WHERE uid = ?")
+    insert_query = (f"INSERT INTO ToDo (uid, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' for _ in columns)})")
+
+    connection = db.get_connection()
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        if header['site'] == connection.execute("SELECT value FROM SyncMeta WHERE key = 'site'").fetchone()[0]:
+            raise SyncError(f"このデータベースから書き出したファイルです: {path}"
+                            f"（複製したデータベースの場合は init-site で別の拠点IDを付けてください）")
+
+        applied = skipped = 0
+        apply_origin = None
+        for uid, op, stamp, site, values in changes:
+            latest = connection.execute(SELECT_LATEST_CHANGE, (uid,)).fetchone()
+            if latest is not None:
+                local_stamp, local_site, local_op, local_payload = latest
+                if (stamp, site) < (local_stamp, local_site) or (
+                        (stamp, site) == (local_stamp, local_site) and op == local_op
+                        and (op == 'D' or json.loads(local_payload) == values)):
+                    skipped += 1
+                    continue
+
+            # トリガーが元の変更の日時・拠点IDで記録するよう設定してから反映する
+            if apply_origin != (stamp, site):
+                apply_origin = (stamp, site)
+                connection.execute(
+                    "INSERT OR REPLACE INTO SyncMeta (key, value) VALUES ('apply_stamp', ?), ('apply_site', ?)",
+                    apply_origin
+                )
+            if op == 'D':
+                if connection.execute('DELETE FROM ToDo WHERE uid = ?', (uid,)).rowcount == 0:
+                    # 未取り込みのToDoの削除も、古い変更で復活しないよう記録しておく
+                    connection.execute(
+                        "INSERT INTO ToDoSyncLog (uid, op, stamp, site, payload) VALUES (?, 'D', ?, ?, NULL)",
+                        (uid, stamp, site)
+                    )
+            else:
+                params = [values.get(column) for column in columns]
+                if connection.execute(update_query, (*params, uid)).rowcount == 0:
+                    connection.execute(insert_query, (uid, *params))
+            applied += 1
+
+        connection.execute("DELETE FROM SyncMeta WHERE key IN ('apply_stamp', 'apply_site')")
+        received_key = RECEIVED_KEY_PREFIX + header['site']
+        connection.execute(
+            '''
+            INSERT INTO SyncMeta (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), excluded.value)
+            ''',
+            (received_key, header['last_seq'])
+        )
+        connection.commit()
+    except (sqlite3.Error, SyncError):
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    return SyncResult(path, header['site'], header['last_seq'], len(changes), applied, skipped,
+                      time.perf_counter() - start)
+
+def compact_sync_log(db):
+    """
+    ToDoごとに最新の変更（削除の記録を含む）以外を削除する
+
+    書き出す内容と取り込み時の比較には最新の変更しか使わないため、同期の結果は変わらない
+
+    :return: 削除した件数
+    """
+    return db.execute_query(
+        'DELETE FROM ToDoSyncLog WHERE seq NOT IN (SELECT MAX(seq) FROM ToDoSyncLog GROUP BY uid)'
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='ToDoカレンダーの拠点間の差分同期')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='拠点IDと変更履歴の番号を表示')
+    subparsers.add_parser('init-site', help='複製したデータベースに新しい拠点IDを付ける')
+    export_parser = subparsers.add_parser('export', help='変更をファイルに書き出す')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--since', type=int, default=0, help='相手が取り込み済みの番号')
+    export_parser.add_argument('--for', dest='site', help='相手の拠点ID（相手で記録された変更を除く）')
+    import_parser = subparsers.add_parser('import', help='ファイルの変更を取り込む')
+    import_parser.add_argument('paths', nargs='+')
+    subparsers.add_parser('compact', help='ToDoごとに最新の変更以外を削除')
+    args = parser.parse_args()
+
+    from database_connection import DatabaseConnection
+    db = DatabaseConnection()
+
+    if args.command == 'status':
+        print(f"拠点ID: {site_id(db)} / 変更履歴の最新の番号: {latest_seq(db)}")
+        for site, seq in sorted(received_seqs(db).items()):
+            print(f"  {site} から {seq} 番まで取り込み済み"
+                  f"（相手側で --since {seq} --for {site_id(db)} を指定して書き出す）")
+        return
+
+    if args.command == 'init-site':
+        old_site, new_site = reset_site(db)
+        print(f"拠点IDを {old_site} から {new_site} に変更しました。"
+              f"（{old_site} の変更は複製した時点まで取り込み済みとしました）")
+        return
+
+    if args.command == 'compact':
+        print(f"古い変更履歴 {compact_sync_log(db)} 件を削除しました。")
+        return
+
+    try:
+        if args.command == 'export':
+            result = export_changes(db, args.path, args.since, args.site)
+            print(f"{result.changes}件の変更を書き出しました: {result.path}（{result.last_seq} 番まで / "
+                  f"{result.seconds * 1000:.0f}ms）")
+        else:
+            for path in args.paths:
+                result = import_changes(db, path)
+                print(f"{path}: {result.site} の {result.last_seq} 番までの変更 {result.changes}件のうち "
+                      f"{result.applied}件を反映しました（{result.skipped}件は反映済み・古い変更 / "
+                      f"{result.seconds * 1000:.0f}ms）")
+    except SyncError as e:
+        print(e)
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+タスクの推移分析（作成・完了・未完了件数、作業者別スループット、遅延件数の推移）と
+作業者別の作業量の予測
+
+1回のクエリでToDo全件を列ごとのNumPy配列として取得し、
+系列ごとにSQLを発行せずベクトル演算で集計する
+"""
+import numpy as np
+
+from calendar_days import to_day_number, from_day_number, year_holiday_bits
+from todo_repository import END_DAY_EXPRESSION
+
+# 1970-01-01 の julianday() を整数化した値
+UNIX_EPOCH_JULIAN_DAY = 2440587
+
+# 完了していないタスクの完了日として使う番兵値
+NOT_COMPLETED = np.iinfo(np.int64).max
+
+STATUS_CODES = {'未着手': 0, '進行中': 1, '完了済': 2}
+
+# 作業量の予測期間（日数）と、1稼働日に対応できるタスク数の目安（超えた日を過負荷とする）
+FORECAST_DAYS = 28
+DEFAULT_DAILY_CAPACITY = 2.0
+
+def day_numbers_to_datetime64(days):
+    """
+    日番号の配列を datetime64[D] の配列に変換（グラフ描画用）
+
+    :param days: 日番号の配列
+    :return: datetime64[D] の配列
+    """
+    return (np.asarray(days) - UNIX_EPOCH_JULIAN_DAY).astype('datetime64[D]')
+
+class TaskExtract:
+    """
+    ToDo全件の列指向の抽出結果
+
+    各配列はタスクごとに1要素を持つ
+    """
+
+    def __init__(self, created_day, start_day, due_day, completed_day, status, assignee, assignee_names):
+        self.created_day = created_day
+        self.start_day = start_day
+        self.due_day = due_day
+        self.completed_day = completed_day
+        self.status = status
+        self.assignee = assignee
+        self.assignee_names = assignee_names
+
+    def __len__(self):
+        return len(self.status)
+
+def load_task_extract(db):
+    """
+    ToDo全件を1回のクエリで取得し、列ごとのNumPy配列に変換する
+
+    作成日時・完了日時が記録されていない既存データは、開始日・更新日時・期限で補う
+
+    :param db: DatabaseConnectionオブジェクト
+    :return: TaskExtract
+    """
+    query = '''
+    SELECT
+        CAST(julianday(substr(COALESCE(created_at, start_date), 1, 10)) AS INTEGER),
+        CAST(julianday(substr(start_date, 1, 10)) AS INTEGER),
+        CAST(julianday(substr(COALESCE(due_date, start_date), 1, 10)) AS INTEGER),
+        CASE WHEN status = '完了済'
+             THEN CAST(julianday(substr(COALESCE(completed_at, updated_at, due_date, start_date), 1, 10)) AS INTEGER)
+        END,
+        CASE status WHEN '未着手' THEN 0 WHEN '進行中' THEN 1 ELSE 2 END,
+        COALESCE(assignee, '')
+    FROM ToDo
+    WHERE start_date IS NOT NULL
+    '''
+    rows = db.execute_query(query)
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return TaskExtract(empty, empty, empty, empty, empty.astype(np.int8), empty.astype(np.int32), [])
+
+    created, start, due, completed, status, assignee = zip(*rows)
+
+    def to_days(values, missing):
+        array = np.array(values, dtype=np.float64)
+        return np.nan_to_num(array, nan=missing).astype(np.int64)
+
+    start_day = to_days(start, 0)
+    created_day = to_days(created, 0)
+    created_day = np.where(created_day > 0, created_day, start_day)
+    due_day = to_days(due, 0)
+    due_day = np.where(due_day > 0, due_day, start_day)
+    completed_day = np.array([NOT_COMPLETED if day is None else day for day in completed], dtype=np.int64)
+
+    # 作成日より前に完了していることはないため補正する
+    completed_day = np.maximum(completed_day, created_day)
+
+    assignee_names, assignee_codes = np.unique(np.array(assignee, dtype=object), return_inverse=True)
+
+    return TaskExtract(
+        created_day=created_day,
+        start_day=start_day,
+        due_day=due_day,
+        completed_day=completed_day,
+        status=np.array(status, dtype=np.int8),
+        assignee=assignee_codes.astype(np.int32),
+        assignee_names=[str(name) for name in assignee_names]
+    )
+
+def _interval_counts(begin, end, first_day, length):
+    """
+    [begin, end) の区間が各日にいくつ重なっているかを差分配列で求める
+
+    :param begin: 区間の開始日番号の配列
+    :param end: 区間の終了日番号（この日を含まない）の配列
+    :param first_day: 集計期間の初日の日番号
+    :param length: 集計期間の日数
+    :return: 各日の重なり件数の配列
+    """
+    begin_index = np.clip(begin - first_day, 0, length)
+    end_index = np.clip(end - first_day, 0, length)
+    valid = begin_index < end_index
+    diff = (np.bincount(begin_index[valid], minlength=length + 1)
+            - np.bincount(end_index[valid], minlength=length + 1))
+    return np.cumsum(diff)[:length]
+
+def compute_time_series(extract, first_day, last_day):
+    """
+    指定期間の日別推移と作業者別スループットを集計する
+
+    :param extract: TaskExtract
+    :param first_day: 集計期間の初日の日番号
+    :param last_day: 集計期間の最終日の日番号（この日を含む）
+    :return: 集計結果の辞書
+        days: 日番号の配列
+        created: 日別の作成件数
+        completed: 日別の完了件数
+        open: 日別の終了時点の未完了件数
+        overdue: 日別の終了時点の遅延件数（期限を過ぎて未完了）
+        throughput: 作業者ごとの期間内の完了件数
+        assignee_names: 作業者名のリスト
+    """
+    length = max(last_day - first_day + 1, 0)
+    days = np.arange(first_day, first_day + length, dtype=np.int64)
+
+    def daily_counts(day_array):
+        in_range = (day_array >= first_day) & (day_array < first_day + length)
+        return np.bincount(day_array[in_range] - first_day, minlength=length)[:length]
+
+    created = daily_counts(extract.created_day)
+    completed = daily_counts(extract.completed_day)
+
+    # 各日の終了時点で作成済みかつ未完了のタスク
+    open_counts = _interval_counts(extract.created_day, extract.completed_day, first_day, length)
+
+    # 期限の翌日から完了日の前日まで遅延として数える
+    overdue_begin = np.maximum(extract.due_day + 1, extract.created_day)
+    overdue = _interval_counts(overdue_begin, extract.completed_day, first_day, length)
+
+    completed_in_range = (extract.completed_day >= first_day) & (extract.completed_day < first_day + length)
+    throughput = np.bincount(
+        extract.assignee[completed_in_range],
+        minlength=len(extract.assignee_names)
+    )[:len(extract.assignee_names)]
+
+    return {
+        'days': days,
+        'created': created,
+        'completed': completed,
+        'open': open_counts,
+        'overdue': overdue,
+        'throughput': throughput,
+        'assignee_names': extract.assignee_names
+    }
+
+def holidays_between(first_day, last_day):
+    """
+    期間内の祝日を datetime64[D] の配列で取得（np.busday_count などの holidays 引数用）
+
+    :param first_day: 期間の初日の日番号
+    :param last_day: 期間の最終日の日番号（この日を含む）
+    :return: datetime64[D] の配列
+    """
+    holidays = []
+    for year in range(from_day_number(first_day).year, from_day_number(last_day).year + 1):
+        # カレンダーの描画と同じ年ごとのビット列（キャッシュ済み）から祝日を取り出す
+        bits = year_holiday_bits(year)
+        new_year = np.datetime64(f'{year:04d}-01-01')
+        holidays.extend(new_year + offset for offset in range(bits.bit_length()) if bits >> offset & 1)
+    return np.array(holidays, dtype='datetime64[D]')
+
+class WorkloadForecast:
+    """
+    作業者ごとの今後の作業量の予測
+
+    未完了タスクを、開始日（今日より前の場合は今日）から期限までの稼働日（土日・祝日を除く）に
+    均等に割り振り、作業者×日の負荷を求める。期限を過ぎたタスクは今日以降の最初の稼働日に割り振る。
+    全タスクの割り振りは配列でまとめて計算し、タスクの変更時は変更されたタスクの分だけ差し引き・加算する
+    """
+
+    def __init__(self, first_day, days=FORECAST_DAYS, capacity=DEFAULT_DAILY_CAPACITY):
+        """
+        :param first_day: 予測期間の初日（通常は今日）の日番号
+        :param days: 予測期間の日数
+        :param capacity: 1稼働日に対応できるタスク数の目安
+        """
+        self.first_day = first_day
+        self.days = days
+        self.capacity = capacity
+
+        # 割り振りは今日以降のため、祝日は今日から予測期間の1年後まで持つ
+        # （期限がそれより先のタスクは、その先の祝日を稼働日として数える）
+        self.holidays = holidays_between(first_day, first_day + days + 366)
+        self.workdays = np.is_busday(day_numbers_to_datetime64(np.arange(first_day, first_day + days)),
+                                     holidays=self.holidays)
+
+        self.assignee_names = []
+        self.assignee_rows = {}
+        # 作業者×日の負荷と、作業者ごとの未完了・期限切れの件数
+        self.load = np.zeros((0, days))
+        self.open_counts = np.zeros(0, dtype=np.int64)
+        self.overdue_counts = np.zeros(0, dtype=np.int64)
+        # ToDoのIDと (作業者の行, 割り振りの初日, 最終日の翌日, 1日あたりの量, 期限切れか) の対応
+        self.contributions = {}
+
+    def _row(self, assignee):
+        """作業者の行番号（初めての作業者の場合は行を追加）"""
+        row = self.assignee_rows.get(assignee)
+        if row is None:
+            row = len(self.assignee_names)
+            self.assignee_rows[assignee] = row
+            self.assignee_names.append(assignee)
+            self.load = np.vstack([self.load, np.zeros((1, self.days))])
+            self.open_counts = np.append(self.open_counts, 0)
+            self.overdue_counts = np.append(self.overdue_counts, 0)
+        return row
+
+    def _spread(self, start_day, end_day):
+        """
+        タスクを割り振る稼働日の範囲と1日あたりの量を配列でまとめて求める
+
+        :param start_day: 開始日の日番号の配列
+        :param end_day: 期間の最終日の日番号の配列
+        :return: (予測期間内の初日の位置, 最終日の翌日の位置, 1日あたりの量, 期限切れか) の配列
+        """
+        overdue = end_day < self.first_day
+        begin = np.maximum(start_day, self.first_day)
+        end = np.maximum(end_day, begin)
+
+        begin_dates = day_numbers_to_datetime64(begin)
+        end_dates = day_numbers_to_datetime64(end)
+        working_days = np.busday_count(begin_dates, end_dates + 1, holidays=self.holidays)
+
+        # 期間内に稼働日がない（期限切れを含む）タスクは、次の稼働日にまとめて割り振る
+        no_workday = working_days == 0
+        next_workday = np.busday_offset(begin_dates, 0, roll='forward', holidays=self.holidays)
+        begin_dates = np.where(no_workday, next_workday, begin_dates)
+        end_dates = np.where(no_workday, next_workday, end_dates)
+        working_days = np.where(no_workday, 1, working_days)
+
+        epoch_offset = UNIX_EPOCH_JULIAN_DAY - self.first_day
+        begin_index = np.clip(begin_dates.astype(np.int64) + epoch_offset, 0, self.days)
+        end_index = np.clip(end_dates.astype(np.int64) + epoch_offset + 1, 0, self.days)
+        return begin_index, end_index, 1.0 / working_days, overdue
+
+    def load_tasks(self, todo_ids, assignees, start_days, end_days):
+        """
+        未完了タスクを一括で割り振り、予測を作り直す
+
+        :param todo_ids: ToDoのIDのリスト
+        :param assignees: 作業者のリスト
+        :param start_days: 開始日の日番号の配列
+        :param end_days: 期間の最終日の日番号の配列
+        """
+        self.assignee_names = []
+        self.assignee_rows = {}
+        self.load = np.zeros((0, self.days))
+        self.open_counts = np.zeros(0, dtype=np.int64)
+        self.overdue_counts = np.zeros(0, dtype=np.int64)
+        self.contributions = {}
+        if not len(todo_ids):
+            return
+
+        assignee_names, rows = np.unique(np.array(assignees, dtype=object), return_inverse=True)
+        self.assignee_names = [str(name) for name in assignee_names]
+        self.assignee_rows = {name: row for row, name in enumerate(self.assignee_names)}
+        count = len(self.assignee_names)
+
+        begin, end, amount, overdue = self._spread(np.asarray(start_days, dtype=np.int64),
+                                                   np.asarray(end_days, dtype=np.int64))
+
+        # 作業者×日の差分配列に加算し、累積和で日ごとの量にする（予測期間外の分は含まれない）
+        diff = np.zeros((count, self.days + 1))
+        inside = begin < end
+        np.add.at(diff, (rows[inside], begin[inside]), amount[inside])
+        np.add.at(diff, (rows[inside], end[inside]), -amount[inside])
+        self.load = np.cumsum(diff, axis=1)[:, :self.days] * self.workdays
+
+        self.open_counts = np.bincount(rows, minlength=count)
+        self.overdue_counts = np.bincount(rows[overdue], minlength=count)
+        self.contributions = {
+            todo_id: contribution
+            for todo_id, contribution in zip(todo_ids, zip(rows.tolist(), begin.tolist(), end.tolist(),
+                                                           amount.tolist(), overdue.tolist()))
+        }
+
+    def _remove(self, todo_id):
+        contribution = self.contributions.pop(todo_id, None)
+        if contribution is None:
+            return
+        row, begin, end, amount, overdue = contribution
+        self.load[row, begin:end] -= amount * self.workdays[begin:end]
+        self.open_counts[row] -= 1
+        self.overdue_counts[row] -= overdue
+
+    def _add(self, todo_id, assignee, start_day, end_day):
+        row = self._row(assignee)
+        begin, end, amount, overdue = (
+            values[0] for values in self._spread(np.array([start_day]), np.array([end_day]))
+        )
+        begin, end, amount, overdue = int(begin), int(end), float(amount), bool(overdue)
+        self.load[row, begin:end] += amount * self.workdays[begin:end]
+        self.open_counts[row] += 1
+        self.overdue_counts[row] += overdue
+        self.contributions[todo_id] = (row, begin, end, amount, overdue)
+
+    def apply_changes(self, changed_todos, deleted_ids=()):
+        """
+        変更されたタスクの分だけ予測を更新
+
+        :param changed_todos: 変更された TaskRecord のリスト
+        :param deleted_ids: 削除されたToDoのIDの集合
+        """
+        for todo_id in deleted_ids:
+            self._remove(todo_id)
+        for todo in changed_todos:
+            self._remove(todo.id)
+            if todo.status == '完了済' or not todo.start_day:
+                continue
+            try:
+                start_day = to_day_number(todo.start_day)
+                end_day = to_day_number(todo.end_day)
+            except ValueError:
+                continue
+            self._add(todo.id, todo.assignee or '', start_day, end_day)
+
+        # 誤差の蓄積で負にならないようにする
+        np.maximum(self.load, 0, out=self.load)
+
+    def overloaded(self):
+        """作業者×日の過負荷（稼働日に目安を超える）の判定"""
+        return self.load > self.capacity + 1e-9
+
+    def summary(self):
+        """
+        作業者ごとの予測の集計
+
+        :return: 辞書
+            assignee_names: 作業者名のリスト
+            open: 未完了の件数
+            overdue: 期限切れの件数
+            total: 予測期間内の作業量の合計
+            peak: 1日の最大の作業量
+            overloaded_days: 過負荷の日数
+        """
+        return {
+            'assignee_names': self.assignee_names,
+            'open': self.open_counts,
+            'overdue': self.overdue_counts,
+            'total': self.load.sum(axis=1),
+            'peak': self.load.max(axis=1) if self.days else np.zeros(len(self.assignee_names)),
+            'overloaded_days': self.overloaded().sum(axis=1)
+        }
+
+def load_workload_forecast(db, first_day, days=FORECAST_DAYS, capacity=DEFAULT_DAILY_CAPACITY):
+    """
+    未完了タスクを1回のクエリで取得し、作業量の予測を作成する
+
+    :param db: DatabaseConnectionオブジェクト
+    :param first_day: 予測期間の初日の日番号
+    :param days: 予測期間の日数
+    :param capacity: 1稼働日に対応できるタスク数の目安
+    :return: WorkloadForecast
+    """
+    query = f'''
+    SELECT
+        id,
+        COALESCE(assignee, ''),
+        CAST(julianday(substr(start_date, 1, 10)) AS INTEGER),
+        CAST(julianday({END_DAY_EXPRESSION}) AS INTEGER)
+    FROM ToDo
+    WHERE (status IS NULL OR status != '完了済')
+      AND julianday(substr(start_date, 1, 10)) IS NOT NULL
+    '''
+    rows = db.execute_query(query)
+
+    forecast = WorkloadForecast(first_day, days, capacity)
+    if rows:
+        todo_ids, assignees, start_days, end_days = zip(*rows)
+        forecast.load_tasks(list(todo_ids), list(assignees), np.array(start_days, dtype=np.int64),
+                            np.array(end_days, dtype=np.int64))
+    return forecast
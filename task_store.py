@@ -0,0 +1,378 @@
+"""
+メモリ上にToDoを保持するタスクストア
+
+未完了のToDoと直近の履歴を読み込み、ステータスと期間（開始日〜期限）の索引から
+描画のたびに発生する読み取りをSQLiteに問い合わせずに返す。
+書き込みは TodoRepository を通してSQLiteに反映したうえでストアにも反映し、
+外部プロセスによる変更は ChangeWatcher の変更履歴で追従する
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from todo_repository import TaskRecord, LAST_DATE, count_statuses_by_day
+from interval_index import IntervalIndex
+import calendar_days
+
+# 読み込む完了済みToDoの期間（日数）
+DEFAULT_HISTORY_DAYS = int(os.environ.get('TODO_TASK_STORE_HISTORY_DAYS', '90'))
+
+# ストアに保持するToDoの上限件数
+DEFAULT_MAX_TASKS = int(os.environ.get('TODO_TASK_STORE_MAX_TASKS', '100000'))
+
+# 重複の多い文字列は intern して同じオブジェクトを共有する
+INTERNED_FIELDS = ('status', 'registrant', 'assignee', 'due_date', 'start_date')
+
+OPEN_STATUSES = ('未着手', '進行中')
+
+def is_enabled():
+    """環境変数 TODO_TASK_STORE でタスクストアが有効化されているか"""
+    return os.environ.get('TODO_TASK_STORE', '') not in ('', '0')
+
+def _priority_order(record):
+    """SQLiteの ORDER BY priority, due_date, start_date, id と同じ並び（NULLが先頭）にするキー"""
+    return (
+        record.priority is not None, record.priority or 0,
+        record.due_date is not None, record.due_date or '',
+        record.start_date is not None, record.start_date or '',
+        record.id
+    )
+
+def _next_day(date_str):
+    """翌日の日付文字列"""
+    return (datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+class TaskStore:
+    def __init__(self, repository, history_days=DEFAULT_HISTORY_DAYS, max_tasks=DEFAULT_MAX_TASKS):
+        """
+        メモリ上のタスクストア
+
+        :param repository: TodoRepositoryオブジェクト（読み込みと書き込みの反映先）
+        :param history_days: 読み込む完了済みToDoの期間（日数）
+        :param max_tasks: 保持するToDoの上限件数
+        """
+        self.repository = repository
+        self.history_days = history_days
+        self.max_tasks = max_tasks
+        self.lock = threading.RLock()
+
+        self.records = {}
+        self.indexes = {
+            'status': {}
+        }
+        # 期間（開始日〜期限の日番号）の索引
+        self.spans = IntervalIndex()
+        # 期間の最終日がこの日付以降のToDoは完了済みも含めてすべて保持している
+        self.covered_from = LAST_DATE
+
+    # ---- 読み込み・索引 ----
+
+    def load(self):
+        """
+        未完了のToDoと直近の完了済みToDoを読み込む
+
+        :return: 読み込めた場合はTrue。未完了のToDoだけで上限を超える場合はFalse
+        """
+        with self.lock:
+            open_records = self.repository.list_open()
+            if len(open_records) > self.max_tasks:
+                print(f"未完了のToDoが {len(open_records)} 件あり、タスクストアの上限 {self.max_tasks} 件を超えています。")
+                return False
+
+            since = (datetime.now() - timedelta(days=self.history_days)).strftime('%Y-%m-%d')
+            history_limit = self.max_tasks - len(open_records)
+            history_records = self.repository.list_completed_since(since, history_limit)
+
+            self.records.clear()
+            for index in self.indexes.values():
+                index.clear()
+            self.spans.clear()
+            for record in open_records:
+                self._add(record)
+            for record in history_records:
+                self._add(record)
+
+            if history_limit and len(history_records) == history_limit:
+                # 上限で打ち切った日は一部しか読み込めていないため翌日から保持対象とする
+                self.covered_from = _next_day(history_records[-1].end_day)
+            elif history_limit:
+                self.covered_from = since
+            return True
+
+    def _index_keys(self, record):
+        return {
+            'status': record.status
+        }
+
+    def _add(self, record):
+        for field in INTERNED_FIELDS:
+            value = getattr(record, field)
+            if isinstance(value, str):
+                setattr(record, field, sys.intern(value))
+
+        self.records[record.id] = record
+        for name, key in self._index_keys(record).items():
+            self.indexes[name].setdefault(key, set()).add(record.id)
+        if record.start_day:
+            self.spans.add(
+                record.id,
+                calendar_days.to_day_number(record.start_day),
+                calendar_days.to_day_number(record.end_day)
+            )
+
+    def _remove(self, todo_id):
+        record = self.records.pop(todo_id, None)
+        if record is None:
+            return
+        self.spans.remove(todo_id)
+        for name, key in self._index_keys(record).items():
+            ids = self.indexes[name].get(key)
+            if ids is not None:
+                ids.discard(todo_id)
+                if not ids:
+                    del self.indexes[name][key]
+
+    def _keeps(self, record):
+        """ストアに保持する対象のToDoか"""
+        return record.status != '完了済' or record.end_day >= self.covered_from
+
+    def _refresh(self, todo_ids):
+        """指定したToDoをSQLiteから読み直してストアに反映"""
+        todo_ids = {int(todo_id) for todo_id in todo_ids}
+        if not todo_ids:
+            return
+        with self.lock:
+            for todo_id in todo_ids:
+                self._remove(todo_id)
+            for record in self.repository.get_many(todo_ids):
+                if self._keeps(record):
+                    self._add(record)
+            self._enforce_limit()
+
+    def _enforce_limit(self):
+        """上限を超えた場合、期間の最終日の古い完了済みToDoから日単位で保持対象外にする"""
+        excess = len(self.records) - self.max_tasks
+        if excess <= 0:
+            return
+
+        completed = sorted(
+            (self.records[todo_id] for todo_id in self.indexes['status'].get('完了済', ())),
+            key=lambda record: record.end_day
+        )
+        removed_day = None
+        for record in completed:
+            if excess <= 0 and record.end_day != removed_day:
+                break
+            removed_day = record.end_day
+            self._remove(record.id)
+            excess -= 1
+        if removed_day is not None:
+            self.covered_from = max(self.covered_from, _next_day(removed_day))
+
+    def apply_changes(self, changes):
+        """
+        ChangeWatcher の変更履歴をストアに反映
+
+        :param changes: ChangeWatcher.poll() が返す変更履歴のリスト
+        """
+        with self.lock:
+            changed_ids = set()
+            for _, todo_id, op, *_ in changes:
+                if op == 'D':
+                    self._remove(todo_id)
+                    changed_ids.discard(todo_id)
+                else:
+                    changed_ids.add(todo_id)
+            self._refresh(changed_ids)
+
+    def memory_usage(self):
+        """
+        ストアが保持しているレコードと索引のおおよそのメモリ使用量
+
+        :return: バイト数（共有している文字列は1回だけ数える）
+        """
+        with self.lock:
+            seen = set()
+            total = sys.getsizeof(self.records)
+            for record in self.records.values():
+                total += sys.getsizeof(record)
+                for field in TaskRecord.__slots__:
+                    value = getattr(record, field)
+                    if id(value) not in seen:
+                        seen.add(id(value))
+                        total += sys.getsizeof(value)
+            for index in self.indexes.values():
+                total += sys.getsizeof(index)
+                for ids in index.values():
+                    total += sys.getsizeof(ids)
+            total += sys.getsizeof(self.spans.spans) + sys.getsizeof(self.spans.bins)
+            for span in self.spans.spans.values():
+                total += sys.getsizeof(span)
+            for keys in self.spans.bins.values():
+                total += sys.getsizeof(keys)
+            return total
+
+    def __len__(self):
+        return len(self.records)
+
+    # ---- 読み取り（TodoRepository と同じインターフェース） ----
+
+    def _sorted_by_id(self, todo_ids):
+        return [self.records[todo_id] for todo_id in sorted(todo_ids)]
+
+    def get(self, todo_id):
+        """
+        IDを指定してToDoを取得
+
+        :return: TaskRecord。見つからない場合はNone
+        """
+        with self.lock:
+            record = self.records.get(int(todo_id))
+        if record is not None:
+            return record
+        # 保持対象外の古い完了済みToDo
+        return self.repository.get(todo_id)
+
+    def get_many(self, todo_ids):
+        """
+        複数のIDを指定してToDoを取得
+
+        :return: TaskRecord のリスト（削除済みのIDは含まれない）
+        """
+        with self.lock:
+            todo_ids = {int(todo_id) for todo_id in todo_ids}
+            found = [self.records[todo_id] for todo_id in todo_ids if todo_id in self.records]
+            missing = todo_ids - set(self.records)
+        if missing:
+            found.extend(self.repository.get_many(missing))
+        return found
+
+    def list_active_on(self, date_str):
+        """指定日が期間（開始日〜期限）に含まれるToDoを取得"""
+        with self.lock:
+            if date_str >= self.covered_from:
+                day = calendar_days.to_day_number(date_str)
+                return self._sorted_by_id(self.spans.overlapping(day, day))
+        return self.repository.list_active_on(date_str)
+
+    def top_active_titles_for_date(self, date_str, limit):
+        """
+        指定日が期間に含まれるToDoのうち、優先度・期限の順に上位のものを取得
+
+        :return: ((タイトル, ステータス, 優先度) のリスト, その日のToDoの総数)
+        """
+        with self.lock:
+            if date_str >= self.covered_from:
+                records = self.list_active_on(date_str)
+                records.sort(key=_priority_order)
+                return [(record.title, record.status, record.priority) for record in records[:limit]], len(records)
+        return self.repository.top_active_titles_for_date(date_str, limit)
+
+    def list_overlapping(self, first_date, last_date):
+        """期間が指定した範囲と重なるToDoを開始日順に取得"""
+        with self.lock:
+            if first_date >= self.covered_from:
+                todo_ids = self.spans.overlapping(
+                    calendar_days.to_day_number(first_date), calendar_days.to_day_number(last_date)
+                )
+                records = [self.records[todo_id] for todo_id in todo_ids]
+                records.sort(key=lambda record: (record.start_date, record.id))
+                return records
+        return self.repository.list_overlapping(first_date, last_date)
+
+    def day_status_counts(self, date_strs):
+        """
+        指定日ごとに、期間（開始日〜期限）にその日が含まれるToDoのステータス別の件数を取得
+
+        :return: (日付, ステータス, 件数) のリスト
+        """
+        counts = {}
+        for first_date, last_date in calendar_days.date_runs(date_strs):
+            with self.lock:
+                if first_date >= self.covered_from:
+                    todo_ids = self.spans.overlapping(
+                        calendar_days.to_day_number(first_date), calendar_days.to_day_number(last_date)
+                    )
+                    spans = [
+                        (record.start_day, record.end_day, record.status)
+                        for record in (self.records[todo_id] for todo_id in todo_ids)
+                    ]
+                    count_statuses_by_day(spans, first_date, last_date, counts)
+                    continue
+            run = calendar_days.span_dates(first_date, last_date)
+            for date_str, status, count in self.repository.day_status_counts(run):
+                counts[date_str, status] = count
+        return [(date_str, status, count) for (date_str, status), count in counts.items()]
+
+    def top_open_tasks(self, panel, date_str, limit):
+        """
+        遅延タスク・本日のタスクの一覧を優先度・期限の順に上位から取得
+
+        :param panel: 'delayed'（遅延タスク）または 'today'（本日のタスク）
+        :return: (TaskRecord のリスト, 条件に合うToDoの総数)
+        """
+        next_day = _next_day(date_str)
+        if panel == 'delayed':
+            def matches(record):
+                return record.start_date < date_str and (record.due_date or '') < next_day
+        else:
+            def matches(record):
+                return record.start_date < next_day and record.due_date is not None and record.due_date >= date_str
+
+        with self.lock:
+            records = [
+                self.records[todo_id]
+                for status in OPEN_STATUSES
+                for todo_id in self.indexes['status'].get(status, ())
+                if self.records[todo_id].start_date is not None and matches(self.records[todo_id])
+            ]
+        records.sort(key=_priority_order)
+        return records[:limit], len(records)
+
+    # ---- 書き込み（SQLiteに反映してからストアを更新） ----
+
+    def insert(self, **values):
+        """
+        ToDoを追加
+
+        :return: 追加したToDoのID
+        """
+        todo_id = self.repository.insert(**values)
+        self._refresh([todo_id])
+        return todo_id
+
+    def delete(self, todo_id):
+        """
+        ToDoを削除
+
+        :return: 削除した件数
+        """
+        result = self.repository.delete(todo_id)
+        with self.lock:
+            self._remove(int(todo_id))
+        return result
+
+    def update_if_unchanged(self, todo_id, expected_version, values):
+        """
+        読込時のバージョンから変更されていない場合のみToDoを更新する（楽観的排他制御）
+
+        :return: 更新後のバージョン
+        :raises ConcurrentUpdateError: 他の編集者が先に更新・削除していた場合
+        """
+        try:
+            return self.repository.update_if_unchanged(todo_id, expected_version, values)
+        finally:
+            # 競合した場合もストアを最新の内容にそろえる
+            self._refresh([todo_id])
+
+    def update_many_if_unchanged(self, edits):
+        """
+        複数のToDoを1つのトランザクションで楽観的排他制御により更新する
+
+        :return: (IDと更新後のバージョンの辞書, ConcurrentUpdateError のリスト, (ToDoのID, 例外) のリスト)
+        """
+        try:
+            return self.repository.update_many_if_unchanged(edits)
+        finally:
+            self._refresh(todo_id for todo_id, _, _ in edits)
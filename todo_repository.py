@@ -0,0 +1,515 @@
+"""
+ToDoデータへのアクセスをまとめたリポジトリ
+
+画面側はSQLを直接扱わず、このモジュールのメソッドを通して読み書きする。
+1つの接続を使い続けることで、sqlite3の文キャッシュにより同じSQLの再解析を避ける
+"""
+import sqlite3
+import threading
+from datetime import datetime
+
+from database_connection import DatabaseConnection, ConcurrentUpdateError
+import calendar_days
+
+class TaskRecord:
+    """
+    ToDo1件分のレコード
+
+    タプルの位置ではなく属性名でアクセスできるようにし、__slots__でメモリ使用量を抑える
+    """
+    __slots__ = (
+        'id', 'calendar_id', 'title', 'description', 'status', 'registrant',
+        'assignee', 'priority', 'due_date', 'start_date', 'version'
+    )
+
+    def __init__(self, id, calendar_id, title, description, status, registrant,
+                 assignee, priority, due_date, start_date, version):
+        self.id = id
+        self.calendar_id = calendar_id
+        self.title = title
+        self.description = description
+        self.status = status
+        self.registrant = registrant
+        self.assignee = assignee
+        self.priority = priority
+        self.due_date = due_date
+        self.start_date = start_date
+        self.version = version
+
+    @property
+    def start_day(self):
+        """開始日の日付部分（'yyyy-MM-dd'）"""
+        return self.start_date.split()[0] if self.start_date else ''
+
+    @property
+    def end_day(self):
+        """期間の最終日（期限の日付部分。期限がない・日付でない・開始日より前の場合は開始日）"""
+        due_day = self.due_date[:10] if self.due_date else ''
+        try:
+            calendar_days.to_date(due_day)
+        except ValueError:
+            return self.start_day
+        return max(self.start_day, due_day)
+
+    @property
+    def key(self):
+        """レコードを取得し直すときのキー（get() に渡す値）"""
+        return self.id
+
+    def __repr__(self):
+        return f"TaskRecord(id={self.id}, title={self.title!r}, status={self.status!r}, version={self.version})"
+
+def task_record_factory(cursor, row):
+    """TASK_COLUMNS の順で取得した行を TaskRecord に変換する行ファクトリ"""
+    return TaskRecord(*row)
+
+# TaskRecord を生成するクエリで取得するカラム（TaskRecord.__slots__ と同じ順序）
+TASK_COLUMNS = ', '.join(f'ToDo.{column}' for column in TaskRecord.__slots__)
+
+# 文キャッシュを効かせるため、SQLは定数として同じ文字列を使い回す
+SELECT_TASK_BY_ID = f'SELECT {TASK_COLUMNS} FROM ToDo WHERE ToDo.id = ?'
+
+# 優先度（値が小さいほど優先度が高い）
+PRIORITY_LABELS = {1: '最高', 2: '高', 3: '中', 4: '低', 5: '最低'}
+DEFAULT_PRIORITY = 3
+
+# 優先度・期限の順に並べる（索引 idx_todo_start_priority・idx_todo_open_priority の順序と同じ）
+PRIORITY_ORDER = 'ORDER BY priority, due_date, start_date, id'
+
+# 未着手・進行中のToDoの条件（部分インデックス idx_todo_open_priority の条件と同じ式）
+OPEN_STATUS_CONDITION = "status IN ('未着手', '進行中')"
+
+# 遅延タスク・本日のタスクの一覧の条件
+OPEN_TASK_PANEL_CONDITIONS = {
+    # 昨日以前に開始し、期限が今日以前の未完了タスク
+    'delayed': "start_date < :day AND COALESCE(due_date, '') < date(:day, '+1 day')",
+    # 今日までに開始し、期限が今日以降の未完了タスク
+    'today': "start_date < date(:day, '+1 day') AND due_date >= :day"
+}
+
+# 期限のリマインダー用の条件（部分インデックス idx_todo_open_due で期限の範囲を検索する）
+OPEN_DUE_CONDITIONS = {
+    # 指定日以降が期限
+    'upcoming': 'due_date >= :day',
+    # 指定日が期限
+    'due': "due_date >= :day AND due_date < date(:day, '+1 day')",
+    # 期限が指定日より前（期限切れ）
+    'overdue': "due_date > '' AND due_date < :day"
+}
+
+SELECT_OPEN_TASKS = f'''
+SELECT {TASK_COLUMNS}
+FROM ToDo
+WHERE status IS NULL OR status != '完了済'
+'''
+
+# 期間の最終日（TaskRecord.end_day と同じ値）
+END_DAY_EXPRESSION = "MAX(substr(start_date, 1, 10), COALESCE(date(substr(due_date, 1, 10)), ''))"
+
+# 期間（開始日〜期限）が :first〜:last と重なるToDoの条件
+SPAN_OVERLAP_CONDITIONS = {
+    # R*Tree の索引 ToDoSpan で日番号の範囲を検索する
+    True: 'ToDo.id IN (SELECT id FROM ToDoSpan WHERE start_day <= :last_day AND end_day >= :first_day)',
+    # R*Tree が使えない環境では開始日の索引で絞り込んでから期限を比較する
+    False: ("start_date < date(:last, '+1 day') "
+            f"AND {END_DAY_EXPRESSION} >= :first")
+}
+
+# 期限のない範囲の終わり
+LAST_DATE = '9999-12-31'
+
+# 期間（開始日〜期限）とステータスの取得に使うカラム（日別の件数の集計用）
+SPAN_STATUS_COLUMNS = f"substr(start_date, 1, 10) AS start_day, {END_DAY_EXPRESSION} AS end_day, status"
+
+def count_statuses_by_day(spans, first_date, last_date, counts):
+    """
+    期間ごとに、その期間に含まれる日のステータス別の件数を加算する
+
+    :param spans: (開始日, 最終日, ステータス) の並び
+    :param first_date: 集計する最初の日（'yyyy-MM-dd'）
+    :param last_date: 集計する最後の日（'yyyy-MM-dd'）
+    :param counts: (日付, ステータス) をキーとする件数の辞書（加算先）
+    """
+    for start_day, end_day, status in spans:
+        first = max(start_day, first_date)
+        last = min(end_day, last_date)
+        if first > last:
+            continue
+        for date_str in calendar_days.span_dates(first, last):
+            counts[date_str, status] = counts.get((date_str, status), 0) + 1
+
+INSERT_TASK = '''
+INSERT INTO ToDo
+(calendar_id, title, description, status, registrant, assignee, due_date, start_date, priority)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+DELETE_TASK = 'DELETE FROM ToDo WHERE id = ?'
+
+SELECT_VERSION = 'SELECT version FROM ToDo WHERE id = ?'
+
+# 書き込みのトリガーが直前に記録した変更履歴（書き込み中はロックを持つため自身の履歴が最新になる）
+SELECT_LATEST_CHANGE_SEQ = 'SELECT MAX(seq) FROM ToDoChangeLog'
+
+# 統計の種類ごとの集計テーブルの条件
+ASSIGNEE_COUNT_CONDITIONS = {
+    'completed': "status = '完了済'",
+    'uncompleted': "status != '完了済'",
+    'delayed': "status != '完了済' AND due_day != '' AND due_day < :today"
+}
+
+# 候補一覧を取得できるカラム
+DROPDOWN_COLUMNS = ('title', 'registrant', 'assignee')
+
+class TodoRepository:
+    # 楽観的排他制御で更新可能なToDoのカラム
+    UPDATABLE_COLUMNS = DatabaseConnection.UPDATABLE_TODO_COLUMNS
+
+    def __init__(self, db):
+        """
+        ToDoリポジトリ
+
+        :param db: DatabaseConnectionオブジェクト（スキーマ初期化済み）
+        """
+        self.db = db
+        self.connection = sqlite3.connect(
+            db.db_path,
+            timeout=10,
+            check_same_thread=False,
+            cached_statements=256,
+            uri=True
+        )
+        # 画面スレッドとバックグラウンドスレッドから同じ接続を使うため排他する
+        self.lock = threading.RLock()
+        # 期間の検索に R*Tree の索引を使うか
+        self.span_condition = SPAN_OVERLAP_CONDITIONS[db.span_index_available]
+        # この接続から書き込んだ変更履歴のシーケンス番号（ChangeWatcher が外部の変更と区別する）
+        self.written_seqs = set()
+
+    def close(self):
+        """接続を閉じる"""
+        with self.lock:
+            self.connection.close()
+
+    # ---- 読み取り ----
+
+    def _fetch_records(self, query, params=()):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.row_factory = task_record_factory
+            return cursor.execute(query, params).fetchall()
+
+    def _fetch_all(self, query, params=()):
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def get(self, todo_id):
+        """
+        IDを指定してToDoを取得
+
+        :return: TaskRecord。見つからない場合はNone
+        """
+        records = self._fetch_records(SELECT_TASK_BY_ID, (todo_id,))
+        return records[0] if records else None
+
+    def get_many(self, todo_ids):
+        """
+        複数のIDを指定してToDoを取得
+
+        :return: TaskRecord のリスト（削除済みのIDは含まれない）
+        """
+        todo_ids = list(todo_ids)
+        if not todo_ids:
+            return []
+        placeholders = ', '.join('?' for _ in todo_ids)
+        return self._fetch_records(
+            f'SELECT {TASK_COLUMNS} FROM ToDo WHERE ToDo.id IN ({placeholders})',
+            todo_ids
+        )
+
+    def top_open_tasks(self, panel, date_str, limit):
+        """
+        遅延タスク・本日のタスクの一覧を優先度・期限の順に上位から取得
+
+        上位の件数のみ読み込み、総数は行を読み込まずに数える
+
+        :param panel: 'delayed'（遅延タスク）または 'today'（本日のタスク）
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        :param limit: 取得する件数
+        :return: (TaskRecord のリスト, 条件に合うToDoの総数)
+        """
+        condition = f'{OPEN_STATUS_CONDITION} AND {OPEN_TASK_PANEL_CONDITIONS[panel]}'
+        params = {'day': date_str, 'limit': limit}
+        records = self._fetch_records(
+            f'SELECT {TASK_COLUMNS} FROM ToDo WHERE {condition} {PRIORITY_ORDER} LIMIT :limit',
+            params
+        )
+        if len(records) < limit:
+            return records, len(records)
+        # 開始日の索引が選ばれると全件の行を読むため、未完了のToDoのみの部分インデックスで数える
+        count_query = f'SELECT COUNT(*) FROM ToDo INDEXED BY idx_todo_open_priority WHERE {condition}'
+        return records, self._fetch_all(count_query, params)[0][0]
+
+    def next_open_due_date(self, date_str):
+        """
+        指定日以降で最も近い未完了のToDoの期限
+
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        :return: 期限の文字列。該当するToDoがない場合はNone
+        """
+        query = (f"SELECT MIN(due_date) FROM ToDo INDEXED BY idx_todo_open_due "
+                 f"WHERE {OPEN_STATUS_CONDITION} AND {OPEN_DUE_CONDITIONS['upcoming']}")
+        return self._fetch_all(query, {'day': date_str})[0][0]
+
+    def open_due_titles(self, kind, date_str, limit):
+        """
+        期限が指定日の、または期限切れの未完了のToDoのタイトルを優先度の順に取得
+
+        :param kind: 'due'（期限が指定日）または 'overdue'（期限が指定日より前）
+        :param date_str: 今日の日付（'yyyy-MM-dd'）
+        :param limit: 取得するタイトルの件数
+        :return: (タイトルのリスト, 条件に合うToDoの総数)
+        """
+        condition = f"{OPEN_STATUS_CONDITION} AND {OPEN_DUE_CONDITIONS[kind]}"
+        params = {'day': date_str, 'limit': limit}
+        titles = [row[0] for row in self._fetch_all(
+            f'SELECT title FROM ToDo INDEXED BY idx_todo_open_due WHERE {condition} {PRIORITY_ORDER} LIMIT :limit',
+            params
+        )]
+        if len(titles) < limit:
+            return titles, len(titles)
+        count_query = f'SELECT COUNT(*) FROM ToDo INDEXED BY idx_todo_open_due WHERE {condition}'
+        return titles, self._fetch_all(count_query, params)[0][0]
+
+    def list_open(self):
+        """未完了のToDoをすべて取得"""
+        return self._fetch_records(SELECT_OPEN_TASKS)
+
+    def list_completed_since(self, date_str, limit):
+        """
+        期間の最終日が指定日以降の完了済みのToDoを最終日の新しい順に取得
+
+        :param date_str: 期間の最終日の下限（'yyyy-MM-dd'）
+        :param limit: 取得する最大件数
+        """
+        query = f'''
+        SELECT {TASK_COLUMNS} FROM ToDo
+        WHERE status = '完了済' AND {self.span_condition}
+        ORDER BY {END_DAY_EXPRESSION} DESC
+        LIMIT :limit
+        '''
+        params = self._span_params(date_str, LAST_DATE)
+        params['limit'] = limit
+        return self._fetch_records(query, params)
+
+    # ---- 期間（開始日〜期限）による検索 ----
+
+    def _span_params(self, first_date, last_date):
+        return {
+            'first': first_date,
+            'last': last_date,
+            'first_day': calendar_days.to_day_number(first_date),
+            'last_day': calendar_days.to_day_number(last_date)
+        }
+
+    def list_active_on(self, date_str):
+        """
+        指定日が期間（開始日〜期限）に含まれるToDoを取得
+
+        :param date_str: 日付（'yyyy-MM-dd'）
+        :return: TaskRecord のリスト（ID順）
+        """
+        query = f'SELECT {TASK_COLUMNS} FROM ToDo WHERE {self.span_condition} ORDER BY id'
+        return self._fetch_records(query, self._span_params(date_str, date_str))
+
+    def top_active_titles_for_date(self, date_str, limit):
+        """
+        指定日が期間に含まれるToDoのうち、優先度・期限の順に上位のものを取得
+
+        :param date_str: 日付（'yyyy-MM-dd'）
+        :param limit: 取得する件数
+        :return: ((タイトル, ステータス, 優先度) のリスト, その日のToDoの総数)
+        """
+        params = self._span_params(date_str, date_str)
+        params['limit'] = limit
+        rows = self._fetch_all(
+            f'SELECT title, status, priority FROM ToDo WHERE {self.span_condition} {PRIORITY_ORDER} LIMIT :limit',
+            params
+        )
+        if len(rows) < limit:
+            return rows, len(rows)
+        return rows, self._fetch_all(f'SELECT COUNT(*) FROM ToDo WHERE {self.span_condition}', params)[0][0]
+
+    def list_overlapping(self, first_date, last_date):
+        """
+        期間が指定した範囲（月の表示範囲など）と重なるToDoを取得
+
+        :param first_date: 範囲の最初の日（'yyyy-MM-dd'）
+        :param last_date: 範囲の最後の日（'yyyy-MM-dd'）
+        :return: TaskRecord のリスト（開始日順）
+        """
+        query = f'SELECT {TASK_COLUMNS} FROM ToDo WHERE {self.span_condition} ORDER BY start_date, id'
+        return self._fetch_records(query, self._span_params(first_date, last_date))
+
+    def value_counts(self, column):
+        """
+        入力候補として使うカラムの値ごとのToDoの件数を取得
+
+        :param column: DROPDOWN_COLUMNS のいずれか
+        :return: 値と件数の辞書
+        """
+        if column not in DROPDOWN_COLUMNS:
+            raise ValueError(f"候補を取得できないカラムです: {column}")
+        query = f'SELECT {column}, COUNT(*) FROM ToDo WHERE {column} IS NOT NULL AND {column} != "" GROUP BY {column}'
+        return {str(value): count for value, count in self._fetch_all(query) if value}
+
+    def day_status_counts(self, date_strs):
+        """
+        指定日ごとに、期間（開始日〜期限）にその日が含まれるToDoのステータス別の件数を取得
+
+        カレンダーのセルのタイトル（top_active_titles_for_date）と同じ期間の条件で数える
+
+        :param date_strs: 対象の日付文字列（'yyyy-MM-dd'）の集合
+        :return: (日付, ステータス, 件数) のリスト
+        """
+        counts = {}
+        query = f'SELECT {SPAN_STATUS_COLUMNS} FROM ToDo WHERE {self.span_condition}'
+        # 連続した日付ごとに1回の範囲検索で読み、期間に含まれる日を数える
+        for first_date, last_date in calendar_days.date_runs(date_strs):
+            spans = self._fetch_all(query, self._span_params(first_date, last_date))
+            count_statuses_by_day(spans, first_date, last_date, counts)
+        return [(date_str, status, count) for (date_str, status), count in counts.items()]
+
+    def assignee_counts(self, category, start_date, end_date):
+        """
+        集計テーブルから作業者別のToDo件数を取得
+
+        :param category: 'completed'・'uncompleted'・'delayed' のいずれか
+        :param start_date: 開始日（'yyyy-MM-dd'）
+        :param end_date: 終了日（'yyyy-MM-dd'）。遅延の判定にも使用する
+        :return: (作業者, 件数) のリスト（件数の多い順）
+        """
+        query = f'''
+        SELECT assignee, SUM(task_count) as task_count
+        FROM DailyTaskStats
+        WHERE {ASSIGNEE_COUNT_CONDITIONS[category]}
+        AND day BETWEEN :start AND :end
+        GROUP BY assignee
+        ORDER BY task_count DESC
+        '''
+        params = {'start': start_date, 'end': end_date}
+        if category == 'delayed':
+            params['today'] = end_date
+        return self._fetch_all(query, params)
+
+    # ---- 書き込み ----
+
+    def insert(self, calendar_id, title, description, status, registrant, assignee, due_date, start_date,
+               priority=DEFAULT_PRIORITY):
+        """
+        ToDoを追加
+
+        :return: 追加したToDoのID
+        """
+        with self.lock:
+            with self.connection:
+                cursor = self.connection.execute(INSERT_TASK, (
+                    calendar_id, title, description, status, registrant, assignee, due_date, start_date, priority
+                ))
+                seq = self._latest_change_seq()
+            self.written_seqs.add(seq)
+            return cursor.lastrowid
+
+    def delete(self, todo_id):
+        """
+        ToDoを削除
+
+        :return: 削除した件数
+        """
+        with self.lock:
+            with self.connection:
+                deleted = self.connection.execute(DELETE_TASK, (todo_id,)).rowcount
+                seq = self._latest_change_seq()
+            if deleted:
+                self.written_seqs.add(seq)
+            return deleted
+
+    def update_if_unchanged(self, todo_id, expected_version, values):
+        """
+        読込時のバージョンから変更されていない場合のみToDoを更新する（楽観的排他制御）
+
+        :param todo_id: 更新するToDoのID
+        :param expected_version: 読込時のバージョン
+        :param values: カラム名と新しい値の辞書
+        :return: 更新後のバージョン
+        :raises ConcurrentUpdateError: 他の編集者が先に更新・削除していた場合
+        """
+        seqs = []
+        with self.lock:
+            with self.connection:
+                version = self._update_if_unchanged(todo_id, expected_version, values, seqs)
+            self.written_seqs.update(seqs)
+            return version
+
+    def update_many_if_unchanged(self, edits):
+        """
+        複数のToDoを1つのトランザクションで楽観的排他制御により更新する
+
+        競合したToDoと制約に違反した値のToDoは更新せずに報告し、それ以外のToDoの更新はコミットする
+
+        :param edits: (ToDoのID, 読込時のバージョン, カラム名と新しい値の辞書) のリスト
+        :return: (IDと更新後のバージョンの辞書, ConcurrentUpdateError のリスト, (ToDoのID, 例外) のリスト)
+        :raises sqlite3.OperationalError: ロック中などで保存できなかった場合（すべての更新を取り消す）
+        """
+        versions = {}
+        conflicts = []
+        failures = []
+        seqs = []
+        with self.lock:
+            with self.connection:
+                if not self.connection.in_transaction:
+                    self.connection.execute('BEGIN')
+                for todo_id, expected_version, values in edits:
+                    # 制約に違反したToDoの更新のみ取り消せるよう、ToDoごとにセーブポイントを置く
+                    self.connection.execute('SAVEPOINT todo_edit')
+                    try:
+                        versions[todo_id] = self._update_if_unchanged(todo_id, expected_version, values, seqs)
+                    except ConcurrentUpdateError as e:
+                        conflicts.append(e)
+                    except (sqlite3.IntegrityError, ValueError) as e:
+                        self.connection.execute('ROLLBACK TO todo_edit')
+                        failures.append((todo_id, e))
+                    self.connection.execute('RELEASE todo_edit')
+            # コミットできた場合のみ自身の書き込みとして記録する
+            self.written_seqs.update(seqs)
+        return versions, conflicts, failures
+
+    def _latest_change_seq(self):
+        return self.connection.execute(SELECT_LATEST_CHANGE_SEQ).fetchone()[0]
+
+    def _update_if_unchanged(self, todo_id, expected_version, values, seqs):
+        invalid_columns = set(values) - set(self.UPDATABLE_COLUMNS)
+        if invalid_columns:
+            raise ValueError(f"更新できないカラムが指定されています: {', '.join(sorted(invalid_columns))}")
+
+        assignments = ', '.join(f'{column} = ?' for column in values)
+        query = f'''
+        UPDATE ToDo
+        SET {assignments}, version = version + 1, updated_at = ?
+        WHERE id = ? AND version = ?
+        '''
+        params = (
+            *values.values(),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            todo_id,
+            expected_version
+        )
+
+        cursor = self.connection.execute(query, params)
+        if cursor.rowcount == 1:
+            seqs.append(self._latest_change_seq())
+            return int(expected_version) + 1
+
+        # 更新されなかった場合は現在のバージョンを確認して競合を報告
+        current = self.connection.execute(SELECT_VERSION, (todo_id,)).fetchone()
+        raise ConcurrentUpdateError(todo_id, expected_version, current[0] if current else None)